@@ -1,7 +1,9 @@
-from notifications import push_notification_healthcheck, send_goal_notifications, send_upcoming_recurring_payment_notifications
+from notifications import close_fcm, deal_fanout_metrics, dispatch_notification_outbox, push_notification_healthcheck, send_goal_notifications, send_upcoming_recurring_payment_notifications, sweep_pending_deal_fanouts
 from fastapi import FastAPI
 from routes import auth, user, transaction, statistics, tools, category, deals, recurring_transaction, goals, notifications
-from db import test_connection, init_db
+from db import test_connection, init_db, get_pool_stats, engine, async_engine
+from partitions import maintain_transaction_partitions
+from goal_queue import process_goal_recomputes
 import uvicorn
 import logging
 import asyncio
@@ -37,21 +39,46 @@ def home():
 def healthcheck():
     return {"status": "healthy"}
 
+@app.get("/healthcheck/db_pool")
+def db_pool_stats():
+    return get_pool_stats()
+
+@app.get("/healthcheck/deal_fanout")
+def deal_fanout_stats():
+    return deal_fanout_metrics.stats()
+
 @app.on_event("startup")
 async def startup():
     if not test_connection():
         print("Database connection failed!")
     init_db()
     
+    # Keep monthly transaction partitions created ahead of time
+    asyncio.create_task(maintain_transaction_partitions(engine))
+    
     # Start the healthcheck thread
     # asyncio.create_task(push_notification_healthcheck())
     
+    # recompute goals of users with changed transactions, see goal_queue.py
+    asyncio.create_task(process_goal_recomputes())
+    
+    # send queued push notifications, see outbox.py
+    asyncio.create_task(dispatch_notification_outbox())
+    
+    # fan out new deals whose request-time fan-out never ran
+    asyncio.create_task(sweep_pending_deal_fanouts())
+    
     # start goal notification thread
     asyncio.create_task(send_goal_notifications())
     
     # Start the upcoming recurring payment notification task
     asyncio.create_task(send_upcoming_recurring_payment_notifications())
-    
+
+@app.on_event("shutdown")
+async def shutdown():
+    await close_fcm()
+    await async_engine.dispose()
+
 if __name__ == '__main__':
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True)
 
@@ -0,0 +1,60 @@
+"""
+Benchmark of the distance computations behind location filters.
+
+Compares a Python loop over utils.get_coordinate_distance with geo.haversine_km and
+geo.within_distance (with and without the bounding-box prefilter) for points scattered
+across a continent-sized area around Vancouver.
+
+Usage:
+    python benchmark_geo.py [--sizes 1000 100000 1000000] [--distance 100] [--repeat 3]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from geo import haversine_km, within_distance
+from utils import get_coordinate_distance
+
+CENTER = (49.28, -123.12)
+
+def best_of(repeat: int, function, *args):
+    """Best wall time in seconds over `repeat` runs, and the last result."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def scalar_within(latitude, longitude, latitudes, longitudes, distance_km):
+    return [i for i, (point_lat, point_lon) in enumerate(zip(latitudes, longitudes))
+            if get_coordinate_distance(latitude, longitude, point_lat, point_lon) <= distance_km]
+
+def run(sizes, distance_km: float, repeat: int, seed: int = 446):
+    rng = np.random.default_rng(seed)
+    print(f"{'points':>10} {'scalar':>10} {'vectorized':>11} {'prefilter':>10} {'speedup':>8} {'matches':>8}")
+    for size in sizes:
+        latitudes = CENTER[0] + rng.uniform(-15, 15, size)
+        longitudes = CENTER[1] + rng.uniform(-30, 30, size)
+        # the scalar loop works on Python floats, as the routes did
+        latitude_list, longitude_list = latitudes.tolist(), longitudes.tolist()
+
+        scalar_seconds, expected = best_of(repeat, scalar_within, *CENTER, latitude_list, longitude_list, distance_km)
+        vector_seconds, _ = best_of(repeat, lambda: np.flatnonzero(haversine_km(*CENTER, latitudes, longitudes) <= distance_km))
+        prefilter_seconds, found = best_of(repeat, within_distance, *CENTER, latitudes, longitudes, distance_km)
+        assert found.tolist() == expected, "vectorized results differ from the scalar version"
+
+        print(f"{size:>10} {scalar_seconds * 1000:>8.1f}ms {vector_seconds * 1000:>9.1f}ms {prefilter_seconds * 1000:>8.1f}ms "
+              f"{scalar_seconds / prefilter_seconds:>7.0f}x {len(found):>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scalar and vectorized haversine distances")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--distance", type=float, default=100, help="Radius in km")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the best is reported")
+    args = parser.parse_args()
+    run(args.sizes, args.distance, args.repeat)
+
+if __name__ == "__main__":
+    main()
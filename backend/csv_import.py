@@ -0,0 +1,185 @@
+"""
+Streaming CSV import for transactions.
+
+The upload is decoded and parsed incrementally, categories are resolved through a
+dict keyed on the normalized category name, and valid rows are written with COPY in
+fixed-size batches. Each batch is checked for duplicates of existing transactions
+with one lookup (see fingerprints.py). Memory stays bounded by the batch size and
+the number of errors kept for the report, not by the size of the file.
+
+Expected columns (see template.csv): amount, category, date, and optionally
+transaction_type (EXPENSE or INCOME, default EXPENSE), note and vendor.
+"""
+import codecs
+import csv
+import datetime
+import itertools
+import re
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy.engine import Connection, Engine
+
+from db import copy_rows
+from fingerprints import find_duplicates
+from goal_queue import mark_goals_stale
+from models import Category, TransactionType
+
+REQUIRED_COLUMNS = ("amount", "category", "date")
+TRANSACTION_COLUMNS = ["user_id", "amount", "category_id", "transaction_type", "note", "date", "vendor", "is_duplicate"]
+# rows per COPY round trip
+IMPORT_BATCH_SIZE = 5000
+# errors listed in the report; the total count is always returned
+MAX_REPORTED_ERRORS = 1000
+
+def normalize_category_name(name: str) -> str:
+    return re.sub(r"\s+", " ", name).strip().lower()
+
+def build_category_map(categories: List[Category]) -> Dict[str, int]:
+    """Map normalized category names to ids. The first category wins if two names normalize the same."""
+    category_map = {}
+    for category in categories:
+        category_map.setdefault(normalize_category_name(category.name), category.id)
+    return category_map
+
+def read_csv_rows(file: BinaryIO) -> Iterator[dict]:
+    """Decode and parse an uploaded file row by row. Accepts a UTF-8 byte order mark."""
+    return csv.DictReader(codecs.getreader("utf-8-sig")(file))
+
+def parse_row(row: dict, user_id: int, category_map: Dict[str, int]) -> dict:
+    """
+    Validate one CSV row and convert it to transaction values.
+
+    Raises:
+        ValueError: If the row is invalid, with a message for the error report.
+    """
+    missing = [column for column in REQUIRED_COLUMNS if not (row.get(column) or "").strip()]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+
+    try:
+        amount = round(float(row["amount"]), 2)
+    except ValueError:
+        raise ValueError(f"Invalid amount '{row['amount']}'")
+
+    category_id = category_map.get(normalize_category_name(row["category"]))
+    if category_id is None:
+        raise ValueError(f"Category '{row['category']}' not found for the current user")
+
+    try:
+        date = datetime.datetime.fromisoformat(row["date"].strip())
+    except ValueError:
+        raise ValueError(f"Invalid date '{row['date']}'")
+
+    transaction_type = (row.get("transaction_type") or "EXPENSE").strip().upper()
+    if transaction_type not in TransactionType.__members__:
+        raise ValueError(f"Invalid transaction_type '{row['transaction_type']}'")
+
+    return {
+        "user_id": user_id,
+        "amount": amount,
+        "category_id": category_id,
+        "transaction_type": transaction_type,
+        "note": row.get("note") or "",
+        "date": date,
+        "vendor": row.get("vendor") or None,
+        "is_duplicate": False
+    }
+
+class ImportReport:
+    """Counts and per-row errors for one import. Row numbers are 1-based and exclude the header."""
+
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.error_count = 0
+        self.duplicates = 0
+        self.errors = []
+
+    def add_error(self, row: int, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def to_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "error_count": self.error_count,
+            "duplicate_count": self.duplicates,
+            "errors": self.errors
+        }
+
+ProgressCallback = Callable[[ImportReport], None]
+
+def parse_rows(file: BinaryIO, user_id: int, categories: List[Category], report: ImportReport,
+               on_progress: Optional[ProgressCallback] = None,
+               progress_every: int = IMPORT_BATCH_SIZE) -> Iterator[dict]:
+    """
+    Yield the valid rows of an upload, recording invalid ones in the report.
+    If on_progress is given, it is called with the report every progress_every rows.
+    """
+    category_map = build_category_map(categories)
+    for number, row in enumerate(read_csv_rows(file), start=1):
+        report.rows = number
+        try:
+            values = parse_row(row, user_id, category_map)
+        except ValueError as e:
+            report.add_error(number, str(e))
+        else:
+            yield values
+        if on_progress and number % progress_every == 0:
+            on_progress(report)
+
+def batches(rows: Iterator[dict], batch_size: int) -> Iterator[List[dict]]:
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def apply_duplicates(conn: Connection, user_id: int, batch: List[dict], duplicates: str,
+                     report: ImportReport) -> List[dict]:
+    """Check one batch for duplicates and return the rows to insert under the given mode."""
+    if duplicates == "force":
+        return batch
+    flags = find_duplicates(conn, user_id, batch)
+    report.duplicates += sum(flags)
+    if duplicates == "skip":
+        return [values for values, duplicate in zip(batch, flags) if not duplicate]
+    for values, duplicate in zip(batch, flags):
+        values["is_duplicate"] = duplicate
+    return batch
+
+def import_transactions(engine: Engine, file: BinaryIO, user_id: int, categories: List[Category],
+                        batch_size: int = IMPORT_BATCH_SIZE,
+                        on_progress: Optional[ProgressCallback] = None,
+                        duplicates: str = "skip") -> ImportReport:
+    """
+    Insert every valid row of an upload with COPY in batches of batch_size, in a single transaction.
+    Invalid rows are skipped and listed in the returned report. Duplicates are handled per
+    fingerprints.DUPLICATE_MODES; rows already copied count as existing for later batches.
+    """
+    report = ImportReport()
+    rows = parse_rows(file, user_id, categories, report, on_progress, batch_size)
+    with engine.begin() as conn:
+        cursor = conn.connection.cursor()
+        for batch in batches(rows, batch_size):
+            batch = apply_duplicates(conn, user_id, batch, duplicates, report)
+            report.inserted += copy_rows(
+                cursor, "transactions", TRANSACTION_COLUMNS,
+                (tuple(values[column] for column in TRANSACTION_COLUMNS) for values in batch),
+                batch_size
+            )
+        if report.inserted:
+            # last, so the user's row is only locked until the commit
+            mark_goals_stale(conn, user_id)
+    return report
+
+def preview_transactions(engine: Engine, file: BinaryIO, user_id: int, categories: List[Category],
+                         report: ImportReport) -> List[dict]:
+    """Parse an upload without inserting it, marking the rows that would be duplicates."""
+    transactions = []
+    with engine.connect() as conn:
+        for batch in batches(parse_rows(file, user_id, categories, report), IMPORT_BATCH_SIZE):
+            transactions.extend(apply_duplicates(conn, user_id, batch, "flag", report))
+    return transactions
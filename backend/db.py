@@ -1,46 +1,163 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, select, text, tuple_
 from sqlalchemy.orm import scoped_session, sessionmaker, declarative_base, joinedload
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+import io
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from http_models import TransactionResponse
 import utils
+from geo import grid_cell_filter
 from models import Deal, DealLocationSubscription, DealVote, Goal, User, Category, Transaction, TransactionType, Base, UserLevelInfo
-from typing import List, Optional
+from migrations import run_migrations
+from typing import AsyncIterator, Iterable, List, Optional, Sequence, Tuple
 import datetime
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as SQLAlchemyTimeoutError
 import random
 
 load_dotenv()
 DATABASE_URI = os.getenv('DATABASE_URI')
 
-engine = create_engine(DATABASE_URI)
+# Connection pool settings (override through environment variables)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait to check out a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connect_errors = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except SQLAlchemyTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        except Exception:
+            # opening a new connection failed, e.g. the database is down or rejected the credentials
+            with self._stats_lock:
+                self.connect_errors += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+
+    def recreate(self):
+        # keep the counters across pool recreation (e.g. after a failover invalidates the pool)
+        new_pool = super().recreate()
+        new_pool.checkouts = self.checkouts
+        new_pool.timeouts = self.timeouts
+        new_pool.connect_errors = self.connect_errors
+        new_pool.total_wait = self.total_wait
+        new_pool.max_wait = self.max_wait
+        return new_pool
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """Instrumented pool for the asyncio engine."""
+
+def get_async_database_uri(uri: str) -> str:
+    """Swap the sync Postgres driver in a connection string for asyncpg."""
+    for prefix in ('postgresql+psycopg2://', 'postgresql://', 'postgres://'):
+        if uri.startswith(prefix):
+            return 'postgresql+asyncpg://' + uri[len(prefix):]
+    return uri
+
+POOL_SETTINGS = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING
+)
+
+engine = create_engine(DATABASE_URI, poolclass=InstrumentedQueuePool, **POOL_SETTINGS)
 db_session = scoped_session(sessionmaker(autocommit=False,
                                          autoflush=False,
                                          bind=engine))
 Base.query = db_session.query_property()
 
+# Async engine used by the high-traffic routes
+ASYNC_DATABASE_URI = os.getenv('ASYNC_DATABASE_URI') or get_async_database_uri(DATABASE_URI)
+async_engine = create_async_engine(ASYNC_DATABASE_URI, poolclass=InstrumentedAsyncQueuePool, **POOL_SETTINGS)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine,
+                                       autoflush=False,
+                                       expire_on_commit=False)
+
 def test_connection() -> bool:
     """Test the database connection."""
     try:
-        engine.connect()
-        return True
+        with engine.connect():
+            return True
     except Exception as e:
         print(f"Database connection failed: {e}")
         return False
 
+def get_pool_stats() -> dict:
+    """Report checked-out, idle and overflow connections plus checkout wait times for both engines."""
+    return {
+        "sync": _pool_stats(engine.pool),
+        "async": _pool_stats(async_engine.pool)
+    }
+
+def _pool_stats(pool: InstrumentedQueuePool) -> dict:
+    checkouts = pool.checkouts
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "checkouts": checkouts,
+        "timeouts": pool.timeouts,
+        "connect_errors": pool.connect_errors,
+        "avg_wait_ms": round(pool.total_wait / checkouts * 1000, 3) if checkouts else 0.0,
+        "max_wait_ms": round(pool.max_wait * 1000, 3)
+    }
+
 # region DB initialization
-def init_tables(reset: bool = True):
-    """Initialize the database tables."""
-    if reset:
-        print("DB CLEANUP: Dropping all tables")
-        Base.metadata.drop_all(bind=engine)
-    print("DB SETUP: Creating all tables")
-    Base.metadata.create_all(bind=engine)
-
-def fill_tables():
-    """Populate the database with initial data."""
+def init_db() -> List[int]:
+    """Apply any pending schema migrations. Returns the versions applied."""
+    applied = run_migrations(engine)
+    if applied:
+        print(f"DB SETUP: Applied migrations {applied}")
+    return applied
+
+def reset_db():
+    """Drop all tables and rebuild the schema from the migrations. Destroys all data."""
+    print("DB CLEANUP: Dropping all tables")
+    Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS schema_migrations"))
+    init_db()
+
+def fill_tables(force: bool = False) -> bool:
+    """
+    Populate the database with sample data.
+    Skipped when the admin user already exists, unless force is set.
+    Returns whether any data was added.
+    """
     print("DB SETUP: Populating user table")
     admin_user = db_session.query(User).filter_by(username='admin').first()
+    if admin_user and not force:
+        print("DB SETUP: Sample data already present, skipping")
+        return False
     if not admin_user:
         create_initial_users()
     
@@ -59,6 +176,7 @@ def fill_tables():
     print("DB SETUP: Populating sample deal subscriptions")
     create_sample_deal_subscriptions()
     print("DB SETUP: Sample deal subscriptions created successfully.")
+    return True
 
 def create_initial_users():
     """Create initial admin and team users."""
@@ -99,20 +217,20 @@ def create_initial_users():
         db_session.rollback()
         print(f"Error creating users: {e}")
 
+PREDEFINED_CATEGORIES = [
+    {"name": "Entertainment", "color": "#FF9A3B3B"},
+    {"name": "Food & Drinks", "color": "#FFC08261"},
+    {"name": "Housing", "color": "#FFDBAD8C"},
+    {"name": "Lifestyle", "color": "#FFFFEBCF"},
+    {"name": "Miscellaneous", "color": "#FFFFCFAC"},
+    {"name": "Savings", "color": "#FFFFDADA"},
+    {"name": "Transportation", "color": "#FFD6CBAF"}
+]
+
 def add_predefined_categories(user_id: int):
     """Assign predefined categories to a specific user."""
-    categories = [
-        {"name": "Entertainment", "color": "#FF9A3B3B"},
-        {"name": "Food & Drinks", "color": "#FFC08261"},
-        {"name": "Housing", "color": "#FFDBAD8C"},
-        {"name": "Lifestyle", "color": "#FFFFEBCF"},
-        {"name": "Miscellaneous", "color": "#FFFFCFAC"},
-        {"name": "Savings", "color": "#FFFFDADA"},
-        {"name": "Transportation", "color": "#FFD6CBAF"}
-    ]
-
     try:
-        for category_info in categories:
+        for category_info in PREDEFINED_CATEGORIES:
             # Check if the category already exists for the user
             category = db_session.query(Category).filter_by(
                 name=category_info["name"],
@@ -359,6 +477,7 @@ def create_sample_goals():
             },
         ]
 
+        from middlewares.goal_utils import refresh_goal_spending, schedule_goal_notifications
         for user in users:
             for goal_info in sample_goals:
                 # find category id with the category name
@@ -374,6 +493,8 @@ def create_sample_goals():
                     start_date=goal_info["start_date"],
                     end_date=goal_info["end_date"]
                 )
+                refresh_goal_spending(db_session, goal)
+                schedule_goal_notifications(goal)
                 db_session.add(goal)
         
         db_session.commit()
@@ -381,11 +502,6 @@ def create_sample_goals():
         db_session.rollback()
         print(f"Error creating sample goals: {e}")
 
-def init_db():
-    """Initialize and populate the database."""
-    init_tables()
-    fill_tables()
-
 # endregion
 
 def get_db():
@@ -395,9 +511,48 @@ def get_db():
     finally:
         db_session.remove()
 
+async def get_async_db():
+    """Dependency that provides an async database session."""
+    async with AsyncSessionLocal() as session:
+        yield session
+
 # region Helpers
 # CRUD Helper Functions
 
+# COPY text format escapes, so user-entered text round-trips unchanged
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+def _format_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, str):
+        return value.translate(_COPY_ESCAPES)
+    return str(value)
+
+def copy_rows(cursor, table: str, columns: Sequence[str], rows: Iterable[tuple], batch_size: int) -> int:
+    """Stream rows into a table with COPY, flushing every batch_size rows. Returns the row count."""
+    statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    buffer = io.StringIO()
+    pending = 0
+    total = 0
+    for row in rows:
+        buffer.write("\t".join(_format_value(value) for value in row))
+        buffer.write("\n")
+        pending += 1
+        if pending >= batch_size:
+            buffer.seek(0)
+            cursor.copy_expert(statement, buffer)
+            total += pending
+            buffer = io.StringIO()
+            pending = 0
+    if pending:
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+        total += pending
+    return total
+
 def add_transaction(user_id: int, amount: float, category_id: int,
                    transaction_type: TransactionType, note: Optional[str] = None,
                    date: Optional[datetime.datetime] = None, vendor: Optional[str] = None) -> Transaction:
@@ -433,11 +588,96 @@ def get_transactions(user_id: int, limit: int = 100, offset: int = 0,
         if end_date:
             query = query.filter(Transaction.date <= end_date)
         
-        return query.order_by(Transaction.date.desc()).limit(limit).offset(offset).all()
+        return query.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit).offset(offset).all()
     except SQLAlchemyError as e:
         print(f"Error fetching transactions: {e}")
         return []
 
+async def add_transaction_async(db: AsyncSession, user_id: int, amount: float, category_id: int,
+                                transaction_type: TransactionType, note: Optional[str] = None,
+                                date: Optional[datetime.datetime] = None, vendor: Optional[str] = None,
+                                is_duplicate: bool = False) -> Transaction:
+    """Add a new transaction through an async session. The caller commits."""
+    try:
+        db_transaction = Transaction(
+            user_id=user_id,
+            amount=amount,
+            category_id=category_id,
+            transaction_type=transaction_type,
+            note=note,
+            date=date or datetime.datetime.utcnow(),
+            vendor=vendor,
+            is_duplicate=is_duplicate
+        )
+        db.add(db_transaction)
+        # flush rather than commit, so callers can apply goal deltas in the same transaction
+        await db.flush()
+        await db.refresh(db_transaction)
+        return db_transaction
+    except SQLAlchemyError as e:
+        await db.rollback()
+        print(f"Error adding transaction: {e}")
+        raise
+
+async def get_transactions_async(db: AsyncSession, user_id: int, limit: int = 100, offset: int = 0,
+                                 start_date: Optional[datetime.datetime] = None,
+                                 end_date: Optional[datetime.datetime] = None,
+                                 before: Optional[Tuple[datetime.datetime, int]] = None) -> List[Transaction]:
+    """
+    Retrieve transactions for a user through an async session, newest first, with optional date filters.
+    If before is a (date, id) keyset position, return the page right after it and ignore offset.
+    """
+    try:
+        query = select(Transaction).filter(Transaction.user_id == user_id)
+
+        if start_date:
+            query = query.filter(Transaction.date >= start_date)
+        if end_date:
+            query = query.filter(Transaction.date <= end_date)
+        if before:
+            # seeks straight to the position on (user_id, date, id), so every page costs the same
+            query = query.filter(tuple_(Transaction.date, Transaction.id) < tuple_(*before))
+            offset = 0
+
+        result = await db.execute(
+            query.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit).offset(offset)
+        )
+        return result.scalars().all()
+    except SQLAlchemyError as e:
+        print(f"Error fetching transactions: {e}")
+        return []
+
+# rows fetched from the server-side cursor per round trip when exporting
+EXPORT_BATCH_SIZE = 1000
+
+async def stream_transactions_async(user_id: int,
+                                    start_date: Optional[datetime.datetime] = None,
+                                    end_date: Optional[datetime.datetime] = None,
+                                    category_id: Optional[int] = None,
+                                    batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[list]:
+    """
+    Yield a user's transactions, newest first, in batches of rows read from a server-side cursor.
+    Each row has id, date, amount, category, transaction_type, note and vendor.
+    Uses its own connection, since the export outlives the request's session.
+    """
+    query = select(
+        Transaction.id, Transaction.date, Transaction.amount, Category.name.label("category"),
+        Transaction.transaction_type, Transaction.note, Transaction.vendor
+    ).join(Category, Transaction.category_id == Category.id).filter(Transaction.user_id == user_id)
+
+    if start_date:
+        query = query.filter(Transaction.date >= start_date)
+    if end_date:
+        query = query.filter(Transaction.date <= end_date)
+    if category_id:
+        query = query.filter(Transaction.category_id == category_id)
+
+    query = query.order_by(Transaction.date.desc(), Transaction.id.desc())
+    async with async_engine.connect() as conn:
+        result = await conn.stream(query.execution_options(yield_per=batch_size))
+        async for rows in result.partitions():
+            yield rows
+
 def add_category(name: str, user_id: Optional[int] = None, color: Optional[str] = None) -> Category:
     """Add a new category."""
     try:
@@ -477,8 +717,11 @@ def get_deals(user_id: Optional[int] = None) -> List[Deal]:
 def add_deal(user_id: int, name: str, description: str, price: float,
              address: str, longitude: float, latitude: float,
              date: Optional[datetime.datetime] = datetime.datetime.utcnow(),
-             vendor: Optional[str] = "") -> Deal:
-    """Add a new deal."""
+             vendor: Optional[str] = "", notify_subscribers: bool = False) -> Deal:
+    """
+    Add a new deal. With notify_subscribers, the deal is committed marked for the subscriber
+    fan-out (notifications.fan_out_pending_deals), so the notifications survive a restart.
+    """
     try:
         deal = Deal(
             user_id=user_id,
@@ -489,7 +732,8 @@ def add_deal(user_id: int, name: str, description: str, price: float,
             date=date,
             address=address,
             longitude=longitude,
-            latitude=latitude
+            latitude=latitude,
+            fanout_pending=notify_subscribers
         )
         db_session.add(deal)
         db_session.commit()
@@ -500,6 +744,24 @@ def add_deal(user_id: int, name: str, description: str, price: float,
         print(f"Error adding deal: {e}")
         raise
 
+async def get_deals_async(db: AsyncSession, user_id: Optional[int] = None,
+                          near: Optional[Tuple[float, float, float]] = None) -> List[Deal]:
+    """
+    Retrieve deals through an async session. Optionally for a specific user, and optionally only
+    deals in the grid cells around a (latitude, longitude, distance_km) point; callers check the exact distance.
+    """
+    try:
+        query = select(Deal)
+        if user_id is not None:
+            query = query.filter(Deal.user_id == user_id)
+        if near is not None:
+            query = query.filter(grid_cell_filter(Deal.grid_lat, Deal.grid_lon, *near))
+        result = await db.execute(query.order_by(Deal.date.desc()))
+        return result.scalars().all()
+    except SQLAlchemyError as e:
+        print(f"Error fetching deals: {e}")
+        return []
+
 def get_single_deal(deal_id: int) -> Optional[Deal]:
     """Retrieve a single deal by ID."""
     try:
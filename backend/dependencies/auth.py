@@ -1,5 +1,5 @@
 from fastapi import HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import HTTPAuthorizationCredentials
 
 import jwt
@@ -8,14 +8,14 @@ from dotenv import load_dotenv
 import os
 
 from models import User
-from db import get_db
+from db import get_async_db
 import utils
 
 load_dotenv()
 JWT_ACCESS_TOKEN_SECRET = os.getenv('JWT_ACCESS_TOKEN_SECRET')
 
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(utils.bearer_scheme), db: Session = Depends(get_db)) -> User:
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(utils.bearer_scheme), db: AsyncSession = Depends(get_async_db)) -> User:
     token = credentials.credentials
     try:
         payload = jwt.decode(token, JWT_ACCESS_TOKEN_SECRET, algorithms=['HS256'])
@@ -32,7 +32,7 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(utils.b
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return user
\ No newline at end of file
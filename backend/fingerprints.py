@@ -0,0 +1,57 @@
+"""
+Duplicate transaction detection.
+
+Every transaction carries a fingerprint set by a database trigger from user, date,
+amount, vendor and normalized note (see migrations/v0007_transaction_fingerprints.py).
+Candidates are fingerprinted by the same SQL function and matched against existing
+rows in one indexed query per batch.
+
+Callers choose what to do with duplicates:
+    skip  - do not insert them (default)
+    flag  - insert them with is_duplicate set
+    force - insert them without checking
+"""
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+DUPLICATE_MODES = ("skip", "flag", "force")
+
+# one probe of ix_transactions_user_id_fingerprint per candidate; t.date = c.date prunes to one partition
+DUPLICATE_LOOKUP = text("""
+    WITH candidates AS (
+        SELECT c.i, c.date, transaction_fingerprint(:user_id, c.date, c.amount, c.vendor, c.note) AS fingerprint
+        FROM unnest(
+            CAST(:dates AS TIMESTAMP[]), CAST(:amounts AS DOUBLE PRECISION[]),
+            CAST(:vendors AS TEXT[]), CAST(:notes AS TEXT[])
+        ) WITH ORDINALITY AS c(date, amount, vendor, note, i)
+    )
+    SELECT c.fingerprint, EXISTS (
+        SELECT 1 FROM transactions t
+        WHERE t.user_id = :user_id AND t.fingerprint = c.fingerprint AND t.date = c.date
+    )
+    FROM candidates c
+    ORDER BY c.i
+""")
+
+def find_duplicates(conn: Connection, user_id: int, rows: List[dict]) -> List[bool]:
+    """
+    For each row (a dict with date, amount, vendor and note), whether it duplicates an existing
+    transaction of the user or an earlier row in the same list.
+    """
+    if not rows:
+        return []
+    result = conn.execute(DUPLICATE_LOOKUP, {
+        "user_id": user_id,
+        "dates": [row["date"] for row in rows],
+        "amounts": [row["amount"] for row in rows],
+        "vendors": [row.get("vendor") for row in rows],
+        "notes": [row.get("note") for row in rows]
+    })
+    seen = set()
+    flags = []
+    for fingerprint, exists in result:
+        flags.append(exists or fingerprint in seen)
+        seen.add(fingerprint)
+    return flags
@@ -0,0 +1,89 @@
+"""
+Radius queries over latitude/longitude rows.
+
+Deals and deal location subscriptions carry generated `grid_lat`/`grid_lon` columns,
+the row's cell in a GRID_DEGREES grid, with a B-tree index on both (see
+migrations/v0012_location_grid_cells.py). `grid_cell_filter` turns a radius into the
+range of cells covering its bounding box, so a query reads only rows in those cells;
+callers then apply the exact distance to the few candidates.
+
+`haversine_km` and `within_distance` compute those exact distances with NumPy in one
+vectorized pass instead of a Python loop over utils.get_coordinate_distance;
+benchmark_geo.py compares the two.
+"""
+import math
+from typing import Sequence, Tuple, Union
+
+import numpy as np
+from sqlalchemy import and_, or_
+from sqlalchemy.sql.elements import ColumnElement
+
+# Must match the generated column expressions in the migration and models.py
+GRID_DEGREES = 0.5
+# same radius as utils.get_coordinate_distance
+EARTH_RADIUS_KM = 6373.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+def grid_cell(degrees: float) -> int:
+    return math.floor(degrees / GRID_DEGREES)
+
+def bounding_box(latitude: float, longitude: float, distance_km: float) -> Tuple[float, float, float, float]:
+    """
+    (min_lat, max_lat, min_lon, max_lon) containing every point within distance_km. Longitudes may run
+    past +-180 when the box crosses the antimeridian; a box reaching a pole spans every longitude.
+    """
+    delta_lat = distance_km / KM_PER_DEGREE
+    min_lat, max_lat = latitude - delta_lat, latitude + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90), min(max_lat, 90), -180, 180
+    # meridians are closest together at the box's highest latitude
+    widest = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    delta_lon = distance_km / (KM_PER_DEGREE * widest)
+    if delta_lon >= 180:
+        return min_lat, max_lat, -180, 180
+    return min_lat, max_lat, longitude - delta_lon, longitude + delta_lon
+
+def grid_cell_filter(grid_lat: ColumnElement, grid_lon: ColumnElement,
+                     latitude: float, longitude: float, distance_km: float) -> ColumnElement:
+    """A filter on the grid cell columns keeping the cells that may hold points within distance_km."""
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, distance_km)
+    lat_clause = grid_lat.between(grid_cell(min_lat), grid_cell(max_lat))
+    if min_lon <= -180 and max_lon >= 180:
+        return lat_clause
+    if min_lon < -180:
+        lon_clause = or_(grid_lon >= grid_cell(min_lon + 360), grid_lon <= grid_cell(max_lon))
+    elif max_lon > 180:
+        lon_clause = or_(grid_lon >= grid_cell(min_lon), grid_lon <= grid_cell(max_lon - 360))
+    else:
+        lon_clause = grid_lon.between(grid_cell(min_lon), grid_cell(max_lon))
+    return and_(lat_clause, lon_clause)
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Great-circle distances in km, with the formula and radius of utils.get_coordinate_distance.
+    Each argument is a scalar or an array; they broadcast, so one point against arrays of points
+    and two arrays of pairs both work.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+def within_distance(latitude: float, longitude: float, latitudes: Union[Sequence[float], np.ndarray],
+                    longitudes: Union[Sequence[float], np.ndarray], distance_km: float,
+                    prefilter: bool = True) -> np.ndarray:
+    """
+    Indices of the points within distance_km of (latitude, longitude), in their original order.
+    With prefilter, only points inside the radius's bounding box get the haversine.
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    candidates = np.arange(len(latitudes))
+    if prefilter:
+        min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, distance_km)
+        mask = (latitudes >= min_lat) & (latitudes <= max_lat)
+        if not (min_lon <= -180 and max_lon >= 180):
+            # offsets from the box's western edge, so a box across the antimeridian is still one interval
+            mask &= (longitudes - min_lon) % 360 <= max_lon - min_lon
+        candidates = np.flatnonzero(mask)
+    distances = haversine_km(latitude, longitude, latitudes[candidates], longitudes[candidates])
+    return candidates[distances <= distance_km]
@@ -0,0 +1,130 @@
+"""
+Debounced background recomputation of goal progress.
+
+Single transaction writes keep goals current with deltas (goal_utils.apply_goal_deltas)
+in their own database transaction and need no recomputation. Writes that change
+transactions without computing deltas, such as CSV imports, recurring schedule
+regeneration and category deletes, mark the user dirty instead, in two places:
+
+- `mark_goals_stale` sets `users.goals_stale_since` in the write's own transaction, so the
+  mark is as durable as the write.
+- `goal_recompute_queue.mark` after the commit adds the user to this process's dirty set,
+  so the recompute runs within seconds.
+
+A background worker recomputes each dirty user's goals from transactions at most once per
+RECOMPUTE_INTERVAL_SECONDS, and clears the persisted mark in the same transaction. Marks
+made while a user is waiting are coalesced into one recomputation. Every
+RECOMPUTE_INTERVAL_SECONDS, and once at startup, the worker also queues users whose
+persisted mark is older than that interval. These are marks whose process died, or was
+restarted, before recomputing them.
+"""
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from db import db_session
+from middlewares.goal_utils import recalc_goal_progress
+from models import User
+
+logger = logging.getLogger(__name__)
+
+# minimum time between two recomputations of the same user
+RECOMPUTE_INTERVAL_SECONDS = 60
+# how often the worker looks for due users
+POLL_INTERVAL_SECONDS = 5
+
+MARK_GOALS_STALE = text("""
+    UPDATE users SET goals_stale_since = COALESCE(goals_stale_since, now() AT TIME ZONE 'utc')
+    WHERE id = :user_id
+""")
+
+def mark_goals_stale(db, user_id: int):
+    """Persist that the user's goals need a recompute. Takes a session or connection; the caller commits."""
+    db.execute(MARK_GOALS_STALE, {"user_id": user_id})
+
+class GoalRecomputeQueue:
+    """Per-user dirty set with a minimum interval between recomputations of each user."""
+
+    def __init__(self, interval: float = RECOMPUTE_INTERVAL_SECONDS):
+        self.interval = interval
+        self._lock = threading.Lock()
+        # user id -> time of the first mark since the last recomputation
+        self._dirty: Dict[int, float] = {}
+        # user id -> time of the last recomputation, kept for one interval
+        self._last_run: Dict[int, float] = {}
+        self.marked = 0
+        self.recomputed = 0
+
+    def mark(self, user_id: int, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._dirty.setdefault(user_id, now)
+            self.marked += 1
+
+    def take_due(self, now: Optional[float] = None) -> List[int]:
+        """Remove and return the dirty users whose last recomputation is at least one interval old."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            due = [user_id for user_id in self._dirty
+                   if now - self._last_run.get(user_id, float("-inf")) >= self.interval]
+            for user_id in due:
+                del self._dirty[user_id]
+                self._last_run[user_id] = now
+            self._last_run = {user_id: ran for user_id, ran in self._last_run.items() if now - ran < self.interval}
+            self.recomputed += len(due)
+        return due
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": len(self._dirty), "marked": self.marked, "recomputed": self.recomputed}
+
+goal_recompute_queue = GoalRecomputeQueue()
+
+def recompute_user_goals(user_ids: List[int]):
+    try:
+        for user_id in user_ids:
+            try:
+                # a write marks the user while holding this row lock until it commits, and one marking
+                # during the recompute waits for it, so a mark is only cleared by a recompute that
+                # sees the write behind it. A user locked by a write in flight is left for its mark.
+                user = db_session.query(User).filter(User.id == user_id).with_for_update(skip_locked=True).first()
+                if user is None:
+                    db_session.rollback()
+                    continue
+                user.goals_stale_since = None
+                recalc_goal_progress(db_session, user_id)
+            except Exception as e:
+                db_session.rollback()
+                logger.error(f"Error recomputing goals for user {user_id}: {e}")
+    finally:
+        db_session.remove()
+
+def stale_goal_users(older_than: float = RECOMPUTE_INTERVAL_SECONDS) -> List[int]:
+    """Users whose persisted mark has waited longer than older_than seconds."""
+    try:
+        before = datetime.utcnow() - timedelta(seconds=older_than)
+        return [user_id for user_id, in db_session.query(User.id).filter(User.goals_stale_since <= before)]
+    finally:
+        db_session.remove()
+
+async def process_goal_recomputes(queue: GoalRecomputeQueue = goal_recompute_queue):
+    """Background task that recomputes the goals of dirty users outside the request path."""
+    # sweep right away, to pick up marks left behind by the previous run of the process
+    next_sweep = time.monotonic()
+    while True:
+        if time.monotonic() >= next_sweep:
+            next_sweep = time.monotonic() + queue.interval
+            try:
+                for user_id in await asyncio.to_thread(stale_goal_users, queue.interval):
+                    queue.mark(user_id)
+            except Exception as e:
+                logger.error(f"Error looking for stale goals: {e}")
+        due = queue.take_due()
+        if due:
+            await asyncio.to_thread(recompute_user_goals, due)
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
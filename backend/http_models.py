@@ -73,6 +73,7 @@ class TransactionResponse(BaseModel):
     note: Optional[str] = None
     date: datetime.datetime
     vendor: Optional[str] = None
+    is_duplicate: bool = False
 
     class Config:
         orm_mode = True
@@ -255,6 +256,45 @@ class TransactionUpdateRequest(BaseModel):
             raise ValueError("Amount must be greater than 0")
         return v
 
+class TransactionBatchOperation(BaseModel):
+    op: str
+    # required for update and delete
+    id: Optional[int] = None
+    # required for create
+    transaction: Optional[TransactionCreateRequest] = None
+    # required for update
+    changes: Optional[TransactionUpdateRequest] = None
+
+    @validator("op")
+    def validate_op(cls, v):
+        if v not in ["create", "update", "delete"]:
+            raise ValueError("op must be one of 'create', 'update' or 'delete'")
+        return v
+
+    @root_validator
+    def check_op_fields(cls, values):
+        op = values.get("op")
+        if op == "create" and values.get("transaction") is None:
+            raise ValueError("create operations require transaction")
+        if op in ("update", "delete") and values.get("id") is None:
+            raise ValueError(f"{op} operations require id")
+        if op == "update" and values.get("changes") is None:
+            raise ValueError("update operations require changes")
+        return values
+
+class TransactionBatchRequest(BaseModel):
+    operations: List[TransactionBatchOperation] = Field(..., min_items=1, max_items=1000)
+
+class TransactionBatchResult(BaseModel):
+    op: str
+    id: Optional[int] = None
+    # applied, or skipped for a create that duplicates an existing transaction
+    status: str = "applied"
+    transaction: Optional[TransactionResponse] = None
+
+class TransactionBatchResponse(BaseModel):
+    results: List[TransactionBatchResult]
+
 class GoalCreateRequest(BaseModel):
     category_id: Optional[int] = None
     goal_type: str
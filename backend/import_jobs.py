@@ -0,0 +1,107 @@
+"""
+Background CSV import jobs.
+
+`POST /transactions/csv?async=1` spools the upload to disk, records an `ImportJob`
+and returns its id. The import then runs on a worker thread after the response is
+sent, updating the job row as it goes, and is polled through
+`GET /transactions/imports/{job_id}`. Rollups are kept current by the transactions
+triggers as each batch is written; goal progress is queued for one recalculation
+(see goal_queue.py) when the job finishes.
+
+Jobs run in the process that accepted the upload, so a job whose process exits
+mid-import stays `running`; its transaction is rolled back and nothing is inserted.
+"""
+import datetime
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from typing import BinaryIO, Optional
+
+from sqlalchemy import update
+
+from csv_import import ImportReport, import_transactions
+from db import engine, db_session, get_all_categories_for_user
+from goal_queue import goal_recompute_queue
+from models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+# where uploads are spooled until their job finishes
+SPOOL_DIR = os.getenv('IMPORT_SPOOL_DIR', tempfile.gettempdir())
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+def spool_upload(file: BinaryIO) -> str:
+    """Copy an upload to a file in SPOOL_DIR in fixed-size chunks and return its path."""
+    with tempfile.NamedTemporaryFile(dir=SPOOL_DIR, prefix="import_", suffix=".csv", delete=False) as spool:
+        shutil.copyfileobj(file, spool, SPOOL_CHUNK_SIZE)
+        return spool.name
+
+def create_import_job(user_id: int, filename: Optional[str]) -> ImportJob:
+    job = ImportJob(id=uuid.uuid4().hex, user_id=user_id, filename=filename, status='pending')
+    db_session.add(job)
+    db_session.commit()
+    return job
+
+def _update_job(job_id: str, **values):
+    # separate short transactions, so progress is visible while the import transaction is still open
+    with engine.begin() as conn:
+        conn.execute(update(ImportJob).where(ImportJob.id == job_id).values(**values))
+
+def _report_progress(job_id: str, report: ImportReport):
+    _update_job(job_id, rows_processed=report.rows, rows_failed=report.error_count)
+
+def run_import_job(job_id: str, path: str, user_id: int, duplicates: str = "skip"):
+    """Run a spooled import to completion, recording the outcome on the job. Deletes the spool file."""
+    _update_job(job_id, status='running', started_at=datetime.datetime.utcnow())
+    try:
+        categories = get_all_categories_for_user(user_id=user_id)
+        with open(path, 'rb') as file:
+            report = import_transactions(
+                engine, file, user_id, categories,
+                on_progress=lambda report: _report_progress(job_id, report),
+                duplicates=duplicates
+            )
+
+        if report.inserted:
+            goal_recompute_queue.mark(user_id)
+        _update_job(
+            job_id,
+            status='completed',
+            rows_processed=report.rows,
+            rows_failed=report.error_count,
+            rows_inserted=report.inserted,
+            rows_duplicate=report.duplicates,
+            errors=json.dumps(report.errors),
+            finished_at=datetime.datetime.utcnow()
+        )
+    except Exception as e:
+        logger.error(f"Import job {job_id} failed: {e}")
+        _update_job(job_id, status='failed', error=str(e), finished_at=datetime.datetime.utcnow())
+    finally:
+        db_session.remove()
+        os.remove(path)
+
+def job_status(job: ImportJob) -> dict:
+    """The polling view of a job, with throughput in rows per second."""
+    throughput = None
+    if job.started_at:
+        elapsed = ((job.finished_at or datetime.datetime.utcnow()) - job.started_at).total_seconds()
+        throughput = round(job.rows_processed / elapsed, 1) if elapsed > 0 else None
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "filename": job.filename,
+        "rows_processed": job.rows_processed,
+        "rows_failed": job.rows_failed,
+        "rows_inserted": job.rows_inserted,
+        "rows_duplicate": job.rows_duplicate,
+        "rows_per_second": throughput,
+        "errors": json.loads(job.errors) if job.errors else [],
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at
+    }
@@ -0,0 +1,93 @@
+"""
+Database management commands.
+
+Usage:
+    python manage.py migrate          # apply pending schema migrations
+    python manage.py seed [--force]   # insert the sample users, transactions, deals and goals
+    python manage.py reset [--seed]   # drop everything and rebuild the schema (destroys all data)
+    python manage.py generate [...]   # bulk-load a synthetic load-testing dataset
+    python manage.py partitions [--detach-before YYYY-MM]   # create upcoming transaction partitions
+"""
+import argparse
+import datetime
+import time
+
+from db import engine, init_db, reset_db, fill_tables
+
+def main():
+    parser = argparse.ArgumentParser(description="Expense Tracker database management")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("migrate", help="Apply pending schema migrations")
+
+    seed_parser = subparsers.add_parser("seed", help="Populate the database with sample data")
+    seed_parser.add_argument("--force", action="store_true", help="Seed even if sample data is already present")
+
+    reset_parser = subparsers.add_parser("reset", help="Drop all tables and re-run every migration")
+    reset_parser.add_argument("--seed", action="store_true", help="Populate sample data after the reset")
+
+    generate_parser = subparsers.add_parser("generate", help="Bulk-load a synthetic dataset for load testing")
+    generate_parser.add_argument("--users", type=int, default=1000)
+    generate_parser.add_argument("--transactions-per-user", type=int, default=500)
+    generate_parser.add_argument("--custom-categories-per-user", type=int, default=0)
+    generate_parser.add_argument("--goals-per-user", type=int, default=3)
+    generate_parser.add_argument("--recurring-per-user", type=int, default=2)
+    generate_parser.add_argument("--deals", type=int, default=1000)
+    generate_parser.add_argument("--votes-per-deal", type=int, default=10, help="Mean votes per deal")
+    generate_parser.add_argument("--subscriptions-per-user", type=int, default=1)
+    generate_parser.add_argument("--months", type=int, default=24, help="Months of transaction history")
+    generate_parser.add_argument("--batch-size", type=int, default=50000, help="Rows per COPY batch")
+    generate_parser.add_argument("--workers", type=int, default=1, help="Parallel loader processes")
+    generate_parser.add_argument("--seed", type=int, default=None, help="Random seed for a reproducible dataset")
+
+    partitions_parser = subparsers.add_parser("partitions", help="Create upcoming monthly transaction partitions")
+    partitions_parser.add_argument("--months-ahead", type=int, default=None)
+    partitions_parser.add_argument("--detach-before", type=str, default=None,
+                                   help="Detach monthly partitions older than this month (YYYY-MM)")
+
+    args = parser.parse_args()
+    start = time.perf_counter()
+
+    if args.command == "migrate":
+        init_db()
+    elif args.command == "seed":
+        init_db()
+        fill_tables(force=args.force)
+    elif args.command == "reset":
+        reset_db()
+        if args.seed:
+            fill_tables()
+    elif args.command == "partitions":
+        from partitions import MONTHS_AHEAD, ensure_transaction_partitions, detach_partitions_before
+        init_db()
+        months_ahead = args.months_ahead if args.months_ahead is not None else MONTHS_AHEAD
+        print(f"Created: {ensure_transaction_partitions(engine, months_ahead=months_ahead)}")
+        if args.detach_before:
+            cutoff = datetime.datetime.strptime(args.detach_before, "%Y-%m").date()
+            print(f"Detached: {detach_partitions_before(engine, cutoff)}")
+    elif args.command == "generate":
+        from synthetic_data import GeneratorConfig, generate_dataset
+        try:
+            config = GeneratorConfig(
+                users=args.users,
+                transactions_per_user=args.transactions_per_user,
+                custom_categories_per_user=args.custom_categories_per_user,
+                goals_per_user=args.goals_per_user,
+                recurring_per_user=args.recurring_per_user,
+                deals=args.deals,
+                votes_per_deal=args.votes_per_deal,
+                subscriptions_per_user=args.subscriptions_per_user,
+                months=args.months,
+                batch_size=args.batch_size,
+                workers=args.workers,
+                seed=args.seed
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        init_db()
+        generate_dataset(config)
+
+    print(f"Done in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,18 @@
 from datetime import datetime, timedelta
+from decimal import Decimal
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, text
 from models import Category, Goal, Transaction, User
-from typing import Optional, List, Dict, Any
+from rollups import sum_spending
+from outbox import enqueue_notification
+from typing import Optional, List, Dict, Any, Tuple
 
 def recalc_goal_progress(db: Session, user_id: int, category_id: Optional[int] = None):
     """
-    Recalculate progress for all goals.
+    Recalculate progress for all goals from transactions.
     If category_id is provided, recalc goals for that category;
-    if None, recalc overall (global) spending goals.
+    if None, recalc all of the user's goals.
+    Transaction writes should use apply_goal_deltas instead; this is for bulk imports and repairs.
     """
     if category_id is None:
         goals = db.query(Goal).filter(Goal.user_id == user_id).all()
@@ -16,22 +20,79 @@ def recalc_goal_progress(db: Session, user_id: int, category_id: Optional[int] =
         goals = db.query(Goal).filter(Goal.user_id == user_id, Goal.category_id == category_id).all()
     
     for goal in goals:
-        if goal.goal_type == "amount":
-            total_spent = db.query(func.sum(Transaction.amount)).filter(
-                Transaction.user_id == user_id,
-                Transaction.date >= goal.start_date,
-                Transaction.date <= goal.end_date
-            ).scalar() or 0.0
-            goal.on_track = total_spent <= goal.limit
-            goal.amount_spent = total_spent
-        ## modify this to use the new calculate_percentage_goal_progress function
-        elif goal.goal_type == "percentage":
-            progress, on_track = calculate_percentage_goal_progress(db, user_id, goal)
-            goal.amount_spent = progress
-            goal.on_track = on_track
+        refresh_goal_spending(db, goal)
         db.add(goal)
     db.commit()
 
+def percentage_progress(previous_spent: float, spent: float) -> float:
+    """Percentage spent below the previous period (negative when spending went up)."""
+    if previous_spent > 0:
+        # example: 500 - 300 / 500 * 100 = 40
+        return ((previous_spent - spent) / previous_spent) * 100
+    return 0 if spent == 0 else 100
+
+def refresh_goal_spending(db: Session, goal: Goal):
+    """
+    Recompute a goal's persisted spent and previous_spent amounts, and on_track, from transactions.
+    A goal without a category counts spending in every category.
+    """
+    period = goal.end_date - goal.start_date
+    goal.spent = sum_spending(db, goal.user_id, goal.start_date, goal.end_date, category_id=goal.category_id)
+    goal.previous_spent = sum_spending(db, goal.user_id, goal.start_date - period, goal.start_date,
+                                       category_id=goal.category_id, include_end=False)
+    if goal.goal_type == "amount":
+        goal.on_track = float(goal.spent) <= goal.limit
+    else:
+        goal.on_track = percentage_progress(float(goal.previous_spent), float(goal.spent)) >= goal.limit
+
+# Applies signed amount changes to every goal whose window (or previous period) contains the
+# change's date and whose category matches, and re-evaluates on_track, in one statement.
+# Must agree with refresh_goal_spending and percentage_progress.
+GOAL_DELTA_UPDATE = text("""
+    WITH changes AS (
+        SELECT * FROM unnest(
+            CAST(:dates AS TIMESTAMP[]), CAST(:category_ids AS INTEGER[]), CAST(:amounts AS NUMERIC[])
+        ) AS c(date, category_id, amount)
+    ),
+    deltas AS (
+        SELECT g.id,
+               g.spent + COALESCE(SUM(c.amount) FILTER (WHERE c.date >= g.start_date), 0) AS spent,
+               g.previous_spent + COALESCE(SUM(c.amount) FILTER (WHERE c.date < g.start_date), 0) AS previous_spent
+        FROM goals g
+        JOIN changes c
+          ON (g.category_id IS NULL OR g.category_id = c.category_id)
+         AND c.date >= g.start_date - (g.end_date - g.start_date)
+         AND c.date <= g.end_date
+        WHERE g.user_id = :user_id
+        GROUP BY g.id
+    )
+    UPDATE goals g
+    SET spent = d.spent,
+        previous_spent = d.previous_spent,
+        on_track = CASE
+            WHEN g.goal_type = 'amount' THEN d.spent <= g."limit"
+            WHEN d.previous_spent > 0 THEN (d.previous_spent - d.spent) / d.previous_spent * 100 >= g."limit"
+            ELSE (CASE WHEN d.spent = 0 THEN 0 ELSE 100 END) >= g."limit"
+        END
+    FROM deltas d
+    WHERE g.id = d.id
+""")
+
+def apply_goal_deltas(db: Session, user_id: int, changes: List[Tuple[datetime, int, float]]):
+    """
+    Apply transaction writes to the user's goals. Each change is (date, category_id, signed amount):
+    +amount for an insert, -amount for a delete, and both for the old and new values of an update.
+    Runs in the caller's transaction; the caller commits.
+    """
+    if not changes:
+        return
+    db.execute(GOAL_DELTA_UPDATE, {
+        "user_id": user_id,
+        "dates": [date for date, _, _ in changes],
+        "category_ids": [category_id for _, category_id, _ in changes],
+        # numeric, so repeated deltas do not drift
+        "amounts": [Decimal(str(amount)) for _, _, amount in changes]
+    })
 
 def calculate_goal_spending(db: Session, user_id: int, goal: Goal, last_period: bool = False) -> float:
     """
@@ -45,35 +106,56 @@ def calculate_goal_spending(db: Session, user_id: int, goal: Goal, last_period:
         target_start_date -= period
         target_end_date -= period
     
-    total_spent = db.query(func.sum(Transaction.amount)).filter(
-        Transaction.user_id == user_id,
-        Transaction.date >= target_start_date,
-        Transaction.date <= target_end_date
-    ).scalar() or 0.0
+    total_spent = sum_spending(db, user_id, target_start_date, target_end_date)
     return total_spent
 
+GOAL_NOTIFICATION_TITLE = "Expense Tracker Goal!"
+
+# fraction of a goal's period after which the mid-period notification is sent
+MID_PERIOD_FRACTION = 0.8
+
+def next_notification_at(start_date: datetime, end_date: datetime, mid_notified: Optional[bool],
+                         post_notified: Optional[bool]) -> Optional[datetime]:
+    """When a goal's next notification is due: its mid-period point, then its end date, then never."""
+    if post_notified:
+        return None
+    if not mid_notified:
+        return start_date + (end_date - start_date) * MID_PERIOD_FRACTION
+    return end_date
+
+def schedule_goal_notifications(goal: Goal):
+    """Set next_notification_at from the goal's dates and notified flags. Call after changing either."""
+    goal.next_notification_at = next_notification_at(goal.start_date, goal.end_date, goal.mid_notified, goal.post_notified)
+
 ## Feel free to change the logic here based on the needs of the notification system. I am putting everything into a list, but you can manage it to just return a true/false value. 
 def get_mid_period_notifications(db: Session) -> List[Dict[str, Any]]:
     """
     Check for goals that are at least 80% through their period and not yet ended.
     For these goals (currently implemented for "amount" type),
     notify the user of how much percentage difference exists between their spending and the goal limit.
+    Notifications go to the outbox with the notified flags; the caller commits.
     """
     notifications = []
     now = datetime.utcnow()
-    # Only consider ongoing goals (end date > now)
-    ongoing_goals = db.query(Goal).filter(Goal.end_date > now, Goal.mid_notified == False).all()
+    # Only consider ongoing goals (end date > now) that are due; ended ones get the post-period notification instead
+    ongoing_goals = db.query(Goal).filter(
+        Goal.next_notification_at <= now, Goal.end_date > now, Goal.mid_notified.isnot(True)
+    ).all()
     
     for goal in ongoing_goals:
         total_duration = (goal.end_date - goal.start_date).total_seconds()
         elapsed = (now - goal.start_date).total_seconds()
         # Check if the goal's period is at least 80% complete
-        if total_duration > 0 and (elapsed / total_duration) >= 0.8:
+        if total_duration > 0 and (elapsed / total_duration) >= MID_PERIOD_FRACTION:
             total_spent = calculate_goal_spending(db, goal.user_id, goal)
             
-            category_name = db.query(Category.name).filter(Category.id == goal.category_id).first()[0]
-            if category_name is None:
+            category = db.query(Category.name).filter(Category.id == goal.category_id).first()
+            if category is None:
+                # nothing to report for uncategorized goals, but move them on to their end date
+                goal.mid_notified = True
+                schedule_goal_notifications(goal)
                 continue
+            category_name = category[0]
             
             if goal.goal_type == "amount":
                 if total_spent <= goal.limit:
@@ -105,10 +187,11 @@ def get_mid_period_notifications(db: Session) -> List[Dict[str, Any]]:
             
             # set the mid_notified flag to True
             goal.mid_notified = True
+            schedule_goal_notifications(goal)
             db.add(goal)
+            enqueue_notification(db, goal.user_id, GOAL_NOTIFICATION_TITLE, message)
                 
-            notifications.append({"goal_id": goal.id, "message": message})
-    db.commit()
+            notifications.append({"goal_id": goal.id, "user_id": goal.user_id, "message": message})
     return notifications
 
 
@@ -117,18 +200,24 @@ def get_post_period_notifications(db: Session) -> List[Dict[str, Any]]:
     For goals whose period has ended, notify the user whether they succeeded or failed their goal.
     For an "amount" goal: if total spending is under the limit, include the margin percentage;
     otherwise, include the percentage by which the goal was exceeded.
+    Notifications go to the outbox with the notified flags; the caller commits.
     """
     notifications = []
     now = datetime.utcnow()
-    ended_goals = db.query(Goal).filter(Goal.end_date <= now, Goal.post_notified == False).all()
+    ended_goals = db.query(Goal).filter(
+        Goal.next_notification_at <= now, Goal.end_date <= now, Goal.post_notified.isnot(True)
+    ).all()
     
     for goal in ended_goals:
         completed = False
         total_spent = calculate_goal_spending(db, goal.user_id, goal)
         
-        category_name = db.query(Category.name).filter(Category.id == goal.category_id).first()[0]
-        if category_name is None:
+        category = db.query(Category.name).filter(Category.id == goal.category_id).first()
+        if category is None:
+            goal.post_notified = True
+            schedule_goal_notifications(goal)
             continue
+        category_name = category[0]
         
         if goal.goal_type == "amount":
             if total_spent <= goal.limit:
@@ -162,10 +251,17 @@ def get_post_period_notifications(db: Session) -> List[Dict[str, Any]]:
         
         # set the post_notified flag to True
         goal.post_notified = True
+        schedule_goal_notifications(goal)
         db.add(goal)
+        enqueue_notification(db, goal.user_id, GOAL_NOTIFICATION_TITLE, message)
             
-        notifications.append({"goal_id": goal.id, "message": message, "completed": completed})
-    db.commit()
+        notifications.append({
+            "goal_id": goal.id,
+            "user_id": goal.user_id,
+            "message": message,
+            "completed": completed,
+            "period_days": (goal.end_date - goal.start_date).days
+        })
     return notifications
 
 
@@ -181,25 +277,13 @@ def calculate_percentage_goal_progress(db: Session, user_id: int, goal: Goal) ->
     previous_period_end_date = goal.start_date
 
     # previous_period_amount 
-    previous_period_amount = db.query(func.sum(Transaction.amount)).filter(
-        Transaction.category_id == goal.category_id,
-        Transaction.date >= previous_period_start_date,
-        Transaction.date < previous_period_end_date
-    ).scalar() or 0.0
+    previous_period_amount = sum_spending(db, user_id, previous_period_start_date, previous_period_end_date,
+                                          category_id=goal.category_id, include_end=False)
 
     # current_amount
-    current_amount = db.query(func.sum(Transaction.amount)).filter(
-        Transaction.category_id == goal.category_id,
-        Transaction.date >= goal.start_date,
-        Transaction.date <= goal.end_date
-    ).scalar() or 0.0
-
-    # Avoid division by zero
-    if previous_period_amount > 0:
-        # example: 500 - 300 / 500 * 100 = 40
-        progress_percentage = ((previous_period_amount - current_amount) / previous_period_amount) * 100
-    else:
-        progress_percentage = 0 if current_amount == 0 else 100
+    current_amount = sum_spending(db, user_id, goal.start_date, goal.end_date, category_id=goal.category_id)
+
+    progress_percentage = percentage_progress(previous_period_amount, current_amount)
 
     on_track = progress_percentage >= goal.limit
     return progress_percentage, on_track
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+Versioned schema migrations.
+
+Every module in this package named ``v<NNNN>_<description>.py`` is a migration.
+It must define ``upgrade(conn)``, which receives a SQLAlchemy connection inside
+an open transaction. Applied versions are recorded in the ``schema_migrations``
+table, so each migration runs exactly once per database.
+"""
+import importlib
+import logging
+import pkgutil
+import re
+import time
+from typing import List, NamedTuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for pg_advisory_xact_lock so concurrent workers never apply the same migration twice
+MIGRATION_LOCK_ID = 4460001
+
+MIGRATION_MODULE_PATTERN = re.compile(r'^v(\d{4})_(\w+)$')
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    module: object
+
+def discover_migrations() -> List[Migration]:
+    """Return every migration in this package, ordered by version."""
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = MIGRATION_MODULE_PATTERN.match(module_info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f"{__name__}.{module_info.name}")
+        migrations.append(Migration(int(match.group(1)), match.group(2), module))
+    migrations.sort(key=lambda m: m.version)
+    return migrations
+
+def get_current_version(conn: Connection) -> int:
+    """Return the latest applied version, or 0 for a database that has never been migrated."""
+    if conn.execute(text("SELECT to_regclass('schema_migrations')")).scalar() is None:
+        return 0
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")).scalar()
+
+def run_migrations(engine: Engine) -> List[int]:
+    """
+    Apply all pending migrations, each in its own transaction.
+    Returns the versions that were applied (empty when the schema is already current).
+    """
+    migrations = discover_migrations()
+    if not migrations:
+        return []
+
+    # fast path: a single round trip when nothing is pending
+    with engine.connect() as conn:
+        if get_current_version(conn) >= migrations[-1].version:
+            return []
+
+    applied = []
+    for migration in migrations:
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": MIGRATION_LOCK_ID})
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                "version INTEGER PRIMARY KEY, "
+                "name VARCHAR(255) NOT NULL, "
+                "applied_at TIMESTAMP NOT NULL DEFAULT (now() at time zone 'utc'))"
+            ))
+            already_applied = conn.execute(
+                text("SELECT 1 FROM schema_migrations WHERE version = :version"),
+                {"version": migration.version}
+            ).first()
+            if already_applied:
+                continue
+
+            start = time.perf_counter()
+            migration.module.upgrade(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                {"version": migration.version, "name": migration.name}
+            )
+            logger.info(f"Applied migration {migration.version:04d}_{migration.name} in {time.perf_counter() - start:.3f}s")
+            applied.append(migration.version)
+    return applied
@@ -0,0 +1,124 @@
+"""
+Baseline schema, matching what Base.metadata.create_all() produced before migrations existed.
+Every statement is guarded so databases created that way are adopted without changes.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    """
+    DO $$ BEGIN
+        CREATE TYPE transactiontype AS ENUM ('EXPENSE', 'INCOME');
+    EXCEPTION
+        WHEN duplicate_object THEN NULL;
+    END $$
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        role VARCHAR(50) NOT NULL,
+        username VARCHAR(50) NOT NULL UNIQUE,
+        password VARCHAR(100) NOT NULL,
+        firstname VARCHAR(50) NOT NULL,
+        lastname VARCHAR(50) NOT NULL,
+        xp INTEGER NOT NULL,
+        level INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS categories (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(50) NOT NULL,
+        user_id INTEGER REFERENCES users (id),
+        color VARCHAR(50)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS fcm_tokens (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        token VARCHAR(200) NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS deals (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(50) NOT NULL,
+        description VARCHAR(512) NOT NULL,
+        vendor VARCHAR(255) NOT NULL,
+        price FLOAT NOT NULL,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        address VARCHAR(255) NOT NULL,
+        longitude FLOAT NOT NULL,
+        latitude FLOAT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS deal_votes (
+        id SERIAL PRIMARY KEY,
+        deal_id INTEGER NOT NULL REFERENCES deals (id),
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        vote INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS recurring_transactions (
+        id SERIAL PRIMARY KEY,
+        start_date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        end_date TIMESTAMP WITHOUT TIME ZONE,
+        note VARCHAR(255),
+        period INTEGER NOT NULL,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        last_notified_payment_date TIMESTAMP WITHOUT TIME ZONE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS transactions (
+        id SERIAL PRIMARY KEY,
+        amount FLOAT NOT NULL,
+        category_id INTEGER NOT NULL REFERENCES categories (id),
+        transaction_type transactiontype NOT NULL,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        note VARCHAR(255),
+        date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        vendor VARCHAR,
+        recurring_id INTEGER REFERENCES recurring_transactions (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS goals (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        category_id INTEGER REFERENCES categories (id),
+        goal_type VARCHAR(20) NOT NULL,
+        "limit" FLOAT NOT NULL,
+        start_date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        end_date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        on_track BOOLEAN,
+        mid_notified BOOLEAN,
+        post_notified BOOLEAN,
+        created_at TIMESTAMP WITHOUT TIME ZONE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS deal_location_subscriptions (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        address VARCHAR(512) NOT NULL,
+        latitude FLOAT NOT NULL,
+        longitude FLOAT NOT NULL
+    )
+    """,
+]
+
+# the primary key indexes declared with index=True on every model
+INDEXED_TABLES = [
+    "users", "categories", "fcm_tokens", "deals", "deal_votes",
+    "recurring_transactions", "transactions", "goals", "deal_location_subscriptions"
+]
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
+    for table in INDEXED_TABLES:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_id ON {table} (id)"))
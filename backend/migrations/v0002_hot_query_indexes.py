@@ -0,0 +1,38 @@
+"""
+Indexes for the hot query paths, plus one vote per user per deal.
+"""
+from sqlalchemy import text
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_categories_user_id ON categories (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_transactions_user_id_date ON transactions (user_id, date)",
+    "CREATE INDEX IF NOT EXISTS ix_transactions_category_id_date ON transactions (category_id, date)",
+    "CREATE INDEX IF NOT EXISTS ix_transactions_recurring_id ON transactions (recurring_id)",
+    "CREATE INDEX IF NOT EXISTS ix_fcm_tokens_user_id ON fcm_tokens (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_deals_user_id_date ON deals (user_id, date)",
+    "CREATE INDEX IF NOT EXISTS ix_recurring_transactions_user_id ON recurring_transactions (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_goals_user_id ON goals (user_id)",
+    "CREATE INDEX IF NOT EXISTS ix_goals_end_date_mid_notified ON goals (end_date, mid_notified)",
+    "CREATE INDEX IF NOT EXISTS ix_goals_end_date_post_notified ON goals (end_date, post_notified)",
+    "CREATE INDEX IF NOT EXISTS ix_deal_location_subscriptions_user_id ON deal_location_subscriptions (user_id)",
+]
+
+def upgrade(conn):
+    for statement in INDEXES:
+        conn.execute(text(statement))
+
+    # keep the most recent vote when a user has voted on the same deal more than once
+    conn.execute(text("""
+        DELETE FROM deal_votes older
+        USING deal_votes newer
+        WHERE older.deal_id = newer.deal_id
+          AND older.user_id = newer.user_id
+          AND older.id < newer.id
+    """))
+    conn.execute(text("""
+        DO $$ BEGIN
+            ALTER TABLE deal_votes ADD CONSTRAINT uq_deal_votes_deal_id_user_id UNIQUE (deal_id, user_id);
+        EXCEPTION
+            WHEN duplicate_table OR duplicate_object THEN NULL;
+        END $$
+    """))
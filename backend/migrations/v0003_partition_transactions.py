@@ -0,0 +1,61 @@
+"""
+Convert transactions into a table range-partitioned by month on date.
+
+The existing table is renamed, a partitioned table with the same columns takes
+its place (the primary key becomes (id, date), as Postgres requires the partition
+key in every unique constraint), monthly partitions are created for every month
+that has data plus the months ahead, and the rows are copied across.
+"""
+import datetime
+
+from sqlalchemy import text
+
+from partitions import DEFAULT_PARTITION, MONTHS_AHEAD, add_months, ensure_partitions, month_start
+
+COLUMNS = "id, amount, category_id, transaction_type, user_id, note, date, vendor, recurring_id"
+
+def upgrade(conn):
+    already_partitioned = conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'transactions'::regclass"
+    )).first()
+    if already_partitioned:
+        return
+
+    conn.execute(text("ALTER TABLE transactions RENAME TO transactions_legacy"))
+    conn.execute(text("ALTER TABLE transactions_legacy RENAME CONSTRAINT transactions_pkey TO transactions_legacy_pkey"))
+    # keep the id sequence alive when the old table is dropped
+    conn.execute(text("ALTER SEQUENCE transactions_id_seq OWNED BY NONE"))
+    for index in ("ix_transactions_id", "ix_transactions_user_id_date",
+                  "ix_transactions_category_id_date", "ix_transactions_recurring_id"):
+        conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+
+    conn.execute(text("""
+        CREATE TABLE transactions (
+            id INTEGER NOT NULL DEFAULT nextval('transactions_id_seq'),
+            amount FLOAT NOT NULL,
+            category_id INTEGER NOT NULL REFERENCES categories (id),
+            transaction_type transactiontype NOT NULL,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            note VARCHAR(255),
+            date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            vendor VARCHAR,
+            recurring_id INTEGER REFERENCES recurring_transactions (id),
+            PRIMARY KEY (id, date)
+        ) PARTITION BY RANGE (date)
+    """))
+    conn.execute(text("ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id"))
+    conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF transactions DEFAULT"))
+
+    # indexes on the parent are created on every partition
+    conn.execute(text("CREATE INDEX ix_transactions_id ON transactions (id)"))
+    conn.execute(text("CREATE INDEX ix_transactions_user_id_date ON transactions (user_id, date)"))
+    conn.execute(text("CREATE INDEX ix_transactions_category_id_date ON transactions (category_id, date)"))
+    conn.execute(text("CREATE INDEX ix_transactions_recurring_id ON transactions (recurring_id)"))
+
+    this_month = month_start(datetime.datetime.utcnow())
+    oldest = conn.execute(text("SELECT MIN(date) FROM transactions_legacy")).scalar()
+    first_month = min(month_start(oldest), this_month) if oldest else add_months(this_month, -1)
+    ensure_partitions(conn, first_month, add_months(this_month, MONTHS_AHEAD))
+
+    conn.execute(text(f"INSERT INTO transactions ({COLUMNS}) SELECT {COLUMNS} FROM transactions_legacy"))
+    conn.execute(text("DROP TABLE transactions_legacy"))
@@ -0,0 +1,75 @@
+"""
+Per-user monthly rollup of transactions, keyed by (user_id, category_id, transaction_type, month).
+
+Statement-level triggers on transactions apply the signed sum and count of every
+inserted, updated or deleted row, so the rollup stays exact for single writes,
+bulk inserts, COPY and bulk updates such as category reassignment alike.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS monthly_spending_rollups (
+        user_id INTEGER NOT NULL,
+        category_id INTEGER NOT NULL,
+        transaction_type transactiontype NOT NULL,
+        month TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        total NUMERIC NOT NULL DEFAULT 0,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, category_id, transaction_type, month)
+    )
+    """,
+    """
+    CREATE OR REPLACE FUNCTION apply_transaction_rollup() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            INSERT INTO monthly_spending_rollups AS r (user_id, category_id, transaction_type, month, total, count)
+            SELECT user_id, category_id, transaction_type, date_trunc('month', date), -SUM(amount::numeric), -COUNT(*)
+            FROM old_rows
+            GROUP BY user_id, category_id, transaction_type, date_trunc('month', date)
+            ON CONFLICT (user_id, category_id, transaction_type, month)
+            DO UPDATE SET total = r.total + EXCLUDED.total, count = r.count + EXCLUDED.count;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO monthly_spending_rollups AS r (user_id, category_id, transaction_type, month, total, count)
+            SELECT user_id, category_id, transaction_type, date_trunc('month', date), SUM(amount::numeric), COUNT(*)
+            FROM new_rows
+            GROUP BY user_id, category_id, transaction_type, date_trunc('month', date)
+            ON CONFLICT (user_id, category_id, transaction_type, month)
+            DO UPDATE SET total = r.total + EXCLUDED.total, count = r.count + EXCLUDED.count;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS transactions_rollup_insert ON transactions",
+    "DROP TRIGGER IF EXISTS transactions_rollup_update ON transactions",
+    "DROP TRIGGER IF EXISTS transactions_rollup_delete ON transactions",
+    """
+    CREATE TRIGGER transactions_rollup_insert AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_transaction_rollup()
+    """,
+    """
+    CREATE TRIGGER transactions_rollup_update AFTER UPDATE ON transactions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_transaction_rollup()
+    """,
+    """
+    CREATE TRIGGER transactions_rollup_delete AFTER DELETE ON transactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_transaction_rollup()
+    """,
+    # backfill from the existing transactions
+    "DELETE FROM monthly_spending_rollups",
+    """
+    INSERT INTO monthly_spending_rollups (user_id, category_id, transaction_type, month, total, count)
+    SELECT user_id, category_id, transaction_type, date_trunc('month', date), SUM(amount::numeric), COUNT(*)
+    FROM transactions
+    GROUP BY user_id, category_id, transaction_type, date_trunc('month', date)
+    """,
+]
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
@@ -0,0 +1,9 @@
+"""
+Extend the per-user transaction index with id so keyset pages on (date, id) seek directly.
+"""
+from sqlalchemy import text
+
+def upgrade(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_transactions_user_id_date_id ON transactions (user_id, date, id)"))
+    # (user_id, date) is a prefix of the new index
+    conn.execute(text("DROP INDEX IF EXISTS ix_transactions_user_id_date"))
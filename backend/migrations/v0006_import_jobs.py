@@ -0,0 +1,28 @@
+"""
+Background CSV import jobs, polled through GET /transactions/imports/{job_id}.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS import_jobs (
+        id VARCHAR(36) PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        filename VARCHAR(255),
+        status VARCHAR(20) NOT NULL DEFAULT 'pending',
+        rows_processed INTEGER NOT NULL DEFAULT 0,
+        rows_failed INTEGER NOT NULL DEFAULT 0,
+        rows_inserted INTEGER NOT NULL DEFAULT 0,
+        errors TEXT,
+        error TEXT,
+        created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+        started_at TIMESTAMP WITHOUT TIME ZONE,
+        finished_at TIMESTAMP WITHOUT TIME ZONE
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_import_jobs_user_id ON import_jobs (user_id)",
+]
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
@@ -0,0 +1,60 @@
+"""
+Duplicate detection fingerprints on transactions.
+
+`transaction_fingerprint()` hashes user, date, amount (to the cent), vendor and note
+(case and whitespace normalized). A BEFORE trigger keeps `transactions.fingerprint`
+current for every write path, including COPY, and the duplicate lookups in
+fingerprints.py call the same function, so there is a single definition of a match.
+
+The index is not unique: a unique index on a partitioned table must include `date`,
+and `duplicates=force` has to be able to insert a copy. `is_duplicate` marks rows
+inserted with `duplicates=flag`.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    """
+    CREATE OR REPLACE FUNCTION transaction_fingerprint(
+        user_id INTEGER, date TIMESTAMP, amount DOUBLE PRECISION, vendor TEXT, note TEXT
+    ) RETURNS TEXT AS $$
+        SELECT encode(sha256(convert_to(
+            user_id::text
+            || '|' || to_char(date, 'YYYY-MM-DD HH24:MI:SS.US')
+            || '|' || round(amount::numeric, 2)::text
+            || '|' || lower(regexp_replace(btrim(coalesce(vendor, '')), '\\s+', ' ', 'g'))
+            || '|' || lower(regexp_replace(btrim(coalesce(note, '')), '\\s+', ' ', 'g')),
+            'UTF8'
+        )), 'hex')
+    $$ LANGUAGE SQL IMMUTABLE
+    """,
+    """
+    CREATE OR REPLACE FUNCTION set_transaction_fingerprint() RETURNS trigger AS $$
+    BEGIN
+        NEW.fingerprint := transaction_fingerprint(NEW.user_id, NEW.date, NEW.amount, NEW.vendor, NEW.note);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS fingerprint VARCHAR(64)",
+    "ALTER TABLE transactions ADD COLUMN IF NOT EXISTS is_duplicate BOOLEAN NOT NULL DEFAULT false",
+    # the backfill nets to zero in the rollups, so skip the rollup trigger for it
+    "ALTER TABLE transactions DISABLE TRIGGER transactions_rollup_update",
+    """
+    UPDATE transactions
+    SET fingerprint = transaction_fingerprint(user_id, date, amount, vendor, note)
+    WHERE fingerprint IS NULL
+    """,
+    "ALTER TABLE transactions ENABLE TRIGGER transactions_rollup_update",
+    "DROP TRIGGER IF EXISTS transactions_fingerprint ON transactions",
+    """
+    CREATE TRIGGER transactions_fingerprint
+    BEFORE INSERT OR UPDATE OF user_id, date, amount, vendor, note ON transactions
+    FOR EACH ROW EXECUTE FUNCTION set_transaction_fingerprint()
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_transactions_user_id_fingerprint ON transactions (user_id, fingerprint)",
+    "ALTER TABLE import_jobs ADD COLUMN IF NOT EXISTS rows_duplicate INTEGER NOT NULL DEFAULT 0",
+]
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
@@ -0,0 +1,31 @@
+"""
+Persisted goal spending, updated with signed deltas on transaction writes (see goal_utils.apply_goal_deltas).
+
+`spent` covers the goal window and `previous_spent` the equally long period before it,
+both limited to the goal's category when it has one.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    "ALTER TABLE goals ADD COLUMN IF NOT EXISTS spent NUMERIC NOT NULL DEFAULT 0",
+    "ALTER TABLE goals ADD COLUMN IF NOT EXISTS previous_spent NUMERIC NOT NULL DEFAULT 0",
+    """
+    UPDATE goals g
+    SET spent = COALESCE((
+            SELECT SUM(t.amount::numeric) FROM transactions t
+            WHERE t.user_id = g.user_id
+              AND (g.category_id IS NULL OR t.category_id = g.category_id)
+              AND t.date >= g.start_date AND t.date <= g.end_date
+        ), 0),
+        previous_spent = COALESCE((
+            SELECT SUM(t.amount::numeric) FROM transactions t
+            WHERE t.user_id = g.user_id
+              AND (g.category_id IS NULL OR t.category_id = g.category_id)
+              AND t.date >= g.start_date - (g.end_date - g.start_date) AND t.date < g.start_date
+        ), 0)
+    """,
+]
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
@@ -0,0 +1,32 @@
+"""
+Due times for goal notifications.
+
+`goals.next_notification_at` is when the goal's next notification falls due: the 80%
+point of its period until the mid-period notification is sent, then its end date until
+the post-period notification is sent, then NULL. The notification scheduler reads the
+earliest due time from the partial index and only loads goals that are due, so the
+end_date/notified scan indexes are no longer used.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    "ALTER TABLE goals ADD COLUMN IF NOT EXISTS next_notification_at TIMESTAMP",
+    """
+    UPDATE goals
+    SET next_notification_at = CASE
+        WHEN post_notified THEN NULL
+        WHEN NOT coalesce(mid_notified, false) THEN start_date + (end_date - start_date) * 0.8
+        ELSE end_date
+    END
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_goals_next_notification_at ON goals (next_notification_at)
+    WHERE next_notification_at IS NOT NULL
+    """,
+    "DROP INDEX IF EXISTS ix_goals_end_date_mid_notified",
+    "DROP INDEX IF EXISTS ix_goals_end_date_post_notified",
+]
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
@@ -0,0 +1,40 @@
+"""
+Stored next payment dates for recurring payment reminders.
+
+`recurring_transactions.next_payment_date` is the next payment that has not been
+reminded about yet (NULL once the schedule has ended). The reminder loop reads only the
+schedules due within its window from the partial index and advances the column as it
+sends; the recurring routes set it whenever a schedule changes.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    "ALTER TABLE recurring_transactions ADD COLUMN IF NOT EXISTS next_payment_date TIMESTAMP",
+    # the first payment after now, skipping one that was already reminded about (see utils.next_payment_date)
+    """
+    WITH upcoming AS (
+        SELECT id, CASE
+            WHEN start_date > (now() AT TIME ZONE 'utc') THEN start_date
+            ELSE start_date + (floor(extract(epoch FROM (now() AT TIME ZONE 'utc') - start_date) / (period * 86400)) + 1)
+                * period * interval '1 day'
+        END AS due
+        FROM recurring_transactions
+    )
+    UPDATE recurring_transactions r
+    SET next_payment_date = CASE
+        WHEN upcoming.due = r.last_notified_payment_date THEN upcoming.due + r.period * interval '1 day'
+        ELSE upcoming.due
+    END
+    FROM upcoming
+    WHERE upcoming.id = r.id
+    """,
+    "UPDATE recurring_transactions SET next_payment_date = NULL WHERE next_payment_date > end_date",
+    """
+    CREATE INDEX IF NOT EXISTS ix_recurring_transactions_next_payment_date ON recurring_transactions (next_payment_date)
+    WHERE next_payment_date IS NOT NULL
+    """,
+]
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
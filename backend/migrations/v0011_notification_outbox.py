@@ -0,0 +1,31 @@
+"""
+Outbox of push notifications, written in the same transaction as the change that
+triggers them and sent by the dispatcher in outbox.py.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS notification_outbox (
+        id BIGSERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        title VARCHAR(255) NOT NULL,
+        body TEXT NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        available_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+        devices_sent INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+        sent_at TIMESTAMP WITHOUT TIME ZONE
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_notification_outbox_available_at ON notification_outbox (available_at)
+    WHERE status = 'pending'
+    """,
+]
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
@@ -0,0 +1,30 @@
+"""
+Grid cells for radius queries on deals and deal location subscriptions.
+
+`grid_lat`/`grid_lon` are generated from the coordinates, so every write path,
+including COPY and bulk updates, keeps them current. The cell size must match
+geo.GRID_DEGREES.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    "ALTER TABLE deals ADD COLUMN IF NOT EXISTS grid_lat INTEGER GENERATED ALWAYS AS (floor(latitude / 0.5)::integer) STORED",
+    "ALTER TABLE deals ADD COLUMN IF NOT EXISTS grid_lon INTEGER GENERATED ALWAYS AS (floor(longitude / 0.5)::integer) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_deals_grid_lat_grid_lon ON deals (grid_lat, grid_lon)",
+    """
+    ALTER TABLE deal_location_subscriptions
+    ADD COLUMN IF NOT EXISTS grid_lat INTEGER GENERATED ALWAYS AS (floor(latitude / 0.5)::integer) STORED
+    """,
+    """
+    ALTER TABLE deal_location_subscriptions
+    ADD COLUMN IF NOT EXISTS grid_lon INTEGER GENERATED ALWAYS AS (floor(longitude / 0.5)::integer) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_deal_location_subscriptions_grid_lat_grid_lon
+    ON deal_location_subscriptions (grid_lat, grid_lon)
+    """,
+]
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
@@ -0,0 +1,76 @@
+"""
+Denormalized vote counters on deals.
+
+`deals.upvotes`/`deals.downvotes` are kept exact by statement-level triggers on
+deal_votes, like the transaction rollups: every insert, vote change and delete,
+including COPY and cascaded deletes, adjusts the counters of the affected deals
+in the same statement. Concurrent votes on a deal serialize on its row, so no
+increment is lost.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    "ALTER TABLE deals ADD COLUMN IF NOT EXISTS upvotes INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE deals ADD COLUMN IF NOT EXISTS downvotes INTEGER NOT NULL DEFAULT 0",
+    """
+    CREATE OR REPLACE FUNCTION apply_deal_vote_counts() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE deals d
+            SET upvotes = d.upvotes - v.up, downvotes = d.downvotes - v.down
+            FROM (
+                SELECT deal_id, COUNT(*) FILTER (WHERE vote = 1) AS up, COUNT(*) FILTER (WHERE vote = -1) AS down
+                FROM old_rows
+                GROUP BY deal_id
+            ) v
+            WHERE d.id = v.deal_id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            UPDATE deals d
+            SET upvotes = d.upvotes + v.up, downvotes = d.downvotes + v.down
+            FROM (
+                SELECT deal_id, COUNT(*) FILTER (WHERE vote = 1) AS up, COUNT(*) FILTER (WHERE vote = -1) AS down
+                FROM new_rows
+                GROUP BY deal_id
+            ) v
+            WHERE d.id = v.deal_id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS deal_votes_count_insert ON deal_votes",
+    "DROP TRIGGER IF EXISTS deal_votes_count_update ON deal_votes",
+    "DROP TRIGGER IF EXISTS deal_votes_count_delete ON deal_votes",
+    """
+    CREATE TRIGGER deal_votes_count_insert AFTER INSERT ON deal_votes
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_deal_vote_counts()
+    """,
+    """
+    CREATE TRIGGER deal_votes_count_update AFTER UPDATE ON deal_votes
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_deal_vote_counts()
+    """,
+    """
+    CREATE TRIGGER deal_votes_count_delete AFTER DELETE ON deal_votes
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION apply_deal_vote_counts()
+    """,
+    # backfill from the existing votes
+    """
+    UPDATE deals d
+    SET upvotes = COALESCE(v.up, 0), downvotes = COALESCE(v.down, 0)
+    FROM deals d2
+    LEFT JOIN (
+        SELECT deal_id, COUNT(*) FILTER (WHERE vote = 1) AS up, COUNT(*) FILTER (WHERE vote = -1) AS down
+        FROM deal_votes
+        GROUP BY deal_id
+    ) v ON v.deal_id = d2.id
+    WHERE d.id = d2.id
+    """,
+]
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
@@ -0,0 +1,15 @@
+"""
+Index for deleting sent and failed notifications past their retention (outbox.purge_finished).
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    """
+    CREATE INDEX IF NOT EXISTS ix_notification_outbox_created_at ON notification_outbox (created_at)
+    WHERE status <> 'pending'
+    """,
+]
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
@@ -0,0 +1,15 @@
+"""
+Durable new-deal fan-out: a deal is inserted with `fanout_pending` set, and the flag is
+cleared in the same transaction that queues its subscribers' notifications (see
+notifications.fan_out_pending_deals). Existing deals are not notified again.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    "ALTER TABLE deals ADD COLUMN IF NOT EXISTS fanout_pending BOOLEAN NOT NULL DEFAULT false",
+    "CREATE INDEX IF NOT EXISTS ix_deals_fanout_pending ON deals (id) WHERE fanout_pending",
+]
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
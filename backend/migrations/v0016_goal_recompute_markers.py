@@ -0,0 +1,18 @@
+"""
+Durable goal recompute marks: `users.goals_stale_since` is set in the same transaction as
+a write that changes transactions without goal deltas, and cleared by the recompute (see
+goal_queue.py), so a mark survives a restart before its recompute runs.
+"""
+from sqlalchemy import text
+
+STATEMENTS = [
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS goals_stale_since TIMESTAMP WITHOUT TIME ZONE",
+    """
+    CREATE INDEX IF NOT EXISTS ix_users_goals_stale_since ON users (goals_stale_since)
+    WHERE goals_stale_since IS NOT NULL
+    """,
+]
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
@@ -1,6 +1,6 @@
 # models.py
 from typing import Optional
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum as SQLEnum, Boolean
+from sqlalchemy import BigInteger, Column, Computed, Integer, String, Float, DateTime, ForeignKey, Enum as SQLEnum, Boolean, Index, UniqueConstraint, Numeric, Text, FetchedValue, text
 from sqlalchemy.orm import relationship, backref
 import enum
 import datetime
@@ -19,6 +19,9 @@ class TransactionType(enum.Enum):
 
 class Category(Base):
     __tablename__ = 'categories'
+    __table_args__ = (
+        Index('ix_categories_user_id', 'user_id'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(50), nullable=False)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True)  # Null for global categories
@@ -32,13 +35,25 @@ class Category(Base):
 
 class Transaction(Base):
     __tablename__ = 'transactions'
-    id = Column(Integer, primary_key=True, index=True)
+    __table_args__ = (
+        # per-user history (keyset pagination on date, id) and date-window statistics
+        Index('ix_transactions_user_id_date_id', 'user_id', 'date', 'id'),
+        # category goal progress
+        Index('ix_transactions_category_id_date', 'category_id', 'date'),
+        Index('ix_transactions_recurring_id', 'recurring_id'),
+        # duplicate detection, see fingerprints.py
+        Index('ix_transactions_user_id_fingerprint', 'user_id', 'fingerprint'),
+        # monthly range partitions, see partitions.py
+        {'postgresql_partition_by': 'RANGE (date)'},
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     amount = Column(Float, nullable=False)
     category_id = Column(Integer, ForeignKey('categories.id'), nullable=False)
     transaction_type = Column(SQLEnum(TransactionType, name="transactiontype"), nullable=False)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     note = Column(String(255), nullable=True)
-    date = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    # part of the primary key because the table is partitioned on it
+    date = Column(DateTime, primary_key=True, default=datetime.datetime.utcnow, nullable=False)
     
     # Change the vendor field to be defined as a column
     vendor = Column(String, nullable=True)
@@ -46,6 +61,11 @@ class Transaction(Base):
     # Recurring ID column and relationship remain unchanged
     recurring_id = Column(Integer, ForeignKey('recurring_transactions.id'), nullable=True)
     recurring = relationship("RecurringTransaction", backref="transactions", foreign_keys=[recurring_id])
+
+    # set by a database trigger from user, date, amount, vendor and note
+    fingerprint = Column(String(64), nullable=True, server_default=FetchedValue(), server_onupdate=FetchedValue())
+    # inserted with duplicates=flag while an identical transaction existed
+    is_duplicate = Column(Boolean, nullable=False, default=False, server_default='false')
     
     user = relationship("User", back_populates="transactions")
     category = relationship("Category", back_populates="transactions")
@@ -53,9 +73,51 @@ class Transaction(Base):
     def __repr__(self):
         return f'<Transaction {self.id} - {self.amount}>'
 
+class MonthlySpendingRollup(Base):
+    """Sum and count of a user's transactions per category, type and month. Maintained by database triggers."""
+    __tablename__ = 'monthly_spending_rollups'
+    user_id = Column(Integer, primary_key=True)
+    category_id = Column(Integer, primary_key=True)
+    transaction_type = Column(SQLEnum(TransactionType, name="transactiontype", create_type=False), primary_key=True)
+    month = Column(DateTime, primary_key=True)
+    total = Column(Numeric, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<MonthlySpendingRollup {self.user_id} {self.category_id} {self.month:%Y-%m} {self.total}>'
+
+class ImportJob(Base):
+    """A CSV import running in the background; see import_jobs.py."""
+    __tablename__ = 'import_jobs'
+    __table_args__ = (
+        Index('ix_import_jobs_user_id', 'user_id'),
+    )
+    id = Column(String(36), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    filename = Column(String(255), nullable=True)
+    # pending, running, completed or failed
+    status = Column(String(20), nullable=False, default='pending')
+    rows_processed = Column(Integer, nullable=False, default=0)
+    rows_failed = Column(Integer, nullable=False, default=0)
+    rows_inserted = Column(Integer, nullable=False, default=0)
+    rows_duplicate = Column(Integer, nullable=False, default=0)
+    # JSON list of {"row", "error"}, capped at csv_import.MAX_REPORTED_ERRORS
+    errors = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<ImportJob {self.id} {self.status}>'
+
 # Update User model to include relationships
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        # users whose goals wait for a recompute, see goal_queue.py
+        Index('ix_users_goals_stale_since', 'goals_stale_since', postgresql_where=text('goals_stale_since IS NOT NULL')),
+    )
     id = Column(Integer, primary_key=True, index=True)
     role = Column(String(50), nullable=False, default='user')
     username = Column(String(50), unique=True, nullable=False)
@@ -64,6 +126,9 @@ class User(Base):
     lastname = Column(String(50), nullable=False)
     xp = Column(Integer, default=1, nullable=False)
     level = Column(Integer, default=1, nullable=False)
+    # set in the same transaction as a write that changes transactions without goal deltas,
+    # cleared by the goal recompute; see goal_queue.mark_goals_stale
+    goals_stale_since = Column(DateTime, nullable=True)
 
     categories = relationship("Category", back_populates="user", cascade="all, delete-orphan")
     transactions = relationship("Transaction", back_populates="user", cascade="all, delete-orphan")
@@ -95,6 +160,9 @@ class UserLevelInfo:
         
 class FcmToken(Base):
     __tablename__ = 'fcm_tokens'
+    __table_args__ = (
+        Index('ix_fcm_tokens_user_id', 'user_id'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     token = Column(String(200), unique=True, nullable=False)
@@ -109,8 +177,43 @@ class FcmToken(Base):
         return f'<FcmToken {self.token!r}>'
 
         
+class NotificationOutbox(Base):
+    """A push notification to one user, written with the change that triggers it; see outbox.py."""
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (
+        # the dispatcher's claim query
+        Index('ix_notification_outbox_available_at', 'available_at', postgresql_where=text("status = 'pending'")),
+        # the retention purge
+        Index('ix_notification_outbox_created_at', 'created_at', postgresql_where=text("status <> 'pending'")),
+    )
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    title = Column(String(255), nullable=False)
+    body = Column(Text, nullable=False)
+    # pending, sent or failed
+    status = Column(String(20), nullable=False, default='pending')
+    attempts = Column(Integer, nullable=False, default=0)
+    # pending rows can be claimed from this time on; claims and retries move it forward
+    available_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    devices_sent = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    user = relationship("User", backref=backref("notifications", cascade="all, delete-orphan"))
+
+    def __repr__(self):
+        return f'<NotificationOutbox {self.id} to user {self.user_id} {self.status}>'
+
 class Deal(Base):
     __tablename__ = 'deals'
+    __table_args__ = (
+        Index('ix_deals_user_id_date', 'user_id', 'date'),
+        # radius filters, see geo.py
+        Index('ix_deals_grid_lat_grid_lon', 'grid_lat', 'grid_lon'),
+        # deals whose subscriber notifications are not queued yet, see notifications.fan_out_pending_deals
+        Index('ix_deals_fanout_pending', 'id', postgresql_where=text('fanout_pending')),
+    )
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(50), nullable=False)
     description = Column(String(512), nullable=False)
@@ -121,6 +224,14 @@ class Deal(Base):
     address = Column(String(255), nullable=False)
     longitude = Column(Float, nullable=False)
     latitude = Column(Float, nullable=False)
+    # grid cell of the location, generated by the database; see geo.GRID_DEGREES
+    grid_lat = Column(Integer, Computed('floor(latitude / 0.5)::integer', persisted=True))
+    grid_lon = Column(Integer, Computed('floor(longitude / 0.5)::integer', persisted=True))
+    # maintained by triggers on deal_votes, see migrations/v0013_deal_vote_counts.py
+    upvotes = Column(Integer, nullable=False, default=0)
+    downvotes = Column(Integer, nullable=False, default=0)
+    # set with the insert, cleared in the transaction that queues the subscriber notifications
+    fanout_pending = Column(Boolean, nullable=False, default=False)
     
     user = relationship("User", backref=backref("deals", cascade="all, delete-orphan"))
 
@@ -129,6 +240,10 @@ class Deal(Base):
     
 class DealVote(Base):
     __tablename__ = 'deal_votes'
+    __table_args__ = (
+        # one vote per user per deal; also serves lookups by deal_id alone
+        UniqueConstraint('deal_id', 'user_id', name='uq_deal_votes_deal_id_user_id'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     deal_id = Column(Integer, ForeignKey('deals.id'), nullable=False)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -142,6 +257,12 @@ class DealVote(Base):
 
 class RecurringTransaction(Base):
     __tablename__ = 'recurring_transactions'
+    __table_args__ = (
+        Index('ix_recurring_transactions_user_id', 'user_id'),
+        # schedules due for a payment reminder
+        Index('ix_recurring_transactions_next_payment_date', 'next_payment_date',
+              postgresql_where=text('next_payment_date IS NOT NULL')),
+    )
     id = Column(Integer, primary_key=True, index=True)
     start_date = Column(DateTime, nullable=False)
     end_date = Column(DateTime, nullable=True)
@@ -149,6 +270,8 @@ class RecurringTransaction(Base):
     period = Column(Integer, nullable=False)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     last_notified_payment_date = Column(DateTime, nullable=True)
+    # next payment not yet reminded about, see utils.next_payment_date; NULL once the schedule has ended
+    next_payment_date = Column(DateTime, nullable=True)
     user = relationship("User", backref=backref("recurring_transactions", cascade="all, delete-orphan"))
     
     def __repr__(self):
@@ -157,6 +280,12 @@ class RecurringTransaction(Base):
 # New model for spending goals.
 class Goal(Base):
     __tablename__ = 'goals'
+    __table_args__ = (
+        Index('ix_goals_user_id', 'user_id'),
+        # earliest pending notification, for the goal notification scheduler
+        Index('ix_goals_next_notification_at', 'next_notification_at',
+              postgresql_where=text('next_notification_at IS NOT NULL')),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     category_id = Column(Integer, ForeignKey('categories.id'), nullable=True)
@@ -165,8 +294,14 @@ class Goal(Base):
     start_date = Column(DateTime, nullable=False)
     end_date = Column(DateTime, nullable=False)
     on_track = Column(Boolean, default=True)
+    # spending in the goal window and in the equally long period before it, kept current by
+    # goal_utils.apply_goal_deltas on every transaction write
+    spent = Column(Numeric, nullable=False, default=0)
+    previous_spent = Column(Numeric, nullable=False, default=0)
     mid_notified = Column(Boolean, default=False)
     post_notified = Column(Boolean, default=False)
+    # when the next mid-period or post-period notification is due, see goal_utils.next_notification_at
+    next_notification_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
     user = relationship("User", backref=backref("goals", cascade="all, delete-orphan"))
@@ -177,11 +312,18 @@ class Goal(Base):
 
 class DealLocationSubscription(Base):
     __tablename__ = 'deal_location_subscriptions'
+    __table_args__ = (
+        Index('ix_deal_location_subscriptions_user_id', 'user_id'),
+        # subscribers near a new deal, see geo.py
+        Index('ix_deal_location_subscriptions_grid_lat_grid_lon', 'grid_lat', 'grid_lon'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     address = Column(String(512), nullable=False)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
+    grid_lat = Column(Integer, Computed('floor(latitude / 0.5)::integer', persisted=True))
+    grid_lon = Column(Integer, Computed('floor(longitude / 0.5)::integer', persisted=True))
 
     user = relationship("User", backref=backref("deal_location_subscriptions", cascade="all, delete-orphan"))
 
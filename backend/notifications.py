@@ -1,19 +1,50 @@
 import asyncio
 import logging
+import os
+import random
+import threading
 import time
-from utils import get_coordinate_distance
-from middlewares.goal_utils import get_mid_period_notifications, get_post_period_notifications, recalc_goal_progress
+from typing import List, Optional, Tuple
+import httpx
+from utils import next_payment_date
+from geo import grid_cell_filter, within_distance
+from middlewares.goal_utils import get_mid_period_notifications, get_post_period_notifications
 from models import Deal, DealLocationSubscription, FcmToken, Goal, User, RecurringTransaction
 import json
-import requests
 from google.oauth2 import service_account
 from google.auth.transport.requests import Request
 from db import db_session
+from outbox import (OUTBOX_BATCH_SIZE, OUTBOX_POLL_SECONDS, OUTBOX_PURGE_INTERVAL_SECONDS, claim_batch, enqueue_notification,
+                    enqueue_notifications, purge_finished, record_results)
+from sqlalchemy import func
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
 FCM_ENDPOINT = "https://fcm.googleapis.com/v1/projects/expense-tracker-app-448920/messages:send"
+FCM_SERVICE_ACCOUNT_FILE = os.getenv('FCM_SERVICE_ACCOUNT_FILE', 'expense-tracker-firebase.json')
+# access tokens last an hour; refresh a little early so a send never uses one that expires in flight
+FCM_TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+# concurrent sends per fan-out, and the size of the connection pool
+FCM_MAX_CONCURRENCY = int(os.getenv('FCM_MAX_CONCURRENCY', 100))
+FCM_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+# HTTP/2 multiplexes the sends over a few connections; needs the h2 package (httpx[http2])
+FCM_HTTP2 = os.getenv('FCM_HTTP2', '0') == '1'
+FCM_MAX_RETRIES = 3
+FCM_BACKOFF_SECONDS = 0.5
+FCM_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# subscribers within this distance of a new deal are notified
+DEAL_NOTIFICATION_DISTANCE_KM = 100
+# how often every process looks for deals whose fan-out was not done after their request
+DEAL_FANOUT_SWEEP_SECONDS = 30
+
+# The goal notification scheduler sleeps until the earliest next_notification_at, but wakes at least
+# this often to pick up goals created or rescheduled since it went to sleep
+GOAL_SCHEDULER_MAX_SLEEP_SECONDS = 60
+# keeps a goal that stays due (e.g. its notification keeps failing) from turning the loop into a busy wait
+GOAL_SCHEDULER_MIN_SLEEP_SECONDS = 1
 
 class FirebaseHTTPV1:
     def __init__(self, service_account_file):
@@ -22,170 +53,342 @@ class FirebaseHTTPV1:
             scopes=['https://www.googleapis.com/auth/firebase.messaging']
         )
         self.project_id = self.credentials.project_id
+        # pooled keep-alive connections for the app's event loop, created on first use
+        self._client: Optional[httpx.AsyncClient] = None
+        # one refresh at a time; senders wait for it and then use the new token
+        self._token_lock = threading.Lock()
+        self._auth_request = Request()
+
+    def _cached_token(self) -> Optional[str]:
+        """The current access token, unless it expires within FCM_TOKEN_REFRESH_MARGIN."""
+        expiry = self.credentials.expiry
+        if self.credentials.token and expiry and datetime.utcnow() < expiry - FCM_TOKEN_REFRESH_MARGIN:
+            return self.credentials.token
+        return None
 
     def get_access_token(self):
-        if self.credentials.expired or not self.credentials.valid:
-            self.credentials.refresh(Request())
-        return self.credentials.token
+        token = self._cached_token()
+        if token:
+            return token
+        with self._token_lock:
+            # another sender may have refreshed while this one waited for the lock
+            token = self._cached_token()
+            if token is None:
+                self.credentials.refresh(self._auth_request)
+                token = self.credentials.token
+            return token
 
-    def send_single_notification(self, device_token, title, body):
-        try:
-            access_token = self.get_access_token()
-            
-            logger.info(f"Sending notification to {device_token}")
-            
-            # Construct the message payload
-            message = {
-                "message": {
-                    "token": device_token,
-                    "notification": {
-                        "title": title,
-                        "body": body
-                    }
+    def _new_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=FCM_HTTP2,
+            timeout=FCM_TIMEOUT,
+            limits=httpx.Limits(max_connections=FCM_MAX_CONCURRENCY, max_keepalive_connections=FCM_MAX_CONCURRENCY)
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = self._new_client()
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _send(self, client: httpx.AsyncClient, access_token: str, device_token: str, title: str, body: str):
+        """Send one message, retrying 429, 5xx and transport errors with exponential backoff."""
+        logger.info(f"Sending notification to {device_token}")
+        
+        # Construct the message payload
+        message = {
+            "message": {
+                "token": device_token,
+                "notification": {
+                    "title": title,
+                    "body": body
                 }
             }
+        }
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json; UTF-8",
+        }
+        url = FCM_ENDPOINT.format(project_id=self.project_id)
+        
+        for attempt in range(FCM_MAX_RETRIES + 1):
+            retry_after = None
+            try:
+                response = await client.post(url, headers=headers, json=message)
+                if response.status_code not in FCM_RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response.json()
+                error = f"HTTP {response.status_code}: {response.text}"
+                retry_after = response.headers.get("Retry-After")
+            except httpx.HTTPStatusError as e:
+                # other 4xx, e.g. an unregistered token, will not succeed on a retry
+                logger.error(f"HTTP error: {e}, response: {e.response.text}")
+                return None
+            except httpx.TransportError as e:
+                error = f"{type(e).__name__}: {e}"
             
-            # Set headers
-            headers = {
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json; UTF-8",
-            }
-            
-            # Send the request
-            url = FCM_ENDPOINT.format(project_id=self.project_id)
-            response = requests.post(url, headers=headers, json=message)
-            response.raise_for_status()
-            
-            return response.json()
-            
-        except requests.exceptions.RequestException as e:
-            print(f"HTTP error: {str(e)}")
-            if e.response is not None:
-                print(f"Response: {e.response.text}")
-            return None
+            if attempt == FCM_MAX_RETRIES:
+                logger.error(f"Giving up on notification to {device_token} after {attempt + 1} attempts: {error}")
+                return None
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else FCM_BACKOFF_SECONDS * 2 ** attempt
+            await asyncio.sleep(delay + random.uniform(0, FCM_BACKOFF_SECONDS))
+
+    async def send_notifications(self, messages: List[Tuple[str, str, str]], client: Optional[httpx.AsyncClient] = None):
+        """
+        Send (device_token, title, body) messages concurrently, at most FCM_MAX_CONCURRENCY at a time.
+        Returns the FCM response for each message, or None for those that failed.
+        """
+        if not messages:
+            return []
+        client = client or self.client
+        try:
+            # a refresh is a blocking HTTP call, so only leave the event loop when one is needed
+            access_token = self._cached_token() or await asyncio.to_thread(self.get_access_token)
         except Exception as e:
-            print(f"Error: {str(e)}")
-            return None
+            logger.error(f"Could not get an FCM access token: {e}")
+            return [None] * len(messages)
+        
+        semaphore = asyncio.Semaphore(FCM_MAX_CONCURRENCY)
+        async def send(device_token, title, body):
+            async with semaphore:
+                try:
+                    return await self._send(client, access_token, device_token, title, body)
+                except Exception as e:
+                    logger.error(f"Error sending notification to {device_token}: {e}")
+                    return None
+        return await asyncio.gather(*(send(*message) for message in messages))
+
 
-    def send_multiple_notifications(self, device_tokens, title, body):
-        """Send notification to multiple devices"""
-        results = []
-        for token in device_tokens:
-            result = self.send_single_notification(token, title, body)
-            results.append(result)
-        return results
+_fcm: Optional[FirebaseHTTPV1] = None
+_fcm_lock = threading.Lock()
 
+def get_fcm() -> FirebaseHTTPV1:
+    """The process-wide sender; the service account file is read on first use."""
+    global _fcm
+    if _fcm is None:
+        with _fcm_lock:
+            if _fcm is None:
+                _fcm = FirebaseHTTPV1(FCM_SERVICE_ACCOUNT_FILE)
+    return _fcm
+
+async def close_fcm():
+    if _fcm is not None:
+        await _fcm.aclose()
 
 def send_push_notification_healthcheck():
-    fcm = FirebaseHTTPV1("expense-tracker-firebase.json")
-    # get all FCM tokens from fcm_tokens table
-    fcm_tokens = db_session.query(FcmToken).all()
-    logger.info(f"Sending healthcheck notification to {len(fcm_tokens)} devices")
-    
-    # send a test notification to each device
-    fcm.send_multiple_notifications([token.token for token in fcm_tokens], "Healthcheck", "This is a test notification")
-    
-    # FOR TESTING
-    # fcm_tokens = ["dnAFw0TDTvCPhzV2YhJeYl:APA91bGiM-YlnIDDEelSp5bZ8O3QxxRgjMghEQwcZHrKDUvnGrRwP8M--pM1AwqJfOCjxQAR3AxCl6kqdeqNh7Nh8P5mXoipnvyopJNq3SqyLOOVgjtlmqo"]
-    # fcm.send_multiple_notifications(fcm_tokens, "Healthcheck", "This is a test notification")
-        
+    """Queue a test notification for every user with a registered device."""
+    try:
+        user_ids = [user_id for user_id, in db_session.query(FcmToken.user_id).distinct()]
+        logger.info(f"Queueing healthcheck notification for {len(user_ids)} users")
+        enqueue_notifications(db_session, user_ids, "Healthcheck", "This is a test notification")
+        db_session.commit()
+    finally:
+        db_session.remove()
 
 async def push_notification_healthcheck():
-    fcm = FirebaseHTTPV1("expense-tracker-firebase.json")
-    
     while True:
-        send_push_notification_healthcheck()
+        await asyncio.to_thread(send_push_notification_healthcheck)
         await asyncio.sleep(3600)  # sleep for 1 hour
-        
-async def send_goal_notifications():
-    fcm = FirebaseHTTPV1("expense-tracker-firebase.json")
+
+async def dispatch_notification_outbox():
+    """Send the notification outbox, one claimed batch at a time, and purge old rows; see outbox.py."""
+    next_purge = time.monotonic()
     
     while True:
-        fcm_tokens = []
-        
-        # recaculate goal progress
-        users = db_session.query(Goal).distinct(Goal.user_id).all()
-        user_ids = [user.user_id for user in users]
-        for user_id in user_ids:
-            recalc_goal_progress(db_session, user_id)
+        if time.monotonic() >= next_purge:
+            next_purge = time.monotonic() + OUTBOX_PURGE_INTERVAL_SECONDS
+            try:
+                purged = await asyncio.to_thread(purge_finished)
+                if purged:
+                    logger.info(f"Purged {purged} finished notifications from the outbox")
+            except Exception as e:
+                logger.error(f"Error purging the notification outbox: {e}")
         
-        # get goal notifications
+        claimed = []
+        try:
+            # fetched before claiming, so a sender that fails to start leaves the outbox untouched
+            fcm = get_fcm()
+            claimed, tokens = await asyncio.to_thread(claim_batch, OUTBOX_BATCH_SIZE)
+            messages, owners = [], []
+            for index, notification in enumerate(claimed):
+                for token in tokens[notification.user_id]:
+                    messages.append((token, notification.title, notification.body))
+                    owners.append(index)
+            responses = await fcm.send_notifications(messages)
+            
+            delivered = [0] * len(claimed)
+            failed = [0] * len(claimed)
+            for index, response in zip(owners, responses):
+                if response is None:
+                    failed[index] += 1
+                else:
+                    delivered[index] += 1
+            # a notification is sent once any of its user's devices took it; users without devices have nothing to send
+            await asyncio.to_thread(record_results, [
+                (notification, delivered[i], None if delivered[i] or not failed[i] else f"all {failed[i]} devices failed")
+                for i, notification in enumerate(claimed)
+            ])
+        except Exception as e:
+            logger.error(f"Error dispatching notifications: {e}")
+        if len(claimed) < OUTBOX_BATCH_SIZE:
+            await asyncio.sleep(OUTBOX_POLL_SECONDS)
+
+def seconds_until_next_goal_notification(db, now: datetime) -> float:
+    """Time to sleep until the earliest pending goal notification, read from ix_goals_next_notification_at."""
+    next_due = db.query(func.min(Goal.next_notification_at)).scalar()
+    if next_due is None:
+        return GOAL_SCHEDULER_MAX_SLEEP_SECONDS
+    delay = (next_due - now).total_seconds()
+    return min(max(delay, GOAL_SCHEDULER_MIN_SLEEP_SECONDS), GOAL_SCHEDULER_MAX_SLEEP_SECONDS)
+
+def process_due_goal_notifications() -> float:
+    """
+    Queue the due goal notifications and award XP for completed goals, in one transaction with the goals'
+    notified flags. Returns how long to sleep until the next one is due. Runs in a worker thread.
+    """
+    try:
+        # goal progress is kept current by transaction writes and goal_queue, so no recalculation here
+        # both only load goals whose next_notification_at has passed
         mid_period_notifications = get_mid_period_notifications(db_session)
         post_period_notifications = get_post_period_notifications(db_session)
-        all_notifications = mid_period_notifications + post_period_notifications
-        for goal_notifaction in all_notifications:
-            logger.info(f"Sending goal notification for goal {goal_notifaction['goal_id']}")
-            
-            # get goal data by id
-            goal_id = goal_notifaction["goal_id"]
-            user_id = db_session.query(Goal).filter(Goal.id == goal_id).first().user_id
-            
-            # get FCM tokens with this user_id
-            tokens = db_session.query(FcmToken).filter(FcmToken.user_id == user_id).all()
-            fcm_tokens.extend([token.token for token in tokens])
-            
-            # send notifications
-            fcm.send_multiple_notifications(fcm_tokens, "Expense Tracker Goal!", goal_notifaction["message"])
+        for goal_notifaction in mid_period_notifications + post_period_notifications:
+            logger.info(f"Queued goal notification for goal {goal_notifaction['goal_id']}")
             
             if goal_notifaction.get("completed", False):
-                # get period of goal
-                goal = db_session.query(Goal).filter(Goal.id == goal_id).first()
-                period = goal.end_date - goal.start_date
-                period = period.days
-                
                 # add xp to user
-                if (period < 8):
-                    add_xp_to_user(user_id, 5)
+                if goal_notifaction["period_days"] < 8:
+                    add_xp_to_user(goal_notifaction["user_id"], 5)
                 else:
-                    add_xp_to_user(user_id, 20)
-                
-        
-        await asyncio.sleep(120)  # sleep for 2 minutes
+                    add_xp_to_user(goal_notifaction["user_id"], 20)
+        db_session.commit()
+        return seconds_until_next_goal_notification(db_session, datetime.utcnow())
+    finally:
+        db_session.remove()
 
-def send_new_deal_notification(new_deal: Deal):
-    fcm = FirebaseHTTPV1("expense-tracker-firebase.json")
-    
-    # get all deal subscriptions
-    deal_subscriptions = db_session.query(DealLocationSubscription).all()
-    user_ids_notify = set()
-    
-    # for every subscription, check if the deal is within 100km of the subscription location
-    for deal_subscription in deal_subscriptions:
-        if deal_subscription.user_id == new_deal.user_id:
-            continue
-        distance = get_coordinate_distance(
-            new_deal.latitude, new_deal.longitude,
-            deal_subscription.latitude, deal_subscription.longitude
-        )
-        
-        if distance <= 100:
-            user_ids_notify.add(deal_subscription.user_id)
-    
-    # get FCM tokens with these user_ids
-    fcm_tokens = []
-    for user_id in user_ids_notify:
-        tokens = db_session.query(FcmToken).filter(FcmToken.user_id == user_id).all()
-        fcm_tokens.extend([token.token for token in tokens])
-    
-    print(fcm_tokens)
-    
-    # send notifications
-    fcm.send_multiple_notifications(fcm_tokens, "New Deal Alert!", f"A new deal at {new_deal.vendor} has been posted near you!")
-    
-def send_level_up_notification(user_id: int, level: int):
-    fcm = FirebaseHTTPV1("expense-tracker-firebase.json")
-    
-    # get FCM tokens with this user_id
-    tokens = db_session.query(FcmToken).filter(FcmToken.user_id == user_id).all()
-    fcm_tokens = [token.token for token in tokens]
+async def send_goal_notifications():
+    """Sleep until the earliest goal notification is due, then queue the ones that are due."""
+    while True:
+        try:
+            delay = await asyncio.to_thread(process_due_goal_notifications)
+        except Exception as e:
+            logger.error(f"Error sending goal notifications: {e}")
+            delay = GOAL_SCHEDULER_MAX_SLEEP_SECONDS
+        await asyncio.sleep(delay)
+
+class FanoutMetrics:
+    """Counters for new-deal fan-outs, served at /healthcheck/deal_fanout."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.fanouts = 0
+        self.failures = 0
+        self.recipients = 0
+        self.max_recipients = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, recipients: int, seconds: float):
+        with self._lock:
+            self.fanouts += 1
+            self.recipients += recipients
+            self.max_recipients = max(self.max_recipients, recipients)
+            self.seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "fanouts": self.fanouts,
+                "failures": self.failures,
+                "recipients": self.recipients,
+                "avg_recipients": round(self.recipients / self.fanouts, 1) if self.fanouts else 0,
+                "max_recipients": self.max_recipients,
+                "avg_ms": round(self.seconds / self.fanouts * 1000, 1) if self.fanouts else 0,
+                "max_ms": round(self.max_seconds * 1000, 1)
+            }
+
+deal_fanout_metrics = FanoutMetrics()
+
+def send_new_deal_notification(new_deal: Deal) -> int:
+    """
+    Queue a notification for every user subscribed within 100km of the deal. Returns the number
+    of recipients. The caller commits.
+    """
+    # only subscriptions in grid cells within 100km of the deal, see geo.py
+    candidates = db_session.query(
+        DealLocationSubscription.user_id, DealLocationSubscription.latitude, DealLocationSubscription.longitude
+    ).filter(
+        grid_cell_filter(DealLocationSubscription.grid_lat, DealLocationSubscription.grid_lon,
+                         new_deal.latitude, new_deal.longitude, DEAL_NOTIFICATION_DISTANCE_KM),
+        DealLocationSubscription.user_id != new_deal.user_id
+    ).all()
     
-    logger.info(f"Sending level up notification to user {user_id}")
+    # exact distance to every candidate in one vectorized pass
+    nearby = within_distance(
+        new_deal.latitude, new_deal.longitude,
+        [candidate.latitude for candidate in candidates], [candidate.longitude for candidate in candidates],
+        DEAL_NOTIFICATION_DISTANCE_KM
+    )
+    user_ids_notify = {candidates[i].user_id for i in nearby}
     
-    # send notifications
-    fcm.send_multiple_notifications(fcm_tokens, "Level Up!", f"Congratulations! You have reached level {level}!")
+    enqueue_notifications(db_session, user_ids_notify, "New Deal Alert!", f"A new deal at {new_deal.vendor} has been posted near you!")
+    return len(user_ids_notify)
+
+def fan_out_pending_deals() -> int:
+    """
+    Queue the subscriber notifications of every deal still marked fanout_pending, one deal per
+    transaction: its notifications and the cleared flag commit together, so each deal is fanned
+    out exactly once even if the process dies mid-way. Deals being fanned out by another process
+    are skipped. Returns the number of deals fanned out.
+    """
+    fanned_out = 0
+    # left pending for the next sweep, and skipped for the rest of this one
+    failed = []
+    try:
+        while True:
+            start = time.perf_counter()
+            deal = db_session.query(Deal).filter(Deal.fanout_pending, Deal.id.notin_(failed)).order_by(Deal.id) \
+                .with_for_update(skip_locked=True).first()
+            if deal is None:
+                return fanned_out
+            deal_id = deal.id
+            try:
+                recipients = send_new_deal_notification(deal)
+                deal.fanout_pending = False
+                db_session.commit()
+            except Exception as e:
+                db_session.rollback()
+                failed.append(deal_id)
+                deal_fanout_metrics.record_failure()
+                logger.error(f"Deal {deal_id} fan-out failed: {e}")
+                continue
+            elapsed = time.perf_counter() - start
+            deal_fanout_metrics.record(recipients, elapsed)
+            logger.info(f"Deal {deal_id} fan-out queued {recipients} notifications in {elapsed * 1000:.1f} ms")
+            fanned_out += 1
+    finally:
+        db_session.remove()
+
+async def sweep_pending_deal_fanouts():
+    """Fan out deals that no request-time background task got to, e.g. because the process restarted."""
+    while True:
+        try:
+            await asyncio.to_thread(fan_out_pending_deals)
+        except Exception as e:
+            logger.error(f"Error sweeping deal fan-outs: {e}")
+        await asyncio.sleep(DEAL_FANOUT_SWEEP_SECONDS)
 
 def add_xp_to_user(user_id: int, xp: int) -> User:
-    """Add XP to the user's profile."""
+    """Add XP to the user's profile, queueing a notification on level up. The caller commits."""
     user = db_session.query(User).filter_by(id=user_id).first()
     if not user:
         return
@@ -205,48 +408,52 @@ def add_xp_to_user(user_id: int, xp: int) -> User:
     
     user.level = new_level
     
-    db_session.commit()
-    db_session.refresh(user)
-    
     if new_level > old_level:
-        send_level_up_notification(user_id, new_level)
+        logger.info(f"Queueing level up notification for user {user_id}")
+        enqueue_notification(db_session, user_id, "Level Up!", f"Congratulations! You have reached level {new_level}!")
     
     return user
 
-async def send_upcoming_recurring_payment_notifications():
-    fcm = FirebaseHTTPV1("expense-tracker-firebase.json")
-        
-    while True:
-        recurring_transactions = db_session.query(RecurringTransaction).all()
+def process_due_recurring_reminders():
+    """
+    Queue a reminder for every payment in the next 24 hours that has not been reminded about, and
+    advance each schedule to its next payment, in one transaction. Runs in a worker thread.
+    """
+    try:
         now = datetime.utcnow()
         # Define the upcoming threshold (next 24 hours)
         upcoming_threshold = now + timedelta(hours=24)
         
-        for recurring in recurring_transactions:
-            period_delta = timedelta(days=recurring.period)
-            if now < recurring.start_date:
-                next_payment_date = recurring.start_date
-            else:
-                periods_passed = ((now - recurring.start_date) // period_delta) + 1
-                next_payment_date = recurring.start_date + periods_passed * period_delta
-            if next_payment_date > recurring.end_date:
-                continue
-
-            # Check if the upcoming payment falls within the next 24 hours
-            if now <= next_payment_date <= upcoming_threshold:
-                # If a notification was already sent for this upcoming payment, skip it.
-                if recurring.last_notified_payment_date is not None and recurring.last_notified_payment_date == next_payment_date:
+        # only schedules with a payment in the window, from ix_recurring_transactions_next_payment_date
+        due = db_session.query(RecurringTransaction).filter(
+            RecurringTransaction.next_payment_date <= upcoming_threshold
+        ).order_by(RecurringTransaction.next_payment_date).all()
+        
+        for recurring in due:
+            if recurring.next_payment_date < now:
+                # the payment passed without a reminder (e.g. while the server was down), so move on to the next one
+                recurring.next_payment_date = next_payment_date(recurring.start_date, recurring.end_date, recurring.period, now)
+                if recurring.next_payment_date is None or recurring.next_payment_date > upcoming_threshold:
                     continue
-                
-                tokens = db_session.query(FcmToken).filter(FcmToken.user_id == recurring.user_id).all()
-                fcm_tokens = [token.token for token in tokens]
-                message = (
-                    f"Reminder: Your recurring payment is scheduled for "
-                    f"{next_payment_date.strftime('%Y-%m-%d %H:%M:%S')}."
-                )
-                fcm.send_multiple_notifications(fcm_tokens, "Upcoming Recurring Payment", message)
-                
-                # Mark that a notification for this upcoming payment date has been sent.
-                recurring.last_notified_payment_date = next_payment_date
-                db_session.commit()
-        await asyncio.sleep(120)
\ No newline at end of file
+            
+            payment_date = recurring.next_payment_date
+            message = (
+                f"Reminder: Your recurring payment is scheduled for "
+                f"{payment_date.strftime('%Y-%m-%d %H:%M:%S')}."
+            )
+            enqueue_notification(db_session, recurring.user_id, "Upcoming Recurring Payment", message)
+            
+            # Mark that a notification for this upcoming payment date has been sent, and schedule the next one.
+            recurring.last_notified_payment_date = payment_date
+            recurring.next_payment_date = next_payment_date(recurring.start_date, recurring.end_date, recurring.period, payment_date)
+        db_session.commit()
+    finally:
+        db_session.remove()
+
+async def send_upcoming_recurring_payment_notifications():
+    while True:
+        try:
+            await asyncio.to_thread(process_due_recurring_reminders)
+        except Exception as e:
+            logger.error(f"Error sending recurring payment reminders: {e}")
+        await asyncio.sleep(120)
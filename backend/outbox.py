@@ -0,0 +1,141 @@
+"""
+Durable push notifications.
+
+Anything that should push a notification writes a `NotificationOutbox` row with
+`enqueue_notification(s)` in the same transaction as the change that triggers it, so
+a committed change always has its notification recorded and a rolled back one never
+does. Nothing is sent on the request path.
+
+The dispatcher (notifications.dispatch_notification_outbox) runs in every app
+process. Each pass claims up to OUTBOX_BATCH_SIZE due rows with FOR UPDATE SKIP
+LOCKED, so processes never claim the same row, sends them concurrently and records
+the outcome with `record_results`. A claim moves `available_at` forward by
+CLAIM_TIMEOUT_SECONDS, so rows claimed by a process that dies before recording are
+claimed again later: delivery is at least once. Failed sends are retried with
+backoff until MAX_ATTEMPTS.
+
+Sent and failed rows are kept for OUTBOX_RETENTION_DAYS for inspection, then deleted
+by `purge_finished`, which the dispatcher runs every OUTBOX_PURGE_INTERVAL_SECONDS.
+"""
+import datetime
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import bindparam, insert, text, update
+from sqlalchemy.orm import Session
+
+from db import engine
+from models import NotificationOutbox
+
+OUTBOX_BATCH_SIZE = 500
+# how long the dispatcher waits before looking again when nothing was due
+OUTBOX_POLL_SECONDS = 1
+CLAIM_TIMEOUT_SECONDS = 300
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF_SECONDS = 30
+OUTBOX_RETENTION_DAYS = 7
+OUTBOX_PURGE_INTERVAL_SECONDS = 3600
+# rows deleted per statement, so a purge never holds many row locks at once
+OUTBOX_PURGE_BATCH_SIZE = 10000
+
+CLAIM_BATCH = text("""
+    UPDATE notification_outbox o
+    SET attempts = o.attempts + 1, available_at = :claimed_until
+    FROM (
+        SELECT id FROM notification_outbox
+        WHERE status = 'pending' AND available_at <= :now
+        ORDER BY available_at
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    ) due
+    WHERE o.id = due.id
+    RETURNING o.id, o.user_id, o.title, o.body, o.attempts
+""")
+
+# served by ix_notification_outbox_created_at, which only holds sent and failed rows
+PURGE_BATCH = text("""
+    DELETE FROM notification_outbox
+    WHERE id IN (
+        SELECT id FROM notification_outbox
+        WHERE status <> 'pending' AND created_at < :before
+        LIMIT :limit
+    )
+""")
+
+CLAIMED_TOKENS = text("SELECT user_id, token FROM fcm_tokens WHERE user_id = ANY(:user_ids)")
+
+class ClaimedNotification(NamedTuple):
+    id: int
+    user_id: int
+    title: str
+    body: str
+    attempts: int
+
+def enqueue_notification(db: Session, user_id: int, title: str, body: str):
+    """Add a notification to the session's transaction. The caller commits."""
+    db.add(NotificationOutbox(user_id=user_id, title=title, body=body))
+
+def enqueue_notifications(db: Session, user_ids: Iterable[int], title: str, body: str) -> int:
+    """Add the same notification for several users in one statement. The caller commits."""
+    rows = [{"user_id": user_id, "title": title, "body": body} for user_id in user_ids]
+    if rows:
+        db.execute(insert(NotificationOutbox), rows)
+    return len(rows)
+
+def claim_batch(limit: int = OUTBOX_BATCH_SIZE) -> Tuple[List[ClaimedNotification], Dict[int, List[str]]]:
+    """Claim due notifications and load their recipients' device tokens."""
+    now = datetime.datetime.utcnow()
+    with engine.begin() as conn:
+        claimed = [ClaimedNotification(*row) for row in conn.execute(CLAIM_BATCH, {
+            "now": now,
+            "claimed_until": now + datetime.timedelta(seconds=CLAIM_TIMEOUT_SECONDS),
+            "limit": limit
+        })]
+        tokens = defaultdict(list)
+        if claimed:
+            for user_id, token in conn.execute(CLAIMED_TOKENS, {"user_ids": list({n.user_id for n in claimed})}):
+                tokens[user_id].append(token)
+    return claimed, tokens
+
+def record_results(results: List[Tuple[ClaimedNotification, int, Optional[str]]]):
+    """
+    Record (notification, devices_sent, error) outcomes. Notifications with an error go back to
+    pending with exponential backoff, or to failed once they have used MAX_ATTEMPTS.
+    """
+    now = datetime.datetime.utcnow()
+    sent, retried = [], []
+    for notification, devices_sent, error in results:
+        if error is None:
+            sent.append({"b_id": notification.id, "devices_sent": devices_sent, "sent_at": now})
+        else:
+            backoff = RETRY_BACKOFF_SECONDS * 2 ** (notification.attempts - 1)
+            retried.append({
+                "b_id": notification.id,
+                "status": "failed" if notification.attempts >= MAX_ATTEMPTS else "pending",
+                "available_at": now + datetime.timedelta(seconds=backoff),
+                "error": error
+            })
+    with engine.begin() as conn:
+        if sent:
+            conn.execute(
+                update(NotificationOutbox.__table__).where(NotificationOutbox.id == bindparam("b_id"))
+                .values(status="sent", devices_sent=bindparam("devices_sent"), sent_at=bindparam("sent_at"), error=None),
+                sent
+            )
+        if retried:
+            conn.execute(
+                update(NotificationOutbox.__table__).where(NotificationOutbox.id == bindparam("b_id"))
+                .values(status=bindparam("status"), available_at=bindparam("available_at"), error=bindparam("error")),
+                retried
+            )
+
+def purge_finished(retention_days: int = OUTBOX_RETENTION_DAYS) -> int:
+    """Delete sent and failed notifications created more than retention_days ago. Returns the number deleted."""
+    before = datetime.datetime.utcnow() - datetime.timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        with engine.begin() as conn:
+            count = conn.execute(PURGE_BATCH, {"before": before, "limit": OUTBOX_PURGE_BATCH_SIZE}).rowcount
+        deleted += count
+        if count < OUTBOX_PURGE_BATCH_SIZE:
+            return deleted
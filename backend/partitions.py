@@ -0,0 +1,131 @@
+"""
+Monthly range partitions for the transactions table.
+
+`transactions` is partitioned by month on `date`. Partitions are named
+`transactions_pYYYY_MM`; rows outside every monthly partition land in
+`transactions_default`. Partitions are created ahead of time by
+`ensure_transaction_partitions`, which also moves rows out of the default
+partition whenever it creates a month they belong to.
+"""
+import asyncio
+import datetime
+import logging
+import re
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "transactions"
+DEFAULT_PARTITION = "transactions_default"
+PARTITION_NAME_PATTERN = re.compile(r'^transactions_p(\d{4})_(\d{2})$')
+
+# months created ahead of the current one
+MONTHS_AHEAD = 3
+# how often the background task checks for missing partitions
+MAINTENANCE_INTERVAL_SECONDS = 6 * 3600
+# pg_advisory_xact_lock key so concurrent workers do not race to create the same partition
+PARTITION_LOCK_ID = 4460002
+
+def month_start(date: datetime.datetime) -> datetime.date:
+    return datetime.date(date.year, date.month, 1)
+
+def add_months(month: datetime.date, count: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: datetime.date) -> str:
+    return f"{PARENT_TABLE}_p{month.year:04d}_{month.month:02d}"
+
+def create_month_partition(conn: Connection, month: datetime.date) -> bool:
+    """
+    Create and attach the partition for one month, moving any of its rows out of the default partition.
+    Returns False if the partition already exists.
+    """
+    name = partition_name(month)
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+        return False
+
+    start, end = month, add_months(month, 1)
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS)"))
+    # attaching fails while the default partition still holds rows for this range
+    conn.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION} WHERE date >= :start AND date < :end RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """), {"start": start, "end": end})
+    conn.execute(text(
+        f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    return True
+
+def ensure_partitions(conn: Connection, first_month: datetime.date, last_month: datetime.date) -> List[str]:
+    """Create every missing monthly partition from first_month to last_month inclusive."""
+    created = []
+    month = first_month
+    while month <= last_month:
+        if create_month_partition(conn, month):
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+def ensure_transaction_partitions(engine: Engine, months_ahead: int = MONTHS_AHEAD,
+                                  since: Optional[datetime.datetime] = None) -> List[str]:
+    """
+    Create partitions from last month (or `since`) up to `months_ahead` months from now,
+    plus a partition for every month that currently has rows in the default partition.
+    """
+    this_month = month_start(datetime.datetime.utcnow())
+    first_month = month_start(since) if since else add_months(this_month, -1)
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": PARTITION_LOCK_ID})
+        created = ensure_partitions(conn, first_month, add_months(this_month, months_ahead))
+        stray_months = conn.execute(text(
+            f"SELECT DISTINCT date_trunc('month', date) FROM {DEFAULT_PARTITION}"
+        )).scalars().all()
+        for month in stray_months:
+            if create_month_partition(conn, month_start(month)):
+                created.append(partition_name(month_start(month)))
+    if created:
+        logger.info(f"Created transaction partitions: {', '.join(created)}")
+    return created
+
+def list_month_partitions(conn: Connection) -> List[str]:
+    """Names of the monthly partitions currently attached to transactions, oldest first."""
+    names = conn.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :parent
+    """), {"parent": PARENT_TABLE}).scalars().all()
+    return sorted(name for name in names if PARTITION_NAME_PATTERN.match(name))
+
+def detach_partitions_before(engine: Engine, cutoff: datetime.date) -> List[str]:
+    """
+    Detach monthly partitions that end on or before the cutoff month.
+    Detached tables keep their data and can be archived or dropped separately.
+    Their months stay in monthly_spending_rollups, since detaching does not fire delete triggers.
+    """
+    detached = []
+    with engine.begin() as conn:
+        for name in list_month_partitions(conn):
+            year, month = PARTITION_NAME_PATTERN.match(name).groups()
+            if datetime.date(int(year), int(month), 1) < month_start(cutoff):
+                conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+                detached.append(name)
+    if detached:
+        logger.info(f"Detached transaction partitions: {', '.join(detached)}")
+    return detached
+
+async def maintain_transaction_partitions(engine: Engine):
+    """Background task that keeps future monthly partitions created."""
+    while True:
+        try:
+            await asyncio.to_thread(ensure_transaction_partitions, engine)
+        except Exception as e:
+            logger.error(f"Error maintaining transaction partitions: {e}")
+        await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
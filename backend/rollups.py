@@ -0,0 +1,71 @@
+"""
+Spending sums backed by the monthly rollup table.
+
+`monthly_spending_rollups` holds the exact sum and count of transactions per
+(user, category, type, month); see migrations/v0004_monthly_spending_rollups.py.
+Whole months inside a window are read from the rollup and only the partial months
+at either edge are summed from raw transactions.
+"""
+import datetime
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import MonthlySpendingRollup, Transaction, TransactionType
+
+def month_floor(date: datetime.datetime) -> datetime.datetime:
+    return date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def next_month(date: datetime.datetime) -> datetime.datetime:
+    month = month_floor(date)
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+
+def _sum_transactions(db: Session, user_id: int, start: datetime.datetime, end: datetime.datetime,
+                      category_id: Optional[int], transaction_type: Optional[TransactionType],
+                      include_end: bool) -> float:
+    query = db.query(func.sum(Transaction.amount)).filter(
+        Transaction.user_id == user_id,
+        Transaction.date >= start,
+        Transaction.date <= end if include_end else Transaction.date < end
+    )
+    if category_id is not None:
+        query = query.filter(Transaction.category_id == category_id)
+    if transaction_type is not None:
+        query = query.filter(Transaction.transaction_type == transaction_type)
+    return float(query.scalar() or 0.0)
+
+def _sum_rollups(db: Session, user_id: int, first_month: datetime.datetime, end_month: datetime.datetime,
+                 category_id: Optional[int], transaction_type: Optional[TransactionType]) -> float:
+    query = db.query(func.sum(MonthlySpendingRollup.total)).filter(
+        MonthlySpendingRollup.user_id == user_id,
+        MonthlySpendingRollup.month >= first_month,
+        MonthlySpendingRollup.month < end_month
+    )
+    if category_id is not None:
+        query = query.filter(MonthlySpendingRollup.category_id == category_id)
+    if transaction_type is not None:
+        query = query.filter(MonthlySpendingRollup.transaction_type == transaction_type)
+    return float(query.scalar() or 0.0)
+
+def sum_spending(db: Session, user_id: int, start: datetime.datetime, end: datetime.datetime,
+                 category_id: Optional[int] = None, transaction_type: Optional[TransactionType] = None,
+                 include_end: bool = True) -> float:
+    """
+    Sum a user's transaction amounts with start <= date <= end (date < end if include_end is False),
+    optionally limited to one category and transaction type.
+    """
+    # first whole month at or after start, and the exclusive end of the last whole month before end
+    first_full = start if start == month_floor(start) else next_month(start)
+    boundary = end + datetime.timedelta(microseconds=1) if include_end else end
+    last_full_end = month_floor(boundary)
+
+    if first_full >= last_full_end:
+        return _sum_transactions(db, user_id, start, end, category_id, transaction_type, include_end)
+
+    total = _sum_rollups(db, user_id, first_full, last_full_end, category_id, transaction_type)
+    if start < first_full:
+        total += _sum_transactions(db, user_id, start, first_full, category_id, transaction_type, include_end=False)
+    if last_full_end < boundary:
+        total += _sum_transactions(db, user_id, last_full_end, end, category_id, transaction_type, include_end)
+    return total
@@ -6,6 +6,7 @@ from http_models import CategoryResponse, CustomCategoryCreateRequest
 from db import get_db, get_all_categories_for_user
 from models import Category, User, Transaction
 from dependencies.auth import get_current_user
+from goal_queue import goal_recompute_queue, mark_goals_stale
 
 router = APIRouter(
     prefix="/categories",
@@ -70,9 +71,12 @@ def delete_category(
         
         # Reassign transactions to the new category
         db.query(Transaction).filter(Transaction.category_id == category_id).update({"category_id": new_category_id})
+        mark_goals_stale(db, current_user.id)
     
     db.delete(category)
     db.commit()
+    if transaction_count > 0:
+        goal_recompute_queue.mark(current_user.id)
     return
 
 @router.put("/{category_id}", response_model=CategoryResponse)
@@ -1,13 +1,15 @@
 from typing import Optional
-from notifications import send_new_deal_notification
-from fastapi import APIRouter, HTTPException, Depends, status
+from notifications import fan_out_pending_deals
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 
 from models import DealLocationSubscription, DealVote, User, Deal
-from utils import get_coordinate_distance, predict_category, get_category_by_name
+from utils import predict_category, get_category_by_name
+from geo import within_distance
 from dependencies.auth import get_current_user
-from db import add_deal, get_db, get_single_deal
-from db import get_deals as db_get_deals
+from db import add_deal, get_db, get_async_db, get_single_deal, get_deals_async
 from typing import List
 from http_models import DealCreationRequest, DealRetrievalRequest, DealSubscriptionLocation, DealSubscriptionLocationUpdateRequest, DealUpdateRequest, DealVoteResponse, HttpDeal, HttpDealLocationSubscription, LocationFilter
 
@@ -18,26 +20,24 @@ router = APIRouter(
 
 # Helpers
 def get_deal_votes_by_id(db, id):
-    # find all votes with this deal id
-    votes = db.query(DealVote).filter(DealVote.deal_id == id).all()
-    
-    # count upvotes and downvotes
-    upvotes = len([vote for vote in votes if vote.vote == 1])
-    downvotes = len([vote for vote in votes if vote.vote == -1])
+    # the counters on the deal are kept current by triggers on deal_votes
+    deal = db.query(Deal.upvotes, Deal.downvotes).filter(Deal.id == id).first()
+    if not deal:
+        raise Exception("Deal not found.")
     
     return {
-        "upvotes": upvotes,
-        "downvotes": downvotes
+        "upvotes": deal.upvotes,
+        "downvotes": deal.downvotes
     }
     
 def get_maps_link(latitude, longitude):
     return f"https://www.google.com/maps?q={latitude},{longitude}"
     
 @router.post("/list", response_model=List[HttpDeal], status_code=status.HTTP_200_OK)
-def get_deals(
+async def get_deals(
     filters: Optional[DealRetrievalRequest] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get all deals. Optionally filter by user_id and location.
@@ -46,27 +46,33 @@ def get_deals(
         filters = DealRetrievalRequest()
         
     try:
-        # get all the deals
-        deals = db_get_deals(filters.user_id)
-        
         location_filter = filters.location
+        near = None
+        if location_filter:
+            near = (location_filter.latitude, location_filter.longitude, location_filter.distance)
+        # get the deals, only those in grid cells around the location when filtering by it
+        deals = await get_deals_async(db, filters.user_id, near)
+        
         if location_filter:
-            # filter by location
-            deals = [deal for deal in deals if
-                     abs(get_coordinate_distance(
-                            deal.latitude, deal.longitude,
-                            location_filter.latitude, location_filter.longitude
-                         )) <= location_filter.distance]
+            # exact distance for the candidates, in one vectorized pass
+            nearby = within_distance(
+                location_filter.latitude, location_filter.longitude,
+                [deal.latitude for deal in deals], [deal.longitude for deal in deals],
+                location_filter.distance
+            )
+            deals = [deals[i] for i in nearby]
             
-        for deal in deals:
-            # get votes for each deal
-            votes = get_deal_votes_by_id(db, deal.id)
-            deal.upvotes = votes["upvotes"]
-            deal.downvotes = votes["downvotes"]
+        # the current user's votes on the whole page in one query
+        user_votes = {}
+        if deals:
+            result = await db.execute(
+                select(DealVote.deal_id, DealVote.vote)
+                .filter(DealVote.user_id == current_user.id, DealVote.deal_id.in_([deal.id for deal in deals]))
+            )
+            user_votes = dict(result.all())
             
-            # check if current_user has voted
-            target_vote = db.query(DealVote).filter(DealVote.deal_id == deal.id, DealVote.user_id == current_user.id).first()
-            deal.user_vote = target_vote.vote if target_vote else 0
+        for deal in deals:
+            deal.user_vote = user_votes.get(deal.id, 0)
             
             # insert maps link
             deal.maps_link = get_maps_link(deal.latitude, deal.longitude)
@@ -92,11 +98,6 @@ def get_specific_deal(
         if not deal:
             raise Exception("Deal not found.")
         
-        # get votes for this deal
-        votes = get_deal_votes_by_id(db, deal_id)
-        deal.upvotes = votes["upvotes"]
-        deal.downvotes = votes["downvotes"]
-        
         # check if current_user has voted
         target_vote = db.query(DealVote).filter(DealVote.deal_id == deal_id, DealVote.user_id == current_user.id).first()
         deal.user_vote = target_vote.vote if target_vote else 0
@@ -111,10 +112,12 @@ def get_specific_deal(
 @router.post("/", status_code=status.HTTP_201_CREATED)
 def create_deal(
     deal: DealCreationRequest,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user)
 ):
     """
-    Create a deal.
+    Create a deal. Nearby subscribers are notified after the response is sent; the deal is
+    committed marked for the fan-out, so a restart before then only delays it until the next sweep.
     """
     try:
         # create deal
@@ -127,9 +130,10 @@ def create_deal(
             deal.longitude,
             deal.latitude,
             deal.date,
-            deal.vendor
+            deal.vendor,
+            notify_subscribers=True
         )
-        send_new_deal_notification(new_deal)
+        background_tasks.add_task(fan_out_pending_deals)
         return {"id": new_deal.id}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -7,13 +7,26 @@ from dependencies.auth import get_current_user
 from db import get_db
 from sqlalchemy import func
 import datetime
-from middlewares.goal_utils import calculate_percentage_goal_progress
+from middlewares.goal_utils import percentage_progress, refresh_goal_spending, schedule_goal_notifications
 
 router = APIRouter(
     prefix="/goals",
     tags=["goals"]
 )
 
+def set_goal_progress(goal: Goal):
+    """
+    Set the response-only amount_spent from the goal's persisted spending: percentage progress
+    for percentage goals, the amount spent otherwise.
+    """
+    if goal.category_id:
+        if goal.goal_type == "percentage":
+            goal.amount_spent = percentage_progress(float(goal.previous_spent), float(goal.spent))
+        else:
+            goal.amount_spent = float(goal.spent)
+    else:
+        goal.amount_spent = None
+
 @router.get("/{goal_id}", response_model=GoalResponse, status_code=status.HTTP_200_OK)
 def get_goal_by_id(goal_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """
@@ -22,20 +35,7 @@ def get_goal_by_id(goal_id: int, current_user: User = Depends(get_current_user),
     goal = db.query(Goal).filter(Goal.id == goal_id, Goal.user_id == current_user.id).first()
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
-    if goal.category_id:
-        if goal.goal_type == "percentage":
-            progress, on_track = calculate_percentage_goal_progress(db, current_user.id, goal)
-            goal.amount_spent = progress
-            goal.on_track = on_track
-        else:
-            amount_spent = db.query(func.sum(Transaction.amount)).filter(
-                Transaction.category_id == goal.category_id,
-                Transaction.date >= goal.start_date,
-                Transaction.date <= goal.end_date
-            ).scalar() or 0
-            goal.amount_spent = amount_spent
-    else:
-        goal.amount_spent = None
+    set_goal_progress(goal)
     return goal
 
 @router.get("/", response_model=GoalsStatisticsResponse)
@@ -50,35 +50,24 @@ def get_goals(
     Optionally filter goals based on start_date and end_date.
     If both start_date and end_date are provided, the query filters so that both the goal's start_date 
     and end_date fall within that period.
+    Spending comes from the goals' persisted spent and previous_spent amounts, so this is a
+    single query however many goals there are.
     """
-    query = db.query(Goal).filter(Goal.user_id == current_user.id)
+    filters = [Goal.user_id == current_user.id]
     if start_date and end_date:
-        query = query.filter(
+        filters += [
             Goal.start_date <= end_date,
             Goal.end_date >= start_date
-        )
+        ]
     else:
         if start_date:
-            query = query.filter(Goal.start_date >= start_date)
+            filters.append(Goal.start_date >= start_date)
         if end_date:
-            query = query.filter(Goal.end_date <= end_date)
-    goals = query.all()
+            filters.append(Goal.end_date <= end_date)
 
+    goals = db.query(Goal).filter(*filters).order_by(Goal.id).all()
     for goal in goals:
-        if goal.category_id:
-            if goal.goal_type == "percentage":
-                progress, on_track = calculate_percentage_goal_progress(db, current_user.id, goal)
-                goal.amount_spent = progress
-                goal.on_track = on_track
-            else:
-                amount_spent = db.query(func.sum(Transaction.amount)).filter(
-                    Transaction.category_id == goal.category_id,
-                    Transaction.date >= goal.start_date,
-                    Transaction.date <= goal.end_date
-                ).scalar() or 0
-                goal.amount_spent = amount_spent
-        else:
-            goal.amount_spent = None
+        set_goal_progress(goal)
 
     if start_date is not None and end_date is not None:
         ref_date = end_date
@@ -121,6 +110,8 @@ def create_goal(
         start_date=start_date,
         end_date=end_date,
     )
+    refresh_goal_spending(db, new_goal)
+    schedule_goal_notifications(new_goal)
     db.add(new_goal)
     db.commit()
     db.refresh(new_goal)
@@ -148,24 +139,11 @@ def update_goal(goal_id: int, goal_update: GoalUpdateRequest, current_user: User
         goal.start_date = goal_update.start_date
     if goal_update.end_date is not None:
         goal.end_date = goal_update.end_date
-    if goal.category_id:
-        actual_amount_spent = db.query(func.sum(Transaction.amount)).filter(
-            Transaction.category_id == goal.category_id,
-            Transaction.date >= goal.start_date,
-            Transaction.date <= goal.end_date
-        ).scalar() or 0
-        if goal.goal_type == "percentage":
-            progress, on_track = calculate_percentage_goal_progress(db, current_user.id, goal)
-            goal.amount_spent = progress
-            goal.on_track = on_track
-        else:
-            goal.amount_spent = actual_amount_spent
-            goal.on_track = actual_amount_spent <= goal.limit
-    else:
-        goal.amount_spent = None
-        goal.on_track = True
+    refresh_goal_spending(db, goal)
+    schedule_goal_notifications(goal)
     db.commit()
     db.refresh(goal)
+    set_goal_progress(goal)
     return goal
 
 @router.delete("/{goal_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -13,6 +13,6 @@ def send_healtcheck_notification(
     db: Session = Depends(get_db)
 ):
     send_push_notification_healthcheck()
-    return {"message": "Healthcheck notifications sent"}
+    return {"message": "Healthcheck notifications queued"}
 
 
@@ -4,8 +4,10 @@ from typing import List
 from datetime import datetime, timedelta
 
 from db import get_db
+from utils import next_payment_date
 from models import RecurringTransaction, Transaction, Category, User, TransactionType
 from dependencies.auth import get_current_user
+from goal_queue import goal_recompute_queue, mark_goals_stale
 from http_models import (
     RecurringTransactionResponse,
     RecurringTransactionCreateRequest,
@@ -53,7 +55,8 @@ def create_recurring_transaction(
         end_date=request.end_date,
         note=request.note,
         period=request.period,
-        user_id=current_user.id
+        user_id=current_user.id,
+        next_payment_date=next_payment_date(request.start_date, request.end_date, request.period, datetime.utcnow())
     )
     db.add(recurring)
     db.commit()
@@ -75,7 +78,9 @@ def create_recurring_transaction(
         )
         transactions.append(tx)
     db.bulk_save_objects(transactions)
+    mark_goals_stale(db, current_user.id)
     db.commit()
+    goal_recompute_queue.mark(current_user.id)
 
     return recurring
 
@@ -95,6 +100,7 @@ def update_recurring_transaction(
     
     # Delete all current generated transactions associated with the recurring record
     db.query(Transaction).filter(Transaction.recurring_id == recurring.id).delete()
+    mark_goals_stale(db, current_user.id)
     db.commit()
     
     # Update recurring master record
@@ -102,6 +108,9 @@ def update_recurring_transaction(
     recurring.end_date = request.end_date
     recurring.note = request.note
     recurring.period = request.period
+    # a payment that was already reminded about is not reminded about again
+    after = max(datetime.utcnow(), recurring.last_notified_payment_date or datetime.min)
+    recurring.next_payment_date = next_payment_date(request.start_date, request.end_date, request.period, after)
     db.commit()
     
     # Regenerate transactions based on the updated schedule
@@ -120,7 +129,9 @@ def update_recurring_transaction(
         )
         transactions.append(tx)
     db.bulk_save_objects(transactions)
+    mark_goals_stale(db, current_user.id)
     db.commit()
+    goal_recompute_queue.mark(current_user.id)
     
     return recurring
 
@@ -139,10 +150,12 @@ def delete_recurring_transaction(
     
     # Delete all associated generated transactions first
     db.query(Transaction).filter(Transaction.recurring_id == recurring.id).delete()
+    mark_goals_stale(db, current_user.id)
     db.commit()
     
     # Remove the recurring transaction entry itself
     db.delete(recurring)
     db.commit()
+    goal_recompute_queue.mark(current_user.id)
     
     return
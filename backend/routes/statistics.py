@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
-from typing import List, Optional, Dict
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import List, Optional, Dict, Tuple
 
 import jwt
 from jwt import PyJWTError
@@ -9,7 +11,7 @@ import os
 
 from http_models import SummaryResponse, CategoryStats, SummaryCategoryResponse, TransactionResponse
 from datetime import datetime, timedelta
-from db import get_db, get_transactions as db_get_transactions, get_all_categories_for_user
+from db import get_db, get_async_db
 from models import Transaction, TransactionType, User
 from fastapi.security import HTTPAuthorizationCredentials
 from dependencies.auth import get_current_user  # Updated import
@@ -22,18 +24,25 @@ router = APIRouter(
     tags=["statistics"]
 )
 
-def fetch_transactions(
-    db: Session,
-    user: User,
+def resolve_date_range(
     start_date: Optional[datetime],
     end_date: Optional[datetime]
-) -> List[Transaction]:
+) -> Tuple[datetime, datetime]:
     if end_date is None:
         # last day of the month
         end_date = datetime.utcnow().replace(day=1, hour=23, minute=59, second=59, microsecond=999999).replace(month=datetime.utcnow().month + 1) - timedelta(days=1)
     if start_date is None:
         # first day of the month
         start_date = end_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return start_date, end_date
+
+def fetch_transactions(
+    db: Session,
+    user: User,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime]
+) -> List[Transaction]:
+    start_date, end_date = resolve_date_range(start_date, end_date)
 
     transactions = db.query(Transaction).filter(
         Transaction.user_id == user.id,
@@ -42,6 +51,22 @@ def fetch_transactions(
     ).all()
     return transactions
 
+async def fetch_transactions_async(
+    db: AsyncSession,
+    user: User,
+    start_date: Optional[datetime],
+    end_date: Optional[datetime]
+) -> List[Transaction]:
+    start_date, end_date = resolve_date_range(start_date, end_date)
+
+    # categories are eager-loaded since lazy loads are not available on async sessions
+    result = await db.execute(select(Transaction).options(selectinload(Transaction.category)).filter(
+        Transaction.user_id == user.id,
+        Transaction.date >= start_date,
+        Transaction.date <= end_date
+    ))
+    return result.scalars().all()
+
 def calculate_type_totals(transactions: List[Transaction]) -> Dict[str, float]:
     type_totals: Dict[str, float] = {
         TransactionType.INCOME.value: 0.0,
@@ -70,13 +95,13 @@ def serialize_transaction_history(transactions: List[Transaction]) -> List[Trans
     ]
 
 @router.get("/summary_spend", response_model=SummaryResponse)
-def get_summary(
+async def get_summary(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    transactions = fetch_transactions(db, current_user, start_date, end_date)
+    transactions = await fetch_transactions_async(db, current_user, start_date, end_date)
     type_totals = calculate_type_totals(transactions)
 
     total_spend = 0.0
@@ -1,6 +1,8 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Query, Response, status
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from typing import List, Optional, Dict
 
 import jwt
@@ -8,15 +10,20 @@ from jwt import PyJWTError
 from dotenv import load_dotenv
 import os
 
-from http_models import ReceiptParseResponse, TransactionCreateRequest, TransactionResponse, CategoryResponse, SummaryResponse, CategoryStats, CustomCategoryCreateRequest, TransactionUpdateRequest
+from http_models import ReceiptParseResponse, TransactionBatchRequest, TransactionBatchResponse, TransactionBatchResult, TransactionCreateRequest, TransactionResponse, CategoryResponse, SummaryResponse, CategoryStats, CustomCategoryCreateRequest, TransactionUpdateRequest
 from datetime import datetime
 from typing import Optional
-from db import get_db, add_transaction, get_transactions as db_get_transactions, get_all_categories_for_user
-from models import Transaction, TransactionType, User, Category
+from db import engine, get_db, get_async_db, add_transaction_async, get_transactions_async, stream_transactions_async, get_all_categories_for_user
+from models import ImportJob, Transaction, TransactionType, User, Category
 from dependencies.auth import get_current_user
-from utils import get_category_by_name, parse_receipt
+from csv_import import ImportReport, import_transactions, preview_transactions
+from fingerprints import DUPLICATE_MODES, find_duplicates
+from import_jobs import create_import_job, job_status, run_import_job, spool_upload
+from goal_queue import goal_recompute_queue
+from utils import parse_receipt, encode_cursor, decode_cursor
 from fastapi import UploadFile, File
 import csv
+import json
 from io import StringIO
 
 load_dotenv()
@@ -28,63 +35,152 @@ router = APIRouter(
 )
 
 @router.post("/", response_model=TransactionResponse, status_code=status.HTTP_201_CREATED)
-def create_transaction(
+async def create_transaction(
     transaction: TransactionCreateRequest,
+    duplicates: str = "skip",
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a new transaction for the authenticated user.
+    If an identical transaction exists, duplicates=skip (default) returns 409, flag creates it
+    marked is_duplicate, and force creates it without checking.
     """
+    if duplicates not in DUPLICATE_MODES:
+        raise HTTPException(status_code=400, detail=f"duplicates must be one of {', '.join(DUPLICATE_MODES)}")
     try:
         # Validate the category (if applicable).
-        category = db.query(Category).filter(
+        result = await db.execute(select(Category).filter(
             Category.id == transaction.category_id,
             (Category.user_id == current_user.id) | (Category.user_id.is_(None))
-        ).first()
+        ))
+        category = result.scalars().first()
         
         if not category:
             raise HTTPException(status_code=404, detail="Category not found")
 
-        new_transaction = add_transaction(
+        is_duplicate = False
+        # a transaction stamped with the current time cannot match an existing one
+        if duplicates != "force" and transaction.date:
+            candidate = {"date": transaction.date, "amount": transaction.amount,
+                         "vendor": transaction.vendor, "note": transaction.note}
+            [is_duplicate] = await db.run_sync(
+                lambda session: find_duplicates(session.connection(), current_user.id, [candidate])
+            )
+            if is_duplicate and duplicates == "skip":
+                raise HTTPException(status_code=409, detail="An identical transaction already exists")
+
+        new_transaction = await add_transaction_async(
+            db,
             user_id=current_user.id,
             amount=transaction.amount,
             category_id=transaction.category_id,
             transaction_type=transaction.transaction_type,
             note=transaction.note,
             date=transaction.date,
-            vendor=transaction.vendor
+            vendor=transaction.vendor,
+            is_duplicate=is_duplicate
         )
         
-        from middlewares.goal_utils import recalc_goal_progress
-        recalc_goal_progress(db, current_user.id, transaction.category_id)
-        recalc_goal_progress(db, current_user.id, None)
+        from middlewares.goal_utils import apply_goal_deltas
+        await db.run_sync(apply_goal_deltas, current_user.id,
+                          [(new_transaction.date, new_transaction.category_id, new_transaction.amount)])
+        await db.commit()
         
         return TransactionResponse.from_orm(new_transaction)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/", response_model=List[TransactionResponse])
-def read_transactions(
+async def read_transactions(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Retrieve transactions for the authenticated user.
+    Retrieve transactions for the authenticated user, newest first.
+    Pass the X-Next-Cursor header of a response as cursor to fetch the following page;
+    cursor pages cost the same however deep they are. skip still works for offset paging.
     """
-    transactions = db_get_transactions(
+    before = None
+    if cursor:
+        try:
+            before = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    transactions = await get_transactions_async(
+        db,
         user_id=current_user.id, 
         limit=limit, 
         offset=skip, 
         start_date=start_date, 
-        end_date=end_date
+        end_date=end_date,
+        before=before
     )
+    if limit > 0 and len(transactions) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(transactions[-1].date, transactions[-1].id)
     return [TransactionResponse.from_orm(tx) for tx in transactions]
 
+EXPORT_COLUMNS = ["id", "date", "amount", "category", "transaction_type", "note", "vendor"]
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def export_row(row) -> dict:
+    return {
+        "id": row.id,
+        "date": row.date.isoformat(),
+        "amount": row.amount,
+        "category": row.category,
+        "transaction_type": row.transaction_type.name,
+        "note": row.note,
+        "vendor": row.vendor
+    }
+
+async def export_chunks(batches, format: str):
+    """Encode each batch of rows as one chunk of CSV or NDJSON."""
+    if format == "csv":
+        buffer = StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        yield buffer.getvalue()
+        async for rows in batches:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(export_row(row) for row in rows)
+            yield buffer.getvalue()
+    else:
+        async for rows in batches:
+            yield "".join(json.dumps(export_row(row)) + "\n" for row in rows)
+
+@router.get("/export")
+async def export_transactions(
+    format: str = "csv",
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    category_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Export the authenticated user's transactions as CSV or NDJSON, newest first.
+    Rows are streamed from a server-side cursor in batches, so memory use does not grow with the export.
+    """
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+
+    batches = stream_transactions_async(current_user.id, start_date, end_date, category_id)
+    return StreamingResponse(
+        export_chunks(batches, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="transactions.{format}"'}
+    )
+
 @router.delete("/{transaction_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_transaction(
     transaction_id: int,
@@ -101,61 +197,201 @@ def delete_transaction(
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
-    category_id = transaction.category_id
+    from middlewares.goal_utils import apply_goal_deltas
+    apply_goal_deltas(db, current_user.id, [(transaction.date, transaction.category_id, -transaction.amount)])
     db.delete(transaction)
     db.commit()
     
-    from middlewares.goal_utils import recalc_goal_progress
-    recalc_goal_progress(db, current_user.id, category_id)
-    recalc_goal_progress(db, current_user.id, None)
-    
     return
 
+@router.post("/batch", response_model=TransactionBatchResponse)
+def batch_transactions(
+    batch: TransactionBatchRequest,
+    duplicates: str = "skip",
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Apply a list of create, update and delete operations in order, in one database transaction.
+    If any operation fails, none are applied and the error names the failing operation's index.
+    Creates that duplicate a transaction, as the earlier operations left them, are skipped, flagged or forced per duplicates.
+    Goal progress is updated with the combined deltas of all operations in one statement.
+    """
+    if duplicates not in DUPLICATE_MODES:
+        raise HTTPException(status_code=400, detail=f"duplicates must be one of {', '.join(DUPLICATE_MODES)}")
+
+    operations = batch.operations
+    category_ids = {
+        id for (id,) in db.query(Category.id).filter(
+            (Category.user_id == current_user.id) | (Category.user_id.is_(None))
+        )
+    }
+    target_ids = {op.id for op in operations if op.op != "create"}
+    transactions = {
+        tx.id: tx for tx in db.query(Transaction).filter(
+            Transaction.user_id == current_user.id,
+            Transaction.id.in_(target_ids)
+        )
+    } if target_ids else {}
+
+    def check_duplicates(start):
+        """
+        Duplicate flags for the run of creates starting at operations[start], against the
+        transactions as the operations before it left them and against earlier creates in the run.
+        """
+        end = start
+        while end < len(operations) and operations[end].op == "create":
+            end += 1
+        # creates without a date are stamped now and cannot match anything
+        dated = [index for index in range(start, end) if operations[index].transaction.date]
+        candidates = [
+            {"date": tx.date, "amount": tx.amount, "vendor": tx.vendor, "note": tx.note}
+            for tx in (operations[index].transaction for index in dated)
+        ]
+        # write out the earlier operations so the lookup sees their effect
+        db.flush()
+        flags = dict.fromkeys(range(start, end), False)
+        flags.update(zip(dated, find_duplicates(db.connection(), current_user.id, candidates)))
+        return flags
+
+    duplicate_flags = {}
+    goal_changes = []
+    results = []
+    try:
+        for index, op in enumerate(operations):
+            if op.op == "create":
+                data = op.transaction
+                if duplicates != "force" and index not in duplicate_flags:
+                    duplicate_flags.update(check_duplicates(index))
+                is_duplicate = duplicate_flags.get(index, False)
+                if is_duplicate and duplicates == "skip":
+                    results.append((op, "skipped", None))
+                    continue
+                if data.category_id not in category_ids:
+                    raise HTTPException(status_code=404, detail=f"Operation {index}: category not found")
+                tx = Transaction(
+                    user_id=current_user.id,
+                    amount=data.amount,
+                    category_id=data.category_id,
+                    transaction_type=data.transaction_type,
+                    note=data.note,
+                    date=data.date or datetime.utcnow(),
+                    vendor=data.vendor,
+                    is_duplicate=is_duplicate
+                )
+                db.add(tx)
+                goal_changes.append((tx.date, tx.category_id, tx.amount))
+                results.append((op, "applied", tx))
+                continue
+
+            tx = transactions.get(op.id)
+            if tx is None:
+                raise HTTPException(status_code=404, detail=f"Operation {index}: transaction not found")
+            goal_changes.append((tx.date, tx.category_id, -tx.amount))
+
+            if op.op == "delete":
+                db.delete(tx)
+                del transactions[op.id]
+                results.append((op, "applied", None))
+                continue
+
+            changes = op.changes
+            if changes.category_id is not None:
+                if changes.category_id not in category_ids:
+                    raise HTTPException(status_code=404, detail=f"Operation {index}: category not found")
+                tx.category_id = changes.category_id
+            for field in ("amount", "transaction_type", "note", "date", "vendor"):
+                value = getattr(changes, field)
+                if value is not None:
+                    setattr(tx, field, value)
+            goal_changes.append((tx.date, tx.category_id, tx.amount))
+            results.append((op, "applied", tx))
+
+        # build the response before committing, which would expire every object
+        db.flush()
+        response = TransactionBatchResponse(results=[
+            TransactionBatchResult(
+                op=op.op,
+                id=tx.id if tx is not None else op.id,
+                status=outcome,
+                transaction=TransactionResponse.from_orm(tx) if tx is not None else None
+            )
+            for op, outcome, tx in results
+        ])
+        from middlewares.goal_utils import apply_goal_deltas
+        apply_goal_deltas(db, current_user.id, goal_changes)
+        db.commit()
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return response
+
 @router.post("/csv", status_code=status.HTTP_201_CREATED)
 def upload_csv(
+    background_tasks: BackgroundTasks,
+    response: Response,
     file: UploadFile = File(...),
     create_transactions: Optional[int] = 0,
+    run_async: Optional[int] = Query(0, alias="async"),
+    duplicates: str = "skip",
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Parse a transaction CSV file and return list of transactions.
-    If create_transactions is set to 1, also create the transactions in the database.
+    If create_transactions is set to 1, stream the file into the database instead and return
+    an import report; invalid rows are skipped and listed with their row number.
+    If async is set to 1, spool the file to disk, import it in the background and return
+    a job id to poll at /transactions/imports/{job_id}.
+    Rows identical to an existing transaction are skipped, flagged or forced in per duplicates;
+    the preview marks them with is_duplicate.
     """
+    if duplicates not in DUPLICATE_MODES:
+        raise HTTPException(status_code=400, detail=f"duplicates must be one of {', '.join(DUPLICATE_MODES)}")
     try:
-        content = file.file.read().decode('utf-8')
-        csv_reader = csv.DictReader(StringIO(content))
-        
-        # Fetch categories for the current user
+        if run_async == 1:
+            path = spool_upload(file.file)
+            job = create_import_job(current_user.id, file.filename)
+            background_tasks.add_task(run_import_job, job.id, path, current_user.id, duplicates)
+            response.status_code = status.HTTP_202_ACCEPTED
+            return {"job_id": job.id, "status": job.status}
+
         categories = get_all_categories_for_user(user_id=current_user.id)
-        
-        transactions = []
-        for row in csv_reader:
-            # Find the category by name for the current user
-            target_category_id = get_category_by_name(row['category'], categories)
-            if not target_category_id:
-                raise Exception(f"Category '{row['category']}' not found for the current user")
-        
-            transaction = {
-                "user_id": current_user.id,
-                "amount": round(float(row['amount']), 2),
-                "category_id": target_category_id,
-                "note": row.get('note', ''),
-                "date": row['date'],
-                "vendor": row.get('vendor')
-            }
-            transactions.append(transaction)
-        
+
         if create_transactions == 1:
-            db_transactions = [Transaction(**t) for t in transactions]
-            db.bulk_save_objects(db_transactions)
-            db.commit()
-            return {"message": "Transactions successfully inserted"}
-        
+            report = import_transactions(engine, file.file, current_user.id, categories, duplicates=duplicates)
+            if report.inserted:
+                goal_recompute_queue.mark(current_user.id)
+            return {"message": "Transactions successfully inserted", **report.to_dict()}
+
+        report = ImportReport()
+        transactions = preview_transactions(engine, file.file, current_user.id, categories, report)
+        if report.errors:
+            raise HTTPException(status_code=400, detail=report.to_dict())
         return transactions
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.get("/imports/{job_id}")
+def get_import_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Return the progress of a background CSV import.
+    """
+    job = db.query(ImportJob).filter(ImportJob.id == job_id, ImportJob.user_id == current_user.id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job_status(job)
+
 @router.get("/csv/template", response_class=FileResponse)
 def get_csv_template():
     """
@@ -210,6 +446,7 @@ def update_transaction(
     ).first()
     if not tx:
         raise HTTPException(status_code=404, detail="Transaction not found")
+    old_values = (tx.date, tx.category_id, -tx.amount)
     
     # If a new category is provided, validate it.
     if transaction_update.category_id is not None:
@@ -232,11 +469,9 @@ def update_transaction(
     if transaction_update.vendor is not None:
         tx.vendor = transaction_update.vendor
 
+    from middlewares.goal_utils import apply_goal_deltas
+    apply_goal_deltas(db, current_user.id, [old_values, (tx.date, tx.category_id, tx.amount)])
     db.commit()
     db.refresh(tx)
     
-    from middlewares.goal_utils import recalc_goal_progress
-    recalc_goal_progress(db, current_user.id, tx.category_id)
-    recalc_goal_progress(db, current_user.id, None)
-    
     return TransactionResponse.from_orm(tx)
\ No newline at end of file
@@ -0,0 +1,343 @@
+"""
+Synthetic dataset generator for load testing.
+
+Bulk-loads users, categories, transactions, goals, recurring schedules, deals,
+votes and deal subscriptions with Postgres COPY in fixed-size batches. Users are
+split into chunks that are loaded by parallel worker processes.
+
+Rows are appended to whatever is already in the database. Parent rows get explicit
+ids reserved above the current maximum, so do not run the generator while the
+server is accepting writes.
+
+Usage (see `python manage.py generate --help` for all options):
+    python manage.py generate --users 100000 --transactions-per-user 500 --workers 8
+"""
+import datetime
+import math
+import multiprocessing
+import random
+import time
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+import utils
+from db import engine, copy_rows, PREDEFINED_CATEGORIES
+from middlewares.goal_utils import next_notification_at
+from partitions import ensure_transaction_partitions
+
+USERNAME_PREFIX = "loadtest_"
+LOADTEST_PASSWORD = "loadtest"
+
+# Spending profile per predefined category: (share of expenses, median amount, log-normal sigma, vendors)
+CATEGORY_PROFILES = {
+    "Food & Drinks": (0.34, 18.0, 0.70, ["Supermarket", "Cafe Delight", "Italian Bistro", "Campus Pizza", "Starbucks", "Tim Hortons"]),
+    "Transportation": (0.14, 25.0, 0.60, ["Gas Station", "City Transport", "Uber", "Auto Shop", "Parking Authority"]),
+    "Entertainment": (0.10, 35.0, 0.80, ["Cinema", "Concert Hall", "Fun Park", "Steam", "Bowling Alley"]),
+    "Lifestyle": (0.12, 40.0, 0.75, ["Gym", "Spa", "Salon", "Clothing Store", "Pharmacy"]),
+    "Housing": (0.06, 110.0, 0.90, ["Utility Company", "Repair Service", "Hardware Store", "Internet Provider"]),
+    "Miscellaneous": (0.18, 20.0, 1.00, ["Office Supplies", "Gift Shop", "Charity", "Post Office", "Dollar Store"]),
+    "Savings": (0.06, 200.0, 0.60, ["Bank"]),
+}
+CATEGORY_NAMES = [category["name"] for category in PREDEFINED_CATEGORIES]
+EXPENSE_CATEGORY_WEIGHTS = [CATEGORY_PROFILES[name][0] for name in CATEGORY_NAMES]
+
+# Share of generated transactions that are income (paycheques), with their median amount
+INCOME_SHARE = 0.03
+INCOME_MEDIAN = 1800.0
+
+# Relative likelihood of a purchase at each hour of the day
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 8, 10, 9, 9, 12, 16, 12, 9, 9, 11, 14, 16, 14, 10, 7, 4, 2]
+
+RECURRING_TEMPLATES = [
+    # (period in days, category, median amount, note, vendor)
+    (30, "Housing", 1400.0, "Monthly Rent", "Landlord"),
+    (30, "Lifestyle", 45.0, "Gym membership", "Gym"),
+    (30, "Entertainment", 16.0, "Streaming subscription", "Netflix"),
+    (14, "Transportation", 60.0, "Bus pass", "City Transport"),
+    (7, "Food & Drinks", 90.0, "Weekly groceries", "Supermarket"),
+]
+
+# Deals and subscriptions are scattered around these cities (latitude, longitude)
+CITY_CENTERS = [
+    ("Waterloo, ON", 43.4643, -80.5204),
+    ("Toronto, ON", 43.6532, -79.3832),
+    ("Vancouver, BC", 49.2827, -123.1207),
+    ("Montreal, QC", 45.5019, -73.5674),
+    ("Calgary, AB", 51.0447, -114.0719),
+    ("Ottawa, ON", 45.4215, -75.6972),
+]
+DEAL_NAMES = ["Discounted Coffee", "BOGO Pizza", "Gym Membership", "Movie Tickets", "Happy Hour", "Free Donut", "Half Price Wings"]
+DEAL_VENDORS = ["Starbucks", "Campus Pizza", "Crunch Fitness", "Cineplex", "Boston Pizza", "Tim Hortons", "Wild Wing"]
+
+
+class GeneratorConfig:
+    def __init__(self, users: int = 1000, transactions_per_user: int = 500, custom_categories_per_user: int = 0,
+                 goals_per_user: int = 3, recurring_per_user: int = 2, deals: int = 1000, votes_per_deal: int = 10,
+                 subscriptions_per_user: int = 1, months: int = 24, batch_size: int = 50000, workers: int = 1,
+                 seed: Optional[int] = None):
+        # deals are posted by, and voted on by, generated users
+        if deals > 0 and users < 1:
+            raise ValueError("Generating deals requires at least one user")
+        self.users = users
+        self.transactions_per_user = transactions_per_user
+        self.custom_categories_per_user = custom_categories_per_user
+        self.goals_per_user = goals_per_user
+        self.recurring_per_user = min(recurring_per_user, len(RECURRING_TEMPLATES))
+        self.deals = deals
+        self.votes_per_deal = votes_per_deal
+        self.subscriptions_per_user = subscriptions_per_user
+        self.months = months
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        self.seed = seed if seed is not None else random.randrange(2 ** 31)
+        self.end = datetime.datetime.utcnow().replace(microsecond=0)
+        self.start = self.end - datetime.timedelta(days=30 * months)
+
+    @property
+    def categories_per_user(self) -> int:
+        return len(PREDEFINED_CATEGORIES) + self.custom_categories_per_user
+
+
+# region COPY helpers
+def next_id(cursor, table: str) -> int:
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")
+    return cursor.fetchone()[0]
+
+def sync_sequence(cursor, table: str):
+    """Move the serial sequence past ids that were inserted explicitly."""
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))"
+    )
+# endregion
+
+
+# region Distributions
+def random_amount(rng: random.Random, median: float, sigma: float) -> float:
+    return round(max(0.5, rng.lognormvariate(math.log(median), sigma)), 2)
+
+def random_date(rng: random.Random, config: GeneratorConfig) -> datetime.datetime:
+    # skew towards recent months, like a growing user base, then pick a time of day
+    span_days = (config.end - config.start).days
+    day = config.start + datetime.timedelta(days=int(span_days * rng.betavariate(1.4, 1.0)))
+    hour = rng.choices(range(24), weights=HOUR_WEIGHTS)[0]
+    return day.replace(hour=hour, minute=rng.randrange(60), second=rng.randrange(60))
+
+def random_point_near(rng: random.Random, latitude: float, longitude: float, spread_km: float) -> Tuple[float, float]:
+    # ~111 km per degree of latitude
+    return (latitude + rng.gauss(0, spread_km / 111.0),
+            longitude + rng.gauss(0, spread_km / (111.0 * math.cos(math.radians(latitude)))))
+# endregion
+
+
+# region Per-user rows (run inside worker processes)
+def _user_chunk_rows(config: GeneratorConfig, chunk: Tuple[int, int, int, int, int]):
+    """Build recurring schedules, transactions, goals and subscriptions for a contiguous range of users."""
+    first_user_index, last_user_index, first_user_id, first_category_id, first_recurring_id = chunk
+    rng = random.Random(config.seed + first_user_index)
+    # reminders are scheduled relative to the real clock, not the generated history
+    now = datetime.datetime.utcnow()
+
+    recurring_rows, transaction_rows, goal_rows, subscription_rows = [], [], [], []
+    for user_index in range(first_user_index, last_user_index):
+        offset = user_index - first_user_index
+        user_id = first_user_id + offset
+        category_base = first_category_id + offset * config.categories_per_user
+        category_ids = {name: category_base + position for position, name in enumerate(CATEGORY_NAMES)}
+        first_transaction = len(transaction_rows)
+
+        # recurring schedules and their materialized transactions
+        for position, (period, category_name, median, note, vendor) in enumerate(RECURRING_TEMPLATES[:config.recurring_per_user]):
+            recurring_id = first_recurring_id + offset * config.recurring_per_user + position
+            start = config.start + datetime.timedelta(days=rng.randrange(period))
+            recurring_rows.append((recurring_id, start, config.end, note, period, user_id, None,
+                                   utils.next_payment_date(start, config.end, period, now)))
+            amount = random_amount(rng, median, 0.05)
+            date = start
+            while date <= config.end:
+                transaction_rows.append((amount, category_ids[category_name], "EXPENSE", user_id, note, date, vendor, recurring_id))
+                date += datetime.timedelta(days=period)
+
+        # one-off purchases and income
+        for _ in range(config.transactions_per_user):
+            if rng.random() < INCOME_SHARE:
+                transaction_rows.append((random_amount(rng, INCOME_MEDIAN, 0.3), category_ids["Savings"], "INCOME",
+                                         user_id, "Paycheque", random_date(rng, config), "Employer", None))
+                continue
+            category_name = rng.choices(CATEGORY_NAMES, weights=EXPENSE_CATEGORY_WEIGHTS)[0]
+            _, median, sigma, vendors = CATEGORY_PROFILES[category_name]
+            vendor = rng.choice(vendors)
+            transaction_rows.append((random_amount(rng, median, sigma), category_ids[category_name], "EXPENSE",
+                                     user_id, f"{category_name} at {vendor}", random_date(rng, config), vendor, None))
+
+        # goals over windows scattered through the history, with their spent amounts precomputed
+        user_transactions = transaction_rows[first_transaction:]
+        for _ in range(config.goals_per_user):
+            period = rng.choice([7, 14, 30])
+            start = random_date(rng, config).replace(hour=0, minute=0, second=0)
+            end = start + datetime.timedelta(days=period - 1, hours=23, minutes=59, seconds=59)
+            category_name = rng.choice(CATEGORY_NAMES)
+            if rng.random() < 0.3:
+                goal_type, limit = "percentage", float(rng.choice([5, 10, 20]))
+            else:
+                goal_type, limit = "amount", float(round(CATEGORY_PROFILES[category_name][1] * period * rng.uniform(0.5, 2.0)))
+            ended = end < config.end
+            previous_start = start - (end - start)
+            spent, previous_spent = Decimal(0), Decimal(0)
+            for amount, category_id, _, _, _, date, _, _ in user_transactions:
+                if category_id != category_ids[category_name] or not previous_start <= date <= end:
+                    continue
+                if date >= start:
+                    spent += Decimal(str(amount))
+                else:
+                    previous_spent += Decimal(str(amount))
+            goal_rows.append((user_id, category_ids[category_name], goal_type, limit, start, end,
+                              True, ended, ended, start, spent, previous_spent,
+                              next_notification_at(start, end, ended, ended)))
+
+        for _ in range(config.subscriptions_per_user):
+            address, latitude, longitude = rng.choice(CITY_CENTERS)
+            latitude, longitude = random_point_near(rng, latitude, longitude, 5)
+            subscription_rows.append((user_id, address, latitude, longitude))
+
+    return recurring_rows, transaction_rows, goal_rows, subscription_rows
+
+def _load_user_chunk(args) -> Dict[str, int]:
+    config, chunk = args
+    recurring_rows, transaction_rows, goal_rows, subscription_rows = _user_chunk_rows(config, chunk)
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        counts = {
+            "recurring_transactions": copy_rows(cursor, "recurring_transactions",
+                                                ["id", "start_date", "end_date", "note", "period", "user_id", "last_notified_payment_date",
+                                                 "next_payment_date"],
+                                                recurring_rows, config.batch_size),
+            "transactions": copy_rows(cursor, "transactions",
+                                      ["amount", "category_id", "transaction_type", "user_id", "note", "date", "vendor", "recurring_id"],
+                                      transaction_rows, config.batch_size),
+            "goals": copy_rows(cursor, "goals",
+                               ["user_id", "category_id", "goal_type", '"limit"', "start_date", "end_date",
+                                "on_track", "mid_notified", "post_notified", "created_at", "spent", "previous_spent",
+                                "next_notification_at"],
+                               goal_rows, config.batch_size),
+            "deal_location_subscriptions": copy_rows(cursor, "deal_location_subscriptions",
+                                                     ["user_id", "address", "latitude", "longitude"],
+                                                     subscription_rows, config.batch_size),
+        }
+        connection.commit()
+        return counts
+    finally:
+        connection.close()
+
+def _init_worker():
+    # connections inherited from the parent process must not be shared
+    engine.dispose(close=False)
+# endregion
+
+
+def generate_dataset(config: GeneratorConfig) -> Dict[str, int]:
+    """Generate and bulk-load a synthetic dataset. Returns the number of rows loaded per table."""
+    start_time = time.perf_counter()
+    counts: Dict[str, int] = {}
+    rng = random.Random(config.seed)
+
+    # monthly partitions must exist for the whole history, or every row lands in the default partition
+    ensure_transaction_partitions(engine, since=config.start)
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        first_user_id = next_id(cursor, "users")
+        first_category_id = next_id(cursor, "categories")
+        first_recurring_id = next_id(cursor, "recurring_transactions")
+        first_deal_id = next_id(cursor, "deals")
+        run_tag = f"{config.seed:x}"
+
+        password = utils.hash_password(LOADTEST_PASSWORD)
+        counts["users"] = copy_rows(cursor, "users",
+                                    ["id", "role", "username", "password", "firstname", "lastname", "xp", "level"],
+                                    ((first_user_id + i, "user", f"{USERNAME_PREFIX}{run_tag}_{i}", password, "Load", f"Test{i}", 1, 1)
+                                     for i in range(config.users)),
+                                    config.batch_size)
+
+        def category_rows():
+            for i in range(config.users):
+                user_id = first_user_id + i
+                category_id = first_category_id + i * config.categories_per_user
+                for category in PREDEFINED_CATEGORIES:
+                    yield category_id, category["name"], user_id, category["color"]
+                    category_id += 1
+                for custom in range(config.custom_categories_per_user):
+                    yield category_id, f"Custom {custom + 1}", user_id, "#FF888888"
+                    category_id += 1
+        counts["categories"] = copy_rows(cursor, "categories", ["id", "name", "user_id", "color"],
+                                         category_rows(), config.batch_size)
+
+        for table in ("users", "categories"):
+            sync_sequence(cursor, table)
+        connection.commit()
+        print(f"Loaded {counts['users']} users and {counts['categories']} categories")
+    finally:
+        connection.close()
+
+    # per-user data, loaded in parallel chunks small enough to keep each worker's memory bounded.
+    # Recurring ids are reserved per user so workers can reference them without a round trip.
+    rows_per_user = config.transactions_per_user + 1
+    chunk_size = max(1, min(config.batch_size * 2 // rows_per_user, math.ceil(config.users / (config.workers * 4))))
+    chunks = [
+        (config, (index, min(index + chunk_size, config.users),
+                  first_user_id + index,
+                  first_category_id + index * config.categories_per_user,
+                  first_recurring_id + index * config.recurring_per_user))
+        for index in range(0, config.users, chunk_size)
+    ]
+    engine.dispose()
+    done_users = 0
+    with multiprocessing.get_context("fork").Pool(config.workers, initializer=_init_worker) as pool:
+        for chunk_counts in pool.imap_unordered(_load_user_chunk, chunks):
+            for table, count in chunk_counts.items():
+                counts[table] = counts.get(table, 0) + count
+            done_users += chunk_size
+            elapsed = time.perf_counter() - start_time
+            print(f"  {min(done_users, config.users)}/{config.users} users, "
+                  f"{counts['transactions']} transactions ({counts['transactions'] / elapsed:,.0f} rows/s)")
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        sync_sequence(cursor, "recurring_transactions")
+
+        # deals around the city centers, posted by random generated users
+        def deal_rows():
+            for i in range(config.deals):
+                _, latitude, longitude = rng.choice(CITY_CENTERS)
+                latitude, longitude = random_point_near(rng, latitude, longitude, 15)
+                position = rng.randrange(len(DEAL_NAMES))
+                yield (first_deal_id + i, DEAL_NAMES[position], f"{DEAL_NAMES[position]} while supplies last",
+                       DEAL_VENDORS[position], random_amount(rng, 12.0, 0.8), first_user_id + rng.randrange(config.users),
+                       random_date(rng, config), "Generated address", longitude, latitude)
+        counts["deals"] = copy_rows(cursor, "deals",
+                                    ["id", "name", "description", "vendor", "price", "user_id", "date", "address", "longitude", "latitude"],
+                                    deal_rows(), config.batch_size)
+        sync_sequence(cursor, "deals")
+
+        # at most one vote per user per deal; the deal_votes triggers keep deals.upvotes/downvotes in step
+        def vote_rows():
+            for i in range(config.deals):
+                voters = min(config.users, max(0, int(rng.expovariate(1 / config.votes_per_deal)))) if config.votes_per_deal else 0
+                for user_offset in rng.sample(range(config.users), voters):
+                    yield first_deal_id + i, first_user_id + user_offset, 1 if rng.random() < 0.75 else -1
+        counts["deal_votes"] = copy_rows(cursor, "deal_votes", ["deal_id", "user_id", "vote"], vote_rows(), config.batch_size)
+        connection.commit()
+
+        # refresh planner statistics so benchmarks see realistic plans straight away
+        for table in ("users", "categories", "transactions", "goals", "recurring_transactions",
+                      "deals", "deal_votes", "deal_location_subscriptions"):
+            cursor.execute(f"ANALYZE {table}")
+        connection.commit()
+    finally:
+        connection.close()
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Generated dataset in {elapsed:.1f}s (seed {config.seed}): {counts}")
+    return counts
@@ -48,6 +48,17 @@ def test_create_deal(server):
     except requests.exceptions.ConnectionError:
         pytest.fail("Could not connect to the server")
 
+def test_deal_fanout_runs_after_response(server):
+    """Nearby subscribers are queued in the background, and the fan-out is counted"""
+    url = f"{BASE_URL}/healthcheck/deal_fanout"
+    for _ in range(50):
+        stats = requests.get(url).json()
+        if stats["fanouts"] + stats["failures"] >= 1:
+            break
+        time.sleep(0.1)
+    assert stats["fanouts"] >= 1, stats
+    assert stats["failures"] == 0, stats
+
 def test_get_deals(server):
     """Test retrieving all deals"""
     url = f"{BASE_URL}/deals/list"
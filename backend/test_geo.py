@@ -0,0 +1,63 @@
+import random
+
+import numpy as np
+import pytest
+
+from geo import bounding_box, grid_cell, haversine_km, within_distance, GRID_DEGREES
+from utils import get_coordinate_distance
+
+def in_box(box, latitude, longitude):
+    min_lat, max_lat, min_lon, max_lon = box
+    if not min_lat <= latitude <= max_lat:
+        return False
+    # the box may run past the antimeridian
+    return any(min_lon <= longitude + shift <= max_lon for shift in (-360, 0, 360))
+
+@pytest.mark.parametrize("latitude, longitude, distance", [
+    (49.28, -123.12, 100),   # Vancouver
+    (0.0, 179.8, 50),        # across the antimeridian
+    (-33.87, 151.21, 1000),
+    (89.5, 10.0, 200),       # reaching the pole
+    (64.0, -21.0, 5),
+])
+def test_bounding_box_contains_every_point_in_range(latitude, longitude, distance):
+    rng = random.Random(446)
+    box = bounding_box(latitude, longitude, distance)
+    checked = 0
+    for _ in range(20000):
+        # points scattered around the center, some of them in range
+        point_lat = max(-90.0, min(90.0, latitude + rng.uniform(-2, 2) * distance / 111))
+        point_lon = (longitude + rng.uniform(-4, 4) * distance / 111 + 180) % 360 - 180
+        if get_coordinate_distance(latitude, longitude, point_lat, point_lon) <= distance:
+            checked += 1
+            assert in_box(box, point_lat, point_lon), (point_lat, point_lon)
+    assert checked > 0
+
+def test_grid_cell():
+    assert grid_cell(0.0) == 0
+    assert grid_cell(GRID_DEGREES - 1e-9) == 0
+    assert grid_cell(-1e-9) == -1
+    assert grid_cell(49.28) == int(49.28 // GRID_DEGREES)
+
+def test_haversine_matches_scalar_version():
+    rng = np.random.default_rng(446)
+    latitudes, longitudes = rng.uniform(-90, 90, 1000), rng.uniform(-180, 180, 1000)
+    expected = [get_coordinate_distance(10.0, 20.0, lat, lon) for lat, lon in zip(latitudes, longitudes)]
+    assert haversine_km(10.0, 20.0, latitudes, longitudes) == pytest.approx(expected)
+
+    # two arrays of pairs
+    pairs = [get_coordinate_distance(a, b, c, d) for a, b, c, d in zip(latitudes, longitudes, latitudes[::-1], longitudes[::-1])]
+    assert haversine_km(latitudes, longitudes, latitudes[::-1], longitudes[::-1]) == pytest.approx(pairs)
+
+@pytest.mark.parametrize("latitude, longitude", [(49.28, -123.12), (0.0, 179.9), (89.9, 0.0)])
+def test_prefilter_keeps_the_same_points(latitude, longitude):
+    rng = np.random.default_rng(446)
+    latitudes = np.clip(latitude + rng.uniform(-5, 5, 20000), -90, 90)
+    longitudes = (longitude + rng.uniform(-10, 10, 20000) + 180) % 360 - 180
+    with_prefilter = within_distance(latitude, longitude, latitudes, longitudes, 150)
+    without_prefilter = within_distance(latitude, longitude, latitudes, longitudes, 150, prefilter=False)
+    assert len(with_prefilter) > 0
+    assert with_prefilter.tolist() == without_prefilter.tolist()
+
+def test_within_distance_of_nothing():
+    assert within_distance(49.28, -123.12, [], [], 100).tolist() == []
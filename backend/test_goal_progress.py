@@ -0,0 +1,185 @@
+import pytest
+import datetime
+from types import SimpleNamespace
+from sqlalchemy import event
+
+from db import db_session, engine, init_db, add_predefined_categories
+from models import Category, Goal, NotificationOutbox, Transaction, TransactionType, User
+from middlewares.goal_utils import (apply_goal_deltas, calculate_percentage_goal_progress, get_mid_period_notifications,
+                                   get_post_period_notifications, refresh_goal_spending, schedule_goal_notifications)
+from goal_queue import mark_goals_stale, recompute_user_goals, stale_goal_users
+from rollups import sum_spending
+from routes.goals import get_goals
+import utils
+
+@pytest.fixture(scope="module")
+def goal_user():
+    """A fresh user with the predefined categories and an amount, a percentage and an uncategorized goal."""
+    init_db()
+    user = db_session.query(User).filter_by(username="goaldeltauser").first()
+    if not user:
+        user = User(username="goaldeltauser", password=utils.hash_password("goaldeltapassword"), firstname="Goal", lastname="Delta")
+        db_session.add(user)
+        db_session.commit()
+        add_predefined_categories(user.id)
+    db_session.query(Transaction).filter(Transaction.user_id == user.id).delete()
+    db_session.query(Goal).filter(Goal.user_id == user.id).delete()
+    db_session.commit()
+    category_ids = [category.id for category in db_session.query(Category).filter(Category.user_id == user.id).order_by(Category.id)]
+
+    start = datetime.datetime(2024, 3, 1)
+    end = datetime.datetime(2024, 3, 14, 23, 59, 59)
+    for category_id, goal_type, limit in ((category_ids[0], "amount", 100.0), (category_ids[0], "percentage", 10.0), (None, "amount", 300.0)):
+        goal = Goal(user_id=user.id, category_id=category_id, goal_type=goal_type, limit=limit, start_date=start, end_date=end)
+        refresh_goal_spending(db_session, goal)
+        db_session.add(goal)
+    db_session.commit()
+    yield user.id, category_ids
+    db_session.remove()
+
+def persisted(user_id):
+    goals = db_session.query(Goal).filter(Goal.user_id == user_id).order_by(Goal.id).all()
+    return [(round(float(goal.spent), 2), round(float(goal.previous_spent), 2), goal.on_track) for goal in goals]
+
+def recomputed(user_id):
+    goals = db_session.query(Goal).filter(Goal.user_id == user_id).order_by(Goal.id).all()
+    values = []
+    for goal in goals:
+        refresh_goal_spending(db_session, goal)
+        values.append((round(float(goal.spent), 2), round(float(goal.previous_spent), 2), goal.on_track))
+    db_session.rollback()
+    return values
+
+def test_deltas_match_full_recalculation(goal_user):
+    user_id, category_ids = goal_user
+    dates = [datetime.datetime(2024, 2, 20), datetime.datetime(2024, 3, 1), datetime.datetime(2024, 3, 9, 12),
+             datetime.datetime(2024, 3, 14, 23, 59, 59), datetime.datetime(2024, 3, 20)]
+
+    # inserts in and around the window, in the goal category and another one
+    transactions = []
+    for i, date in enumerate(dates):
+        for category_id in (category_ids[0], category_ids[1]):
+            tx = Transaction(user_id=user_id, amount=12.35 * (i + 1), category_id=category_id,
+                             transaction_type=TransactionType.EXPENSE, note="goal delta", date=date)
+            db_session.add(tx)
+            transactions.append(tx)
+    apply_goal_deltas(db_session, user_id, [(tx.date, tx.category_id, tx.amount) for tx in transactions])
+    db_session.commit()
+    assert persisted(user_id) == recomputed(user_id)
+
+    # move a transaction out of the window and into another category, and raise another past the limit
+    moved, raised = transactions[2], transactions[4]
+    changes = [(moved.date, moved.category_id, -moved.amount), (raised.date, raised.category_id, -raised.amount)]
+    moved.date = datetime.datetime(2024, 4, 2)
+    moved.category_id = category_ids[1]
+    raised.amount = 250.0
+    changes += [(moved.date, moved.category_id, moved.amount), (raised.date, raised.category_id, raised.amount)]
+    apply_goal_deltas(db_session, user_id, changes)
+    db_session.commit()
+    assert persisted(user_id) == recomputed(user_id)
+    assert persisted(user_id)[0][2] is False
+
+    deleted = transactions[0]
+    apply_goal_deltas(db_session, user_id, [(deleted.date, deleted.category_id, -deleted.amount)])
+    db_session.delete(deleted)
+    db_session.commit()
+    assert persisted(user_id) == recomputed(user_id)
+
+def count_queries(function, *args, **kwargs):
+    """Call function and return its result and the number of SQL statements it executed."""
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        return function(*args, **kwargs), len(statements)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+def test_get_goals_query_count_is_constant(goal_user):
+    user_id, category_ids = goal_user
+    # a plain object, so reading the user's id never triggers a query of its own
+    user = SimpleNamespace(id=user_id)
+
+    _, few_goals_queries = count_queries(get_goals, current_user=user, db=db_session)
+    start = datetime.datetime(2024, 2, 1)
+    for i in range(20):
+        goal_type = "percentage" if i % 2 else "amount"
+        goal = Goal(user_id=user_id, category_id=category_ids[i % 4], goal_type=goal_type, limit=50.0,
+                    start_date=start + datetime.timedelta(days=i), end_date=start + datetime.timedelta(days=i + 13))
+        # as POST /goals does; reads serve the persisted amounts
+        refresh_goal_spending(db_session, goal)
+        db_session.add(goal)
+    db_session.commit()
+    db_session.expire_all()
+
+    result, many_goals_queries = count_queries(get_goals, current_user=user, db=db_session)
+    assert many_goals_queries == few_goals_queries == 1
+    assert len(result["goals"]) == 23
+
+    for goal in result["goals"]:
+        if not goal.category_id:
+            continue
+        if goal.goal_type == "percentage":
+            progress, on_track = calculate_percentage_goal_progress(db_session, user_id, goal)
+            assert goal.amount_spent == pytest.approx(progress)
+            assert goal.on_track == on_track
+        else:
+            expected = sum_spending(db_session, user_id, goal.start_date, goal.end_date, category_id=goal.category_id)
+            assert goal.amount_spent == pytest.approx(expected)
+    db_session.rollback()
+
+def test_notifications_follow_schedule(goal_user):
+    user_id, category_ids = goal_user
+    now = datetime.datetime.utcnow()
+    goals = {
+        # 90% through its period, so the mid-period notification is due
+        "mid_due": Goal(start_date=now - datetime.timedelta(days=9), end_date=now + datetime.timedelta(days=1)),
+        # 50% through, not due yet
+        "mid_pending": Goal(start_date=now - datetime.timedelta(days=5), end_date=now + datetime.timedelta(days=5)),
+        # ended without ever getting its mid-period notification
+        "ended": Goal(start_date=now - datetime.timedelta(days=10), end_date=now - datetime.timedelta(hours=1)),
+    }
+    for goal in goals.values():
+        goal.user_id, goal.category_id, goal.goal_type, goal.limit = user_id, category_ids[0], "amount", 100.0
+        refresh_goal_spending(db_session, goal)
+        schedule_goal_notifications(goal)
+        db_session.add(goal)
+    db_session.commit()
+    assert goals["mid_pending"].next_notification_at == goals["mid_pending"].start_date + datetime.timedelta(days=8)
+
+    mid = {n["goal_id"] for n in get_mid_period_notifications(db_session)}
+    post = {n["goal_id"] for n in get_post_period_notifications(db_session)}
+    db_session.commit()
+    assert goals["mid_due"].id in mid and goals["mid_pending"].id not in mid and goals["ended"].id not in mid
+    assert goals["ended"].id in post and goals["mid_due"].id not in post
+
+    # the mid-period goal moves on to its end date, the ended one leaves the schedule
+    assert goals["mid_due"].next_notification_at == goals["mid_due"].end_date
+    assert goals["ended"].next_notification_at is None
+    assert goals["mid_due"].id not in {n["goal_id"] for n in get_mid_period_notifications(db_session)}
+    db_session.rollback()
+
+    # each notification was written to the outbox with its goal
+    outbox = db_session.query(NotificationOutbox).filter(NotificationOutbox.user_id == user_id).all()
+    assert len(outbox) == 2 and {row.status for row in outbox} == {"pending"}
+
+    db_session.query(NotificationOutbox).filter(NotificationOutbox.user_id == user_id).delete()
+    for goal in goals.values():
+        db_session.delete(goal)
+    db_session.commit()
+
+def test_stale_mark_survives_until_recompute(goal_user):
+    user_id, category_ids = goal_user
+    # a write that skips the deltas: the goal is left behind until the recompute
+    db_session.add(Transaction(user_id=user_id, amount=40.0, category_id=category_ids[0], transaction_type=TransactionType.EXPENSE,
+                               note="stale mark", date=datetime.datetime(2024, 3, 5)))
+    mark_goals_stale(db_session, user_id)
+    db_session.commit()
+    assert persisted(user_id) != recomputed(user_id)
+
+    # the mark is in the database, so a process that never saw it finds it
+    assert user_id in stale_goal_users(older_than=0)
+    recompute_user_goals([user_id])
+    assert user_id not in stale_goal_users(older_than=0)
+    assert persisted(user_id) == recomputed(user_id)
@@ -0,0 +1,20 @@
+from goal_queue import GoalRecomputeQueue
+
+def test_marks_are_coalesced():
+    queue = GoalRecomputeQueue(interval=60)
+    for _ in range(3):
+        queue.mark(1, now=0)
+    queue.mark(2, now=1)
+    assert sorted(queue.take_due(now=2)) == [1, 2]
+    assert queue.take_due(now=3) == []
+
+def test_recompute_at_most_once_per_interval():
+    queue = GoalRecomputeQueue(interval=60)
+    queue.mark(1, now=0)
+    assert queue.take_due(now=0) == [1]
+
+    # marked again right after a recomputation: waits for the interval
+    queue.mark(1, now=10)
+    assert queue.take_due(now=30) == []
+    assert queue.take_due(now=60) == [1]
+    assert queue.stats() == {"pending": 0, "marked": 2, "recomputed": 2}
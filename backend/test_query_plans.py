@@ -0,0 +1,220 @@
+"""
+Query-plan regression tests for the hot queries.
+
+Sequential scans are disabled for the session, so the planner only picks one when
+no index can serve the query. Any Seq Scan in a plan therefore means a missing index.
+"""
+
+import pytest
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import func, tuple_
+from sqlalchemy.dialects import postgresql
+
+from db import engine, db_session, init_db
+from geo import grid_cell_filter
+from models import Deal, DealLocationSubscription, DealVote, FcmToken, Goal, NotificationOutbox, RecurringTransaction, Transaction, User
+from synthetic_data import USERNAME_PREFIX, GeneratorConfig, generate_dataset
+
+@pytest.fixture(scope="module")
+def seeded():
+    """Apply migrations and load a small synthetic dataset, then return ids to query with."""
+    init_db()
+    config = GeneratorConfig(users=20, transactions_per_user=200, deals=50, votes_per_deal=5, seed=446)
+    # the database outlives a run, and the dataset's usernames are fixed by its seed
+    loaded = db_session.query(User.id).filter(User.username.startswith(f"{USERNAME_PREFIX}{config.seed:x}_", autoescape=True)).first()
+    if not loaded:
+        generate_dataset(config)
+    transaction = db_session.query(Transaction).order_by(Transaction.id.desc()).first()
+    vote = db_session.query(DealVote).order_by(DealVote.id.desc()).first()
+    db_session.remove()
+    return {
+        "user_id": transaction.user_id,
+        "category_id": transaction.category_id,
+        "deal_id": vote.deal_id,
+    }
+
+def explain(query):
+    """Return the JSON plan of a SQLAlchemy query with sequential scans disabled."""
+    # render_postcompile expands IN lists into one bound parameter per value
+    compiled = query.statement.compile(dialect=postgresql.dialect(), compile_kwargs={"render_postcompile": True})
+    with engine.connect() as conn:
+        conn.exec_driver_sql("SET enable_seqscan = off")
+        plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params).scalar()
+        conn.rollback()
+    return plan[0]["Plan"] if isinstance(plan, list) else json.loads(plan)[0]["Plan"]
+
+def seq_scans(plan):
+    """Collect the relations read with a sequential scan anywhere in the plan tree."""
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+def assert_no_seq_scan(query):
+    plan = explain(query)
+    assert seq_scans(plan) == [], json.dumps(plan, indent=2)
+
+def test_get_transactions_plan(seeded):
+    """db.get_transactions: a user's history, newest first."""
+    query = db_session.query(Transaction).filter(Transaction.user_id == seeded["user_id"]) \
+        .order_by(Transaction.date.desc(), Transaction.id.desc()).limit(100).offset(0)
+    assert_no_seq_scan(query)
+
+def test_transactions_keyset_page_plan(seeded):
+    """db.get_transactions_async: a cursor page seeks on (user_id, date, id) without sorting."""
+    query = db_session.query(Transaction).filter(
+        Transaction.user_id == seeded["user_id"],
+        tuple_(Transaction.date, Transaction.id) < tuple_(datetime.utcnow(), 2 ** 31 - 1)
+    ).order_by(Transaction.date.desc(), Transaction.id.desc()).limit(100)
+    assert_no_seq_scan(query)
+
+def test_fetch_transactions_plan(seeded):
+    """statistics.fetch_transactions: a user's transactions in a date window."""
+    end = datetime.utcnow()
+    query = db_session.query(Transaction).filter(
+        Transaction.user_id == seeded["user_id"],
+        Transaction.date >= end - timedelta(days=30),
+        Transaction.date <= end
+    )
+    assert_no_seq_scan(query)
+
+def test_duplicate_lookup_plan(seeded):
+    """fingerprints.find_duplicates: a user's transactions with a given fingerprint."""
+    query = db_session.query(Transaction).filter(
+        Transaction.user_id == seeded["user_id"],
+        Transaction.fingerprint == "0" * 64
+    )
+    assert_no_seq_scan(query)
+
+def test_calculate_goal_spending_plan(seeded):
+    """goal_utils.calculate_goal_spending: sum of a user's spending in a goal window."""
+    end = datetime.utcnow()
+    query = db_session.query(func.sum(Transaction.amount)).filter(
+        Transaction.user_id == seeded["user_id"],
+        Transaction.date >= end - timedelta(days=14),
+        Transaction.date <= end
+    )
+    assert_no_seq_scan(query)
+
+def test_percentage_goal_progress_plan(seeded):
+    """goal_utils.calculate_percentage_goal_progress: sum of a category's spending in a window."""
+    end = datetime.utcnow()
+    query = db_session.query(func.sum(Transaction.amount)).filter(
+        Transaction.category_id == seeded["category_id"],
+        Transaction.date >= end - timedelta(days=14),
+        Transaction.date < end
+    )
+    assert_no_seq_scan(query)
+
+def test_user_votes_on_page_plan(seeded):
+    """deals.get_deals: the current user's votes on a page of deals."""
+    query = db_session.query(DealVote.deal_id, DealVote.vote).filter(
+        DealVote.user_id == seeded["user_id"],
+        DealVote.deal_id.in_([seeded["deal_id"] - offset for offset in range(20)])
+    )
+    assert_no_seq_scan(query)
+
+def test_vote_counters_match_votes(seeded):
+    """The trigger-maintained counters on deals agree with the votes copied in by the generator."""
+    counted = {
+        deal_id: (upvotes, downvotes) for deal_id, upvotes, downvotes in
+        db_session.query(DealVote.deal_id, func.count().filter(DealVote.vote == 1), func.count().filter(DealVote.vote == -1))
+        .group_by(DealVote.deal_id)
+    }
+    stored = {
+        deal_id: (upvotes, downvotes) for deal_id, upvotes, downvotes in
+        db_session.query(Deal.id, Deal.upvotes, Deal.downvotes).filter(Deal.id.in_(list(counted)))
+    }
+    db_session.rollback()
+    assert stored == counted
+
+def test_user_deal_vote_plan(seeded):
+    """The current user's vote on a deal."""
+    query = db_session.query(DealVote).filter(
+        DealVote.deal_id == seeded["deal_id"],
+        DealVote.user_id == seeded["user_id"]
+    )
+    assert_no_seq_scan(query)
+
+def test_fcm_tokens_by_user_plan(seeded):
+    """Notification senders look up a user's device tokens."""
+    query = db_session.query(FcmToken).filter(FcmToken.user_id == seeded["user_id"])
+    assert_no_seq_scan(query)
+
+def test_mid_period_notifications_plan(seeded):
+    """goal_utils.get_mid_period_notifications: ongoing goals whose mid-period notification is due."""
+    now = datetime.utcnow()
+    query = db_session.query(Goal).filter(Goal.next_notification_at <= now, Goal.end_date > now, Goal.mid_notified.isnot(True))
+    assert_no_seq_scan(query)
+
+def test_post_period_notifications_plan(seeded):
+    """goal_utils.get_post_period_notifications: ended goals whose post-period notification is due."""
+    now = datetime.utcnow()
+    query = db_session.query(Goal).filter(Goal.next_notification_at <= now, Goal.end_date <= now, Goal.post_notified.isnot(True))
+    assert_no_seq_scan(query)
+
+def test_next_goal_notification_plan(seeded):
+    """notifications.seconds_until_next_goal_notification: earliest pending notification."""
+    query = db_session.query(func.min(Goal.next_notification_at))
+    assert_no_seq_scan(query)
+
+def test_recurring_payment_reminders_plan(seeded):
+    """notifications.process_due_recurring_reminders: schedules with a payment in the next 24 hours."""
+    query = db_session.query(RecurringTransaction).filter(
+        RecurringTransaction.next_payment_date <= datetime.utcnow() + timedelta(hours=24)
+    ).order_by(RecurringTransaction.next_payment_date)
+    assert_no_seq_scan(query)
+
+def test_fcm_tokens_for_many_users_plan(seeded):
+    """outbox.claim_batch: tokens of every user in a claimed batch, in one query."""
+    query = db_session.query(FcmToken.user_id, FcmToken.token).filter(FcmToken.user_id.in_(list(range(seeded["user_id"], seeded["user_id"] + 50))))
+    assert_no_seq_scan(query)
+
+def test_outbox_claim_plan(seeded):
+    """outbox.claim_batch: the oldest due pending notifications."""
+    query = db_session.query(NotificationOutbox.id).filter(
+        NotificationOutbox.status == "pending", NotificationOutbox.available_at <= datetime.utcnow()
+    ).order_by(NotificationOutbox.available_at).limit(500)
+    assert_no_seq_scan(query)
+
+def test_outbox_purge_plan(seeded):
+    """outbox.purge_finished: sent and failed notifications past their retention."""
+    query = db_session.query(NotificationOutbox.id).filter(
+        NotificationOutbox.status != "pending", NotificationOutbox.created_at < datetime.utcnow() - timedelta(days=7)
+    ).limit(10000)
+    assert_no_seq_scan(query)
+
+def test_deals_near_location_plan(seeded):
+    """db.get_deals_async with a location: only deals in the grid cells around the point."""
+    query = db_session.query(Deal).filter(grid_cell_filter(Deal.grid_lat, Deal.grid_lon, 49.28, -123.12, 25))
+    assert_no_seq_scan(query)
+
+def test_deal_subscriptions_near_deal_plan(seeded):
+    """notifications.send_new_deal_notification: subscriptions in the grid cells within 100km of a deal."""
+    query = db_session.query(DealLocationSubscription).filter(grid_cell_filter(
+        DealLocationSubscription.grid_lat, DealLocationSubscription.grid_lon, 49.28, -123.12, 100
+    ))
+    assert_no_seq_scan(query)
+
+def test_stale_goal_users_plan(seeded):
+    """goal_queue.stale_goal_users: users whose persisted recompute mark was never drained."""
+    query = db_session.query(User.id).filter(User.goals_stale_since <= datetime.utcnow() - timedelta(seconds=60))
+    assert_no_seq_scan(query)
+
+def test_pending_deal_fanouts_plan(seeded):
+    """notifications.fan_out_pending_deals: the oldest deal whose fan-out has not run."""
+    query = db_session.query(Deal).filter(Deal.fanout_pending).order_by(Deal.id).limit(1)
+    assert_no_seq_scan(query)
+
+def test_duplicate_deal_vote_rejected(seeded):
+    """A user can only hold one vote per deal."""
+    from sqlalchemy.exc import IntegrityError
+    existing = db_session.query(DealVote).filter(DealVote.deal_id == seeded["deal_id"]).first()
+    db_session.add(DealVote(deal_id=existing.deal_id, user_id=existing.user_id, vote=existing.vote))
+    with pytest.raises(IntegrityError):
+        db_session.commit()
+    db_session.rollback()
+    db_session.remove()
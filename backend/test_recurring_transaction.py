@@ -183,3 +183,14 @@ def test_delete_recurring_transaction(server, auth_headers):
     # Try deleting the same recurring transaction again; should result in a 404
     delete_resp2 = requests.delete(delete_url, params={"recurring_id": recurring_id}, headers=auth_headers)
     assert delete_resp2.status_code == 404
+
+def test_next_payment_date():
+    """Reminders are scheduled for the first payment strictly after a given time."""
+    from utils import next_payment_date
+    start = datetime(2024, 1, 1, 9, 0)
+    end = datetime(2024, 1, 29, 9, 0)
+    assert next_payment_date(start, end, 7, datetime(2023, 12, 25)) == start
+    assert next_payment_date(start, end, 7, start) == datetime(2024, 1, 8, 9, 0)
+    assert next_payment_date(start, end, 7, datetime(2024, 1, 10)) == datetime(2024, 1, 15, 9, 0)
+    assert next_payment_date(start, end, 7, datetime(2024, 1, 22, 9, 0)) == end
+    assert next_payment_date(start, end, 7, end) is None
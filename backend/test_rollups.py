@@ -0,0 +1,88 @@
+import pytest
+import datetime
+from sqlalchemy import func
+
+from db import db_session, init_db, add_predefined_categories
+from models import Category, MonthlySpendingRollup, Transaction, TransactionType, User
+from rollups import sum_spending
+import utils
+
+@pytest.fixture(scope="module")
+def rollup_user():
+    """A fresh user with the predefined categories."""
+    init_db()
+    user = db_session.query(User).filter_by(username="rollupuser").first()
+    if not user:
+        user = User(username="rollupuser", password=utils.hash_password("rolluppassword"), firstname="Rollup", lastname="User")
+        db_session.add(user)
+        db_session.commit()
+        add_predefined_categories(user.id)
+    db_session.query(Transaction).filter(Transaction.user_id == user.id).delete()
+    db_session.commit()
+    categories = db_session.query(Category).filter(Category.user_id == user.id).order_by(Category.id).all()
+    yield user.id, [category.id for category in categories]
+    db_session.remove()
+
+def raw_rollup(user_id):
+    """Recompute the rollup rows for a user straight from transactions."""
+    month = func.date_trunc('month', Transaction.date)
+    rows = db_session.query(
+        Transaction.category_id, Transaction.transaction_type, month,
+        func.sum(Transaction.amount), func.count(Transaction.id)
+    ).filter(Transaction.user_id == user_id).group_by(Transaction.category_id, Transaction.transaction_type, month).all()
+    return {(c, t, m): (round(float(total), 2), count) for c, t, m, total, count in rows}
+
+def stored_rollup(user_id):
+    rows = db_session.query(MonthlySpendingRollup).filter(
+        MonthlySpendingRollup.user_id == user_id,
+        MonthlySpendingRollup.count != 0
+    ).all()
+    return {(r.category_id, r.transaction_type, r.month): (round(float(r.total), 2), r.count) for r in rows}
+
+def test_rollup_tracks_inserts_updates_and_deletes(rollup_user):
+    user_id, category_ids = rollup_user
+    base = datetime.datetime(2024, 1, 10)
+    transactions = [
+        Transaction(user_id=user_id, amount=10.25 * (i + 1), category_id=category_ids[i % 3],
+                    transaction_type=TransactionType.EXPENSE, note="rollup", date=base + datetime.timedelta(days=9 * i))
+        for i in range(12)
+    ]
+    db_session.bulk_save_objects(transactions)
+    db_session.commit()
+    assert stored_rollup(user_id) == raw_rollup(user_id)
+
+    # move one transaction to another month and category, and change its amount
+    tx = db_session.query(Transaction).filter(Transaction.user_id == user_id).order_by(Transaction.id).first()
+    tx.amount = 99.99
+    tx.category_id = category_ids[4]
+    tx.date = datetime.datetime(2024, 6, 1)
+    db_session.commit()
+    assert stored_rollup(user_id) == raw_rollup(user_id)
+
+    # bulk category reassignment, as in delete_category
+    db_session.query(Transaction).filter(Transaction.category_id == category_ids[1]).update({"category_id": category_ids[2]})
+    db_session.commit()
+    assert stored_rollup(user_id) == raw_rollup(user_id)
+
+    db_session.query(Transaction).filter(Transaction.user_id == user_id, Transaction.amount > 50).delete()
+    db_session.commit()
+    assert stored_rollup(user_id) == raw_rollup(user_id)
+
+def test_sum_spending_matches_raw_sum(rollup_user):
+    user_id, category_ids = rollup_user
+    windows = [
+        (datetime.datetime(2024, 1, 1), datetime.datetime(2024, 3, 31, 23, 59, 59, 999999)),  # whole months
+        (datetime.datetime(2024, 1, 15), datetime.datetime(2024, 4, 2)),  # partial edges
+        (datetime.datetime(2024, 2, 3), datetime.datetime(2024, 2, 20)),  # inside one month
+    ]
+    for start, end in windows:
+        for category_id in (None, category_ids[2]):
+            query = db_session.query(func.sum(Transaction.amount)).filter(
+                Transaction.user_id == user_id,
+                Transaction.date >= start,
+                Transaction.date <= end
+            )
+            if category_id is not None:
+                query = query.filter(Transaction.category_id == category_id)
+            expected = float(query.scalar() or 0.0)
+            assert sum_spending(db_session, user_id, start, end, category_id=category_id) == pytest.approx(expected)
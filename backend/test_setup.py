@@ -12,7 +12,11 @@ def run_server():
 
 @pytest.fixture(scope="module")
 def server():
-    """Fixture to start and stop the server"""
+    """Fixture to start and stop the server, on an empty database for every test module"""
+    # startup only applies migrations now, so modules registering the same users need a clean slate
+    from db import reset_db
+    reset_db()
+    
     proc = Process(target=run_server)
     proc.start()
     time.sleep(10)
@@ -0,0 +1,409 @@
+import pytest
+import uvicorn
+import requests
+from multiprocessing import Process
+from datetime import datetime
+from io import BytesIO, StringIO
+import csv
+import json
+import os
+import time
+from test_setup import *
+
+@pytest.fixture
+def auth_headers(server):
+    """
+    Obtain authentication headers by logging in.
+    If login fails, attempt to register the user.
+    """
+    login_url = f"{BASE_URL}/auth/login"
+    login_data = {"username": "newuser", "password": "newpassword"}
+    try:
+        response = requests.post(login_url, json=login_data)
+        if response.status_code != 200:
+            reg_url = f"{BASE_URL}/auth/register"
+            reg_data = {
+                "username": "newuser",
+                "password": "newpassword",
+                "firstname": "Test",
+                "lastname": "User"
+            }
+            reg_resp = requests.post(reg_url, json=reg_data)
+            if reg_resp.status_code != 201:
+                pytest.fail("User registration failed")
+            response = requests.post(login_url, json=login_data)
+        access_token = response.json().get("access_token")
+        if not access_token:
+            pytest.fail("No access token received")
+        return {"Authorization": f"Bearer {access_token}"}
+    except requests.exceptions.ConnectionError:
+        pytest.fail("Could not connect to the server")
+
+def create_custom_category(auth_headers, name="Test Category", color="#123456"):
+    """
+    Helper function to create a custom category.
+    This is used to ensure a valid category_id when creating transactions.
+    """
+    url = f"{BASE_URL}/categories/custom"
+    payload = {"name": name, "color": color}
+    response = requests.post(url, json=payload, headers=auth_headers)
+    response.raise_for_status()
+    return response.json()
+
+def test_create_transaction(server, auth_headers):
+    """Test creating a new transaction."""
+    # Create a custom category to use in the transaction.
+    category = create_custom_category(auth_headers, name="Transaction Category", color="#445566")
+    category_id = category.get("id")
+    
+    url = f"{BASE_URL}/transactions/"
+    payload = {
+        "amount": 123.45,
+        "category_id": category_id,
+        "transaction_type": "expense",
+        "note": "Test transaction",
+        "date": datetime.utcnow().isoformat(),
+        "vendor": "Test Vendor"
+    }
+    response = requests.post(url, json=payload, headers=auth_headers)
+    assert response.status_code == 201, response.text
+    data = response.json()
+    assert data.get("amount") == payload["amount"]
+    assert data.get("note") == payload["note"]
+    assert data.get("vendor") == payload["vendor"]
+    assert data.get("category_id") == category_id
+
+def test_create_duplicate_transaction(server, auth_headers):
+    """Test that an identical transaction is rejected, flagged or forced per the duplicates mode."""
+    category = create_custom_category(auth_headers, name="Duplicate Category", color="#335577")
+    url = f"{BASE_URL}/transactions/"
+    payload = {
+        "amount": 42.10,
+        "category_id": category.get("id"),
+        "transaction_type": "expense",
+        "note": "Duplicate  check",
+        "date": "2023-09-15T08:30:00",
+        "vendor": "Dup Vendor"
+    }
+    assert requests.post(url, json=payload, headers=auth_headers).status_code == 201
+
+    # same transaction with different case and spacing in the note
+    resp = requests.post(url, json={**payload, "note": "duplicate check"}, headers=auth_headers)
+    assert resp.status_code == 409, resp.text
+
+    resp = requests.post(url, json=payload, headers=auth_headers, params={"duplicates": "flag"})
+    assert resp.status_code == 201, resp.text
+    assert resp.json()["is_duplicate"] is True
+
+    resp = requests.post(url, json=payload, headers=auth_headers, params={"duplicates": "force"})
+    assert resp.status_code == 201, resp.text
+    assert resp.json()["is_duplicate"] is False
+
+def test_read_transactions(server, auth_headers):
+    """Test reading a list of transactions."""
+    # Create a transaction so that there is at least one.
+    category = create_custom_category(auth_headers, name="Read Category", color="#778899")
+    category_id = category.get("id")
+    create_url = f"{BASE_URL}/transactions/"
+    payload = {
+        "amount": 50.0,
+        "category_id": category_id,
+        "transaction_type": "expense",
+        "note": "List transaction",
+        "date": datetime.utcnow().isoformat(),
+        "vendor": "List Vendor"
+    }
+    create_resp = requests.post(create_url, json=payload, headers=auth_headers)
+    assert create_resp.status_code == 201
+
+    url = f"{BASE_URL}/transactions/"
+    params = {"skip": 0, "limit": 10}
+    resp = requests.get(url, headers=auth_headers, params=params)
+    assert resp.status_code == 200, resp.text
+    data = resp.json()
+    assert isinstance(data, list)
+
+def test_read_transactions_cursor(server, auth_headers):
+    """Test paging through transactions with the keyset cursor."""
+    category = create_custom_category(auth_headers, name="Cursor Category", color="#102030")
+    create_url = f"{BASE_URL}/transactions/"
+    # same timestamp on purpose, so the id tie-break decides the order
+    date = datetime.utcnow().isoformat()
+    for i in range(5):
+        payload = {
+            "amount": 10.0 + i,
+            "category_id": category.get("id"),
+            "transaction_type": "expense",
+            "note": f"Cursor transaction {i}",
+            "date": date,
+            "vendor": "Cursor Vendor"
+        }
+        assert requests.post(create_url, json=payload, headers=auth_headers).status_code == 201
+
+    url = f"{BASE_URL}/transactions/"
+    seen = []
+    params = {"limit": 2}
+    while True:
+        resp = requests.get(url, headers=auth_headers, params=params)
+        assert resp.status_code == 200, resp.text
+        seen.extend(tx["id"] for tx in resp.json())
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        params = {"limit": 2, "cursor": cursor}
+
+    all_resp = requests.get(url, headers=auth_headers, params={"limit": 10000})
+    assert seen == [tx["id"] for tx in all_resp.json()]
+    assert len(seen) == len(set(seen))
+
+def test_read_transactions_bad_cursor(server, auth_headers):
+    """Test that a malformed cursor is rejected."""
+    url = f"{BASE_URL}/transactions/"
+    resp = requests.get(url, headers=auth_headers, params={"cursor": "not-a-cursor"})
+    assert resp.status_code == 400, resp.text
+
+def test_update_transaction(server, auth_headers):
+    """Test updating an existing transaction."""
+    # Create a transaction first.
+    category = create_custom_category(auth_headers, name="Update Category", color="#aabbcc")
+    category_id = category.get("id")
+    create_url = f"{BASE_URL}/transactions/"
+    payload = {
+        "amount": 80.0,
+        "category_id": category_id,
+        "transaction_type": "expense",
+        "note": "Original note",
+        "date": datetime.utcnow().isoformat(),
+        "vendor": "Original Vendor"
+    }
+    create_resp = requests.post(create_url, json=payload, headers=auth_headers)
+    assert create_resp.status_code == 201
+    transaction = create_resp.json()
+    transaction_id = transaction.get("id")
+    
+    # Update transaction: change note and amount.
+    update_url = f"{BASE_URL}/transactions/{transaction_id}"
+    update_payload = {
+        "amount": 95.0,
+        "note": "Updated note",
+        "vendor": "Updated Vendor"
+    }
+    update_resp = requests.put(update_url, json=update_payload, headers=auth_headers)
+    assert update_resp.status_code == 200, update_resp.text
+    updated_tx = update_resp.json()
+    assert updated_tx.get("amount") == update_payload["amount"]
+    assert updated_tx.get("note") == update_payload["note"]
+    assert updated_tx.get("vendor") == update_payload["vendor"]
+
+def test_delete_transaction(server, auth_headers):
+    """Test deleting an existing transaction."""
+    # Create a transaction to delete.
+    category = create_custom_category(auth_headers, name="Delete Category", color="#ddeeff")
+    category_id = category.get("id")
+    create_url = f"{BASE_URL}/transactions/"
+    payload = {
+        "amount": 60.0,
+        "category_id": category_id,
+        "transaction_type": "expense",
+        "note": "To be deleted",
+        "date": datetime.utcnow().isoformat(),
+        "vendor": "Delete Vendor"
+    }
+    create_resp = requests.post(create_url, json=payload, headers=auth_headers)
+    assert create_resp.status_code == 201
+    tx = create_resp.json()
+    transaction_id = tx.get("id")
+    
+    delete_url = f"{BASE_URL}/transactions/{transaction_id}"
+    delete_resp = requests.delete(delete_url, headers=auth_headers)
+    assert delete_resp.status_code == 204, delete_resp.text
+    
+    # Attempting to delete again should return 404.
+    delete_resp2 = requests.delete(delete_url, headers=auth_headers)
+    assert delete_resp2.status_code == 404
+
+def test_batch_transactions(server, auth_headers):
+    """Test applying creates, updates and deletes in one batch, and rolling back a failing batch."""
+    category = create_custom_category(auth_headers, name="Batch Category", color="#221144")
+    category_id = category.get("id")
+    url = f"{BASE_URL}/transactions/batch"
+
+    def create_op(amount, note):
+        return {"op": "create", "transaction": {
+            "amount": amount, "category_id": category_id, "transaction_type": "expense",
+            "note": note, "date": "2023-07-01T10:00:00", "vendor": "Batch Vendor"
+        }}
+
+    resp = requests.post(url, json={"operations": [create_op(1.0, "batch a"), create_op(2.0, "batch b")]},
+                         headers=auth_headers)
+    assert resp.status_code == 200, resp.text
+    first, second = [result["id"] for result in resp.json()["results"]]
+
+    operations = [
+        {"op": "update", "id": first, "changes": {"amount": 5.0, "note": "batch a edited"}},
+        {"op": "delete", "id": second},
+        create_op(3.0, "batch c"),
+        # re-creates the transaction deleted above, so it is not a duplicate
+        create_op(2.0, "batch b"),
+        # repeats a create earlier in the batch
+        create_op(3.0, "batch c"),
+        # matches the first transaction's values before the update above
+        create_op(1.0, "batch a"),
+        # matches the first transaction as updated above
+        create_op(5.0, "batch a edited"),
+    ]
+    resp = requests.post(url, json={"operations": operations}, headers=auth_headers)
+    assert resp.status_code == 200, resp.text
+    results = resp.json()["results"]
+    assert results[0]["transaction"]["amount"] == 5.0
+    assert results[1]["id"] == second
+    assert [result["status"] for result in results[2:]] == ["applied", "applied", "skipped", "applied", "skipped"]
+
+    # the failing delete rolls back the update before it
+    operations = [
+        {"op": "update", "id": first, "changes": {"amount": 7.0}},
+        {"op": "delete", "id": second},
+    ]
+    resp = requests.post(url, json={"operations": operations}, headers=auth_headers)
+    assert resp.status_code == 404, resp.text
+    transactions = requests.get(f"{BASE_URL}/transactions/", headers=auth_headers, params={"limit": 10000}).json()
+    amounts = {tx["id"]: tx["amount"] for tx in transactions}
+    assert amounts[first] == 5.0
+    assert second not in amounts
+
+def test_upload_csv(server, auth_headers):
+    """Test the CSV upload endpoint (parsing only)."""
+    csv_content = (
+        "amount,category,date,note,vendor\n"
+        "25.50,Transaction Category,2023-10-01T12:00:00,CSV Transaction,CSV Vendor\n"
+    )
+    files = {
+        "file": ("test.csv", csv_content, "text/csv")
+    }
+    url = f"{BASE_URL}/transactions/csv"
+    params = {"create_transactions": 0}
+    resp = requests.post(url, files=files, headers=auth_headers, params=params)
+    # the endpoint answers 201 for previews too
+    assert resp.status_code == 201, resp.text
+    data = resp.json()
+    # Expect a list of dictionaries (one transaction parsed from CSV)
+    assert isinstance(data, list)
+    assert "amount" in data[0]
+
+def test_import_csv_report(server, auth_headers):
+    """Test importing a CSV: valid rows are inserted and invalid ones reported by row number."""
+    csv_content = (
+        "amount,category,transaction_type,date,note,vendor\n"
+        "12.00,  transaction   CATEGORY ,EXPENSE,2023-10-02,Imported,Vendor\n"
+        "abc,Transaction Category,EXPENSE,2023-10-02,Bad amount,Vendor\n"
+        "5.00,No Such Category,EXPENSE,2023-10-02,Bad category,Vendor\n"
+        "7.50,Transaction Category,INCOME,2023-10-03,\"Note, with comma\",Vendor\n"
+    )
+    files = {
+        "file": ("import.csv", csv_content, "text/csv")
+    }
+    url = f"{BASE_URL}/transactions/csv"
+    resp = requests.post(url, files=files, headers=auth_headers, params={"create_transactions": 1})
+    assert resp.status_code == 201, resp.text
+    data = resp.json()
+    assert data["rows"] == 4
+    assert data["inserted"] == 2
+    assert data["error_count"] == 2
+    assert [error["row"] for error in data["errors"]] == [2, 3]
+
+def test_import_csv_skips_duplicates(server, auth_headers):
+    """Test that re-importing an overlapping CSV only inserts the new rows."""
+    header = "amount,category,transaction_type,date,note,vendor\n"
+    first = "8.00,Transaction Category,EXPENSE,2023-08-01,Overlap,Vendor\n"
+    second = "9.00,Transaction Category,EXPENSE,2023-08-02,Overlap,Vendor\n"
+    url = f"{BASE_URL}/transactions/csv"
+    params = {"create_transactions": 1}
+
+    resp = requests.post(url, files={"file": ("a.csv", header + first, "text/csv")}, headers=auth_headers, params=params)
+    assert resp.status_code == 201, resp.text
+
+    # the overlapping row is skipped, and a row repeated within the file is only inserted once
+    files = {"file": ("b.csv", header + first + second + second, "text/csv")}
+    resp = requests.post(url, files=files, headers=auth_headers, params=params)
+    assert resp.status_code == 201, resp.text
+    data = resp.json()
+    assert data["inserted"] == 1
+    assert data["duplicate_count"] == 2
+
+    resp = requests.post(url, files={"file": ("c.csv", header + first, "text/csv")}, headers=auth_headers,
+                         params={"create_transactions": 0})
+    assert resp.json()[0]["is_duplicate"] is True
+
+def test_import_csv_async(server, auth_headers):
+    """Test a background CSV import and polling its job until it finishes."""
+    csv_content = "amount,category,transaction_type,date,note,vendor\n" + "".join(
+        f"{i + 1}.00,Transaction Category,EXPENSE,2023-11-{i % 28 + 1:02d},Async import,Vendor\n" for i in range(50)
+    ) + "1.00,No Such Category,EXPENSE,2023-11-01,Bad category,Vendor\n"
+    files = {
+        "file": ("async.csv", csv_content, "text/csv")
+    }
+    url = f"{BASE_URL}/transactions/csv"
+    resp = requests.post(url, files=files, headers=auth_headers, params={"create_transactions": 1, "async": 1})
+    assert resp.status_code == 202, resp.text
+    job_id = resp.json()["job_id"]
+
+    job_url = f"{BASE_URL}/transactions/imports/{job_id}"
+    for _ in range(50):
+        job = requests.get(job_url, headers=auth_headers).json()
+        if job["status"] in ("completed", "failed"):
+            break
+        time.sleep(0.2)
+    assert job["status"] == "completed", job
+    assert job["rows_processed"] == 51
+    assert job["rows_inserted"] == 50
+    assert job["rows_failed"] == 1
+    assert job["errors"][0]["row"] == 51
+
+    resp = requests.get(f"{BASE_URL}/transactions/imports/missing", headers=auth_headers)
+    assert resp.status_code == 404, resp.text
+
+def test_export_transactions(server, auth_headers):
+    """Test exporting transactions as CSV and NDJSON."""
+    url = f"{BASE_URL}/transactions/export"
+    all_resp = requests.get(f"{BASE_URL}/transactions/", headers=auth_headers, params={"limit": 10000})
+    ids = [tx["id"] for tx in all_resp.json()]
+
+    resp = requests.get(url, headers=auth_headers, params={"format": "csv"})
+    assert resp.status_code == 200, resp.text
+    assert "text/csv" in resp.headers.get("content-type", "")
+    rows = list(csv.DictReader(StringIO(resp.text)))
+    assert [int(row["id"]) for row in rows] == ids
+
+    resp = requests.get(url, headers=auth_headers, params={"format": "ndjson"})
+    assert resp.status_code == 200, resp.text
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert [row["id"] for row in rows] == ids
+    assert {"date", "amount", "category", "transaction_type", "note", "vendor"} <= set(rows[0])
+
+    resp = requests.get(url, headers=auth_headers, params={"format": "xml"})
+    assert resp.status_code == 400, resp.text
+
+def test_get_csv_template(server, auth_headers):
+    """Test retrieving the CSV template."""
+    url = f"{BASE_URL}/transactions/csv/template"
+    resp = requests.get(url, headers=auth_headers)
+    # Expect a FileResponse; check content type contains 'text/csv'
+    assert resp.status_code == 200, resp.text
+    assert "text/csv" in resp.headers.get("content-type", "")
+
+@pytest.mark.skip(reason="Calls the OpenAI API")
+def test_scan_receipt(server):
+    """Test scanning a receipt."""
+    url = f"{BASE_URL}/transactions/receipt/scan"
+    # Create a dummy file-like object.
+    # Ideally, parse_receipt() will return a valid structure based on the image content.
+    dummy_content = b"dummy image bytes"
+    files = {
+        "file": ("dummy.jpg", BytesIO(dummy_content), "image/jpeg")
+    }
+    resp = requests.post(url, files=files)
+    assert resp.status_code == 200, resp.text
+    data = resp.json()
+    # Check that required keys are present.
+    for key in ["items", "approx_subtotal", "approx_fees", "total"]:
+        assert key in data
@@ -1,4 +1,7 @@
+import base64
+import datetime
 import hashlib
+import json
 from fastapi.security import HTTPBearer
 from openai import OpenAI
 from dotenv import load_dotenv
@@ -136,3 +139,41 @@ def get_coordinate_distance(lat1, lon1, lat2, lon2):
 
     distance = R * c
     return distance
+
+def next_payment_date(start_date: datetime.datetime, end_date: datetime.datetime, period: int,
+                      after: datetime.datetime) -> datetime.datetime:
+    """
+    The first payment of a recurring schedule strictly after `after`.
+
+    Returns:
+        datetime.datetime: The payment date, or None when the schedule has ended by then.
+    """
+    if after < start_date:
+        next_date = start_date
+    else:
+        period_delta = datetime.timedelta(days=period)
+        next_date = start_date + ((after - start_date) // period_delta + 1) * period_delta
+    if end_date is not None and next_date > end_date:
+        return None
+    return next_date
+
+def encode_cursor(date: datetime.datetime, id: int) -> str:
+    """
+    Encode a (date, id) keyset position as an opaque URL-safe cursor.
+    """
+    payload = json.dumps([date.isoformat(), id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date, id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.datetime.fromisoformat(date), int(id)
+    except Exception:
+        raise ValueError("Invalid cursor")